@@ -4,11 +4,16 @@
 # 	All rights reserved.
 #######################################
 
+import threading
+from lexer import TokenStream
+
 # Every parser will return a Result object on success
 # or None on failure
 # value is part of AST
 # position is index of next token in the stream
-class Result:
+class Result(object):
+    __slots__ = ('value', 'pos')
+
     def __init__(self, value, pos):
         self.value = value
         self.pos = pos
@@ -32,11 +37,17 @@ class Parser:
 
 		
 # Tag - matches any token with a particular tag
+# On a TokenStream the tag is that of the token's kind, and the text is
+# only sliced out for a match
 class Tag(Parser):
     def __init__(self, tag):
         self.tag = tag
 
     def __call__(self, tokens, pos):
+        if tokens.__class__ is TokenStream:
+            if pos < len(tokens.kinds) and tokens.kind_tags[tokens.kinds[pos]] is self.tag:
+                return Result(tokens.source[tokens.starts[pos]:tokens.ends[pos]], pos + 1)
+            return None
         if pos < len(tokens) and tokens[pos][1] is self.tag:
             return Result(tokens[pos][0], pos + 1)
         else:
@@ -45,12 +56,35 @@ class Tag(Parser):
 
 # Reserved - used to parse reserved words and operators
 # accepts tokens with specific value and tag
+# On a TokenStream the value is looked up once as a kind code of the
+# stream's TokenTable, and tokens are matched by comparing kinds; their
+# text is only compared when the kind's expression matches more than
+# one text
 class Reserved(Parser):
     def __init__(self, value, tag):
         self.value = value
         self.tag = tag
+        self.binding = (None, None, False)
+
+    # Sets binding to (table, kind of value, whether the kind matches
+    # value alone); the kind is None when value is no token of the tag
+    def bind(self, table):
+        kind = table.kind_of(self.value)
+        if kind is not None and table.kind_tags[kind] is not self.tag:
+            kind = None
+        exact = kind is not None and table.kind_texts[kind] == self.value
+        self.binding = (table, kind, exact)
+        return self.binding
 
     def __call__(self, tokens, pos):
+        if tokens.__class__ is TokenStream:
+            (table, kind, exact) = self.binding
+            if table is not tokens.table:
+                (table, kind, exact) = self.bind(tokens.table)
+            if pos < len(tokens.kinds) and tokens.kinds[pos] == kind and \
+               (exact or tokens.text(pos) == self.value):
+                return Result(self.value, pos + 1)
+            return None
         if pos < len(tokens) and \
            tokens[pos][0] == self.value and \
            tokens[pos][1] is self.tag:
@@ -90,18 +124,16 @@ class Exp(Parser):
 
     def __call__(self, tokens, pos):
         result = self.parser(tokens, pos)
-
-        def process_next(parsed):
-            (sepfunc, right) = parsed
-            return sepfunc(result.value, right)
-        next_parser = self.separator + self.parser ^ process_next
-
-        next_result = result
-        while next_result:
-            next_result = next_parser(tokens, result.pos)
-            if next_result:
-                result = next_result
-        return result 
+        while result:
+            separator_result = self.separator(tokens, result.pos)
+            if not separator_result:
+                break
+            next_result = self.parser(tokens, separator_result.pos)
+            if not next_result:
+                break
+            value = separator_result.value(result.value, next_result.value)
+            result = Result(value, next_result.pos)
+        return result
 
 
 # Alternate - takes two parsers as input
@@ -182,6 +214,44 @@ class Lazy(Parser):
         return self.parser(tokens, pos)
 
 
+# freeze - takes a parser as input
+# Walks the parser graph reachable from it and resolves every Lazy,
+# so that nothing is built during parsing. Returns the parser.
+def freeze(parser):
+    seen = set()
+    stack = [parser]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, Lazy) and not node.parser:
+            node.parser = node.parser_func()
+        for value in vars(node).values():
+            if isinstance(value, Parser):
+                stack.append(value)
+    return parser
+
+
+# Locate - takes one parser as input
+# Applies parser and, when the tokens carry positions (see
+# TokenTable.stream and TokenStream), stores the (line, column) of the
+# first token matched in the location of the value.
+class Locate(Parser):
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __call__(self, tokens, pos):
+        result = self.parser(tokens, pos)
+        if result:
+            if tokens.__class__ is TokenStream:
+                if tokens.positions:
+                    result.value.location = tokens.location(pos)
+            elif len(tokens[pos]) > 2:
+                result.value.location = tokens[pos][2:4]
+        return result
+
+
 # Phrase - takes one parser as input
 # Applies parser and returns result normally.
 # Will fail if parser did not consume all remaining tokens
@@ -194,4 +264,154 @@ class Phrase(Parser):
         if result and result.pos == len(tokens):
             return result
         else:
-            return None
\ No newline at end of file
+            return None
+
+
+# Packrat memoization (opt-in)
+# For grammars that backtrack, parsing the same tokens with the same
+# parser more than once; the yoda grammar does not (see yoda_parser.py).
+# A MemoTable caches the outcome of Memo parsers for one parse, keyed by
+# (memo key, position). Entries are grouped by position so that all
+# positions behind a committed statement boundary can be dropped at once,
+# and the table evicts its oldest positions when it grows past max_entries.
+# Cached values are stored as (value, pos) pairs rather than Result objects
+# because Process rewrites the value of the Result it is given.
+class MemoTable:
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.peak_size = 0
+        self.clear()
+
+    def clear(self):
+        self.positions = {}
+        self.size = 0
+        self.floor = 0
+
+    def lookup(self, key, pos):
+        entries = self.positions.get(pos)
+        if entries is not None and key in entries:
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return MISSING
+
+    def store(self, key, pos, entry):
+        if pos < self.floor:
+            return
+        entries = self.positions.get(pos)
+        if entries is None:
+            entries = self.positions[pos] = {}
+        entries[key] = entry
+        self.size += 1
+        if self.size > self.peak_size:
+            self.peak_size = self.size
+        if self.max_entries is not None and self.size > self.max_entries:
+            self.evict(self.max_entries // 2)
+
+    # Drops every entry before pos, which the parser will not revisit
+    def commit(self, pos):
+        if pos <= self.floor:
+            return
+        self.floor = pos
+        for old_pos in [p for p in self.positions if p < pos]:
+            self.drop(old_pos)
+
+    # Drops the lowest positions until at most size entries remain
+    def evict(self, size):
+        for old_pos in sorted(self.positions):
+            if self.size <= size:
+                break
+            self.drop(old_pos)
+
+    def drop(self, pos):
+        count = len(self.positions.pop(pos))
+        self.size -= count
+        self.evictions += count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'entries': self.size,
+            'peak_entries': self.peak_size,
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self):
+        return 'MemoTable(hits=%d, misses=%d, entries=%d, evictions=%d)' % \
+               (self.hits, self.misses, self.size, self.evictions)
+
+MISSING = object()
+
+# The table of the packrat parse running on this thread, if any
+_packrat = threading.local()
+
+def active_memo():
+    return getattr(_packrat, 'table', None)
+
+
+# Packrat - takes a parser and a MemoTable as input
+# Applies parser with the table installed, so that Memo parsers
+# inside it cache their results. The table is cleared first because
+# its positions refer to the previous token list.
+class Packrat(Parser):
+    def __init__(self, parser, table):
+        self.parser = parser
+        self.table = table
+
+    def __call__(self, tokens, pos):
+        saved = active_memo()
+        self.table.clear()
+        _packrat.table = self.table
+        try:
+            return self.parser(tokens, pos)
+        finally:
+            _packrat.table = saved
+
+
+# Memo - takes one parser and an optional key as input
+# Inside a Packrat parse, caches the result of parser at each position
+# under key (the Memo itself by default); structurally identical parsers
+# may share a key. Outside a Packrat parse it just applies parser.
+class Memo(Parser):
+    def __init__(self, parser, key=None):
+        self.parser = parser
+        self.key = key if key is not None else self
+
+    def __call__(self, tokens, pos):
+        table = active_memo()
+        if table is None:
+            return self.parser(tokens, pos)
+        entry = table.lookup(self.key, pos)
+        if entry is MISSING:
+            result = self.parser(tokens, pos)
+            if result:
+                table.store(self.key, pos, (result.value, result.pos))
+            else:
+                table.store(self.key, pos, None)
+            return result
+        elif entry:
+            return Result(entry[0], entry[1])
+        else:
+            return None
+
+
+# Commit - takes one parser as input
+# Applies parser and, on success inside a Packrat parse, tells the
+# memo table that positions before the result will not be revisited
+class Commit(Parser):
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __call__(self, tokens, pos):
+        result = self.parser(tokens, pos)
+        if result:
+            table = active_memo()
+            if table is not None:
+                table.commit(result.pos)
+        return result
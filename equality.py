@@ -1,10 +1,50 @@
 # Copyright (c) 2011, Jay Conrod.
 # All rights reserved.
 
-class Equality:
+# Nodes keep their fields in __slots__ rather than a __dict__, so
+# equality compares the slots of the class and of its bases. Slots
+# named in annotations hold data about a node rather than its structure
+# (such as its source location); they may be left unset, read as None
+# and are not compared.
+# A specialised subclass names the class it specialises in generic, and
+# compares equal to nodes of that class with the same values.
+class Equality(object):
+    __slots__ = ()
+    annotations = ()
+    generic = None
+
+    # Anything but a node is left to compare itself, so that views of
+    # nodes (see yoda_arena.NodeView) compare the same both ways
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and \
-               self.__dict__ == other.__dict__
+        if not isinstance(other, Equality):
+            return NotImplemented
+        return isinstance(other, self.generic or self.__class__) and \
+               compared_values(self) == compared_values(other)
 
     def __ne__(self, other):
-        return not self.__eq__(other)
\ No newline at end of file
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+_slot_names = {}
+
+# Names of the slots of cls and its base classes, base classes first
+def slot_names(cls):
+    names = _slot_names.get(cls)
+    if names is None:
+        names = []
+        for base in reversed(cls.__mro__):
+            names.extend(vars(base).get('__slots__', ()))
+        names = _slot_names[cls] = tuple(names)
+    return names
+
+_compared_names = {}
+
+def compared_values(obj):
+    cls = obj.__class__
+    names = _compared_names.get(cls)
+    if names is None:
+        names = _compared_names[cls] = tuple([name for name in slot_names(cls)
+                                              if name not in cls.annotations])
+    return [getattr(obj, name) for name in names]
@@ -3,25 +3,280 @@
 
 import sys
 import re
+import sre_parse
+from array import array
+from bisect import bisect_right
 
-def lex(characters, token_exprs):
-    pos = 0
-    tokens = []
-    while pos < len(characters):
-        match = None
-        for token_expr in token_exprs:
-            pattern, tag = token_expr
-            regex = re.compile(pattern)
-            match = regex.match(characters, pos)
-            if match:
-                text = match.group(0)
-                if tag:
-                    token = (text, tag)
-                    tokens.append(token)
-                break
-        if not match:
-            sys.stderr.write('Illegal character: %s\\n' % characters[pos])
+# Characters read per chunk by TokenTable.stream. Any size works: the
+# buffer is always refilled to at least the table's lookahead.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Raised by TokenTable.tokenize at the first character that no token
+# expression matches
+class LexError(ValueError):
+    pass
+
+
+# TokenTable - compiles a list of (pattern, tag) token expressions once
+# into a single master regex. Each pattern becomes one named group of an
+# alternation tried in table order, so the first expression that matches
+# still wins, exactly as when the patterns were tried one at a time.
+class TokenTable:
+    def __init__(self, token_exprs):
+        self.token_exprs = list(token_exprs)
+        alternatives = []
+        group_tags = [None]
+        group_kinds = [None]
+        for index, (pattern, tag) in enumerate(self.token_exprs):
+            alternatives.append('(?P<T%d>%s)' % (index, pattern))
+            # lastindex of a match reports the outermost group, so nested
+            # groups inside a pattern map back to the same tag
+            groups = re.compile(pattern).groups
+            group_tags.extend([tag] * (groups + 1))
+            group_kinds.extend([index] * (groups + 1))
+        self.regex = re.compile('|'.join(alternatives))
+        self.group_tags = group_tags
+        self.group_kinds = group_kinds
+        # The kind code of a token is the index of its expression. Each
+        # kind has the tag of its expression, and the text of the one
+        # token it matches when the expression is a plain literal
+        self.kind_tags = [tag for (pattern, tag) in self.token_exprs]
+        self.kind_texts = [literal_text(pattern) for (pattern, tag) in self.token_exprs]
+        self.text_kinds = {}
+        # Characters stream keeps beyond the position it matches at
+        self.lookahead = max([pattern_lookahead(pattern) for (pattern, tag) in self.token_exprs] or [1])
+
+    # With positions the tokens are (text, tag, line, column) tuples, as
+    # stream yields them. Illegal characters end the program
+    def lex(self, characters, positions=False, compact=False):
+        try:
+            return self.tokenize(characters, positions, compact)
+        except LexError, error:
+            sys.stderr.write(str(error))
             sys.exit(1)
-        else:
-            pos = match.end(0)
-    return tokens
\ No newline at end of file
+
+    # Same as lex, but raises LexError on an illegal character, for
+    # callers that must keep running. With compact the tokens come as a
+    # TokenStream instead of a list
+    def tokenize(self, characters, positions=False, compact=False):
+        if compact:
+            return TokenStream(self, characters, positions)
+        tags = self.group_tags
+        tokens = []
+        append = tokens.append
+        pos = 0
+        line = 1
+        line_start = 0
+        for match in self.regex.finditer(characters):
+            if match.start() != pos:
+                break
+            tag = tags[match.lastindex]
+            if tag:
+                if positions:
+                    append((match.group(), tag, line, pos - line_start + 1))
+                else:
+                    append((match.group(), tag))
+            pos = match.end()
+            if positions:
+                newlines = characters.count('\n', match.start(), pos)
+                if newlines:
+                    line += newlines
+                    line_start = characters.rindex('\n', match.start(), pos) + 1
+        if pos < len(characters):
+            raise LexError('Illegal character: %s\\n' % characters[pos])
+        return tokens
+
+    # Kind code of the token text lexes to on its own, or None when text
+    # is not exactly one token. A token of the source with that text has
+    # the same kind, since the expressions that match it there match it
+    # on its own too
+    def kind_of(self, text):
+        kind = self.text_kinds.get(text, -1)
+        if kind == -1:
+            match = self.regex.match(text)
+            if match and match.end() == len(text):
+                kind = self.group_kinds[match.lastindex]
+            else:
+                kind = None
+            self.text_kinds[text] = kind
+        return kind
+
+    # Yields (text, tag, start, end) for every match from offset pos on,
+    # including the ones without a tag (whitespace and comments), for
+    # callers that lex only part of a text. Raises LexError on an
+    # illegal character
+    def scan(self, characters, pos=0):
+        tags = self.group_tags
+        for match in self.regex.finditer(characters, pos):
+            if match.start() != pos:
+                break
+            end = match.end()
+            yield (match.group(), tags[match.lastindex], pos, end)
+            pos = end
+        if pos < len(characters):
+            raise LexError('Illegal character: %s\\n' % characters[pos])
+
+    # Lexes a file-like object lazily, reading it chunk_size characters at
+    # a time, and yields tokens as they are found. With positions the tokens
+    # are (text, tag, line, column) tuples, 1-based; without them they are
+    # the same (text, tag) pairs lex returns. Only the unconsumed tail of
+    # the input is buffered, so the lexer's memory depends on the largest
+    # token rather than on the size of the source (a caller that keeps
+    # the tokens, such as the parser, still holds all of them). Matching
+    # starts with at least lookahead characters buffered, so that an
+    # identifier is never taken for the first word of a keyword cut off
+    # by the end of a chunk.
+    def stream(self, source, chunk_size=DEFAULT_CHUNK_SIZE, positions=True):
+        match_at = self.regex.match
+        tags = self.group_tags
+        buffer = ''
+        pos = 0
+        eof = False
+        minimum = max(chunk_size, self.lookahead)
+        need = minimum      # characters wanted beyond pos before matching
+        offset = 0          # offset of buffer[0] in the whole source
+        line = 1
+        line_start = 0      # offset of the first character of line
+        while True:
+            if not eof and len(buffer) - pos < need:
+                chunk = source.read(max(chunk_size, need))
+                if chunk:
+                    offset += pos
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                else:
+                    eof = True
+                continue
+            if pos >= len(buffer):
+                return
+            match = match_at(buffer, pos)
+            end = match.end() if match else len(buffer)
+            if not eof and end >= len(buffer):
+                # The token may continue past the end of the buffer (or a
+                # keyword may be cut in half), so grow the lookahead
+                need = 2 * (len(buffer) - pos)
+                continue
+            if not match:
+                sys.stderr.write('Illegal character: %s at line %d, column %d\n' %
+                                 (buffer[pos], line, offset + pos - line_start + 1))
+                sys.exit(1)
+            need = minimum
+            tag = tags[match.lastindex]
+            text = match.group()
+            if tag:
+                if positions:
+                    yield (text, tag, line, offset + pos - line_start + 1)
+                else:
+                    yield (text, tag)
+            newlines = text.count('\n')
+            if newlines:
+                line += newlines
+                line_start = offset + pos + text.rindex('\n') + 1
+            pos = end
+
+
+def lex(characters, token_exprs, positions=False, compact=False):
+    if not isinstance(token_exprs, TokenTable):
+        token_exprs = TokenTable(token_exprs)
+    return token_exprs.lex(characters, positions, compact)
+
+# Characters of lookahead a pattern needs to be matched as it would be
+# in the whole source: the length of its longest match when that is
+# bounded, otherwise the length of its shortest match (a longer one
+# reaches the end of the buffer, which makes stream read more)
+def pattern_lookahead(pattern):
+    (shortest, longest) = sre_parse.parse(pattern).getwidth()
+    if longest >= sre_parse.MAXREPEAT:
+        return shortest
+    return longest
+
+# The text a pattern matches when it matches a single text, that is
+# when its only special characters are escaped ones; None otherwise
+def literal_text(pattern):
+    if re.match(r'(?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*$', pattern):
+        return re.sub(r'\\(.)', r'\1', pattern)
+    return None
+
+
+# TokenStream - the tokens of a source as three arrays: the kind code of
+# each token (see TokenTable) and the offsets where it starts and ends.
+# A token's text is only sliced out of the source when it is asked for,
+# so the stream takes a few bytes per token where a list of tuples takes
+# over a hundred. Indexing gives the same tuples as TokenTable.tokenize,
+# (text, tag) or, with positions, (text, tag, line, column); the parser
+# combinators read the arrays directly and match keywords by kind.
+class TokenStream(object):
+    def __init__(self, table, source, positions=False):
+        self.table = table
+        self.source = source
+        self.positions = positions
+        self.kind_tags = table.kind_tags
+        self.kind_texts = table.kind_texts
+        self.kinds = array('B' if len(table.kind_tags) <= 256 else 'H')
+        offset = 'I' if len(source) < 2 ** 32 else 'L'
+        self.starts = array(offset)
+        self.ends = array(offset)
+        self.line_starts = None
+        self.lex()
+
+    # Raises LexError on an illegal character
+    def lex(self):
+        source = self.source
+        group_kinds = self.table.group_kinds
+        kind_tags = self.kind_tags
+        add_kind = self.kinds.append
+        add_start = self.starts.append
+        add_end = self.ends.append
+        pos = 0
+        for match in self.table.regex.finditer(source):
+            if match.start() != pos:
+                break
+            kind = group_kinds[match.lastindex]
+            pos = match.end()
+            if kind_tags[kind]:
+                add_kind(kind)
+                add_start(match.start())
+                add_end(pos)
+        if pos < len(source):
+            raise LexError('Illegal character: %s\\n' % source[pos])
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def text(self, index):
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def tag(self, index):
+        return self.kind_tags[self.kinds[index]]
+
+    # (line, column) of the token at index, 1-based. The line starts of
+    # the source are found on the first call
+    def location(self, index):
+        if self.line_starts is None:
+            line_starts = array(self.starts.typecode, [0])
+            find = self.source.find
+            start = find('\n')
+            while start != -1:
+                line_starts.append(start + 1)
+                start = find('\n', start + 1)
+            self.line_starts = line_starts
+        start = self.starts[index]
+        line = bisect_right(self.line_starts, start)
+        return (line, start - self.line_starts[line - 1] + 1)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        token = (self.text(index), self.tag(index))
+        if self.positions:
+            token += self.location(index)
+        return token
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return 'TokenStream(%d tokens, %d characters)' % (len(self), len(self.source))
@@ -1,7 +1,16 @@
 #! /usr/bin/env python
 import sys
+import argparse
 from yoda_parser import *
 from yoda_lexer import *
+from yoda_interpreter import *
+from yoda_transpile import to_python
+from yoda_optimizer import optimize, DEFAULT_LEVEL, MAX_LEVEL
+from yoda_output import *
+from yoda_cache import parse_cached
+from yoda_profile import Profile, instrument, DEFAULT_TOP
+from yoda_budget import Budget, BudgetExceeded, govern, run_limited
+from yoda_types import unstable_variables
 
 """
 Client Interface for the Star Wars Interpreter
@@ -39,7 +48,42 @@ Supported Keywords:
     THERE IS NO TRY                                 end
 
 How to Use:
-    python starWarsPT.py [FILE].yoda
+    python starWarsPT.py [OPTIONS] [FILE].yoda
+
+Options:
+    --engine {tree,closure,vm,python}
+                                execution engine (default: tree)
+    -O LEVEL                    optimization level, 0 to disable (default: 2)
+    --no-slots                  look variables up by name instead of
+                                resolving them to slots first
+    --emit-python               print the program translated to Python
+                                instead of running it
+    --output {buffered,fd,stream}
+                                where prints go: sys.stdout (stream,
+                                the default), an in-memory buffer written
+                                to fd 1 in large chunks (buffered), or
+                                fd 1 directly, one write per print (fd)
+    --buffer-size BYTES         flush the buffered output at this size
+    --flush-interval SECONDS    also flush the buffered output this often
+    --output-stats              report bytes printed and flushes made
+                                on stderr
+    --no-cache                  always lex and parse the program instead of
+                                using its .yodac cache file
+    --cache-dir DIR             keep .yodac files in DIR instead of next
+                                to the programs
+    --profile                   count and time every statement, on the
+                                tree engine, and report the hottest ones
+                                with their line and column on stderr
+    --profile-top N             statements in the profile report
+                                (default: 20)
+    --max-steps N               stop the program after N steps (statements
+                                run and loop iterations)
+    --max-time SECONDS          stop the program after this long
+    --max-string CHARACTERS     stop the program when it builds a longer
+                                string to print
+    --warn-types                warn on stderr about variables that may hold
+                                values of more than one type, which keep
+                                their concatenations from being specialized
 
 Team: Prateek Chawla, Emily Hockel, Adel Danandeh
 """
@@ -47,24 +91,121 @@ Team: Prateek Chawla, Emily Hockel, Adel Danandeh
 class starWarsInterpreter():
 
     def __init__ (self):
-        self.__commandLineArgs()
+        self.__args = self.__commandLineArgs()
         self.__fileOut = self.__openFile()
-        tokens = yoda_lex(self.__fileOut.read())
-        parse_result = yoda_parse(tokens)
-        if not parse_result:
+        if self.__args.no_cache:
+            # Lex straight from the file instead of reading it into one
+            # string; the parser backtracks, so it still gets every token
+            program = self.__parse(list(yoda_lex_stream(self.__fileOut)))
+        else:
+            program = parse_cached(self.__args.file, self.__fileOut.read(),
+                                   lambda source: self.__parse(yoda_lex(source, positions=True, compact=True)),
+                                   self.__args.cache_dir)
+        if program is None:
             sys.stderr.write('Parse error!\n')
             sys.exit(1)
-        ast = parse_result.value
+        if self.__args.warn_types:
+            self.__warnTypes(program)
+        ast = optimize(program, self.__args.optimize)
+        if self.__args.emit_python:
+            sys.stdout.write(to_python(ast))
+            self.__fileOut.close()
+            return
         env = {}
-        ast.eval(env)
-        self.__fileOut.close()
+        engine = self.__args.engine
+        profile = None
+        if self.__args.profile:
+            profile = Profile()
+            ast = instrument(ast, profile)
+            engine = 'tree'
+        budget = Budget(self.__args.max_steps, self.__args.max_time, self.__args.max_string)
+        if budget.has_limits():
+            ast = govern(ast)
+        run = prepare(ast, engine, not self.__args.no_slots)
+        sink = self.__openSink()
+        try:
+            # The sink is flushed even when the program fails
+            with using(sink):
+                run_limited(run, env, budget)
+        except BudgetExceeded, error:
+            sys.stderr.write('Budget exceeded: %s\n' % error)
+            sys.exit(1)
+        finally:
+            if self.__args.output_stats:
+                sys.stderr.write('output: %(bytes)d bytes, %(flushes)d flushes\n' % sink.stats())
+            if profile:
+                sys.stderr.write(profile.report(self.__args.profile_top))
+            self.__fileOut.close()
 
     def __commandLineArgs(self):
         """
-        Confirms length of command line arguments
+        Parses command line arguments: options and exactly one file
         """
-        if len(sys.argv) <= 1 or len(sys.argv) > 2:
-            raise Exception('Please enter exactly one .yoda file error!\n')
+        parser = argparse.ArgumentParser(description='Star Wars Interpreter')
+        parser.add_argument('file', help='.yoda program to run')
+        parser.add_argument('--engine', choices=sorted(ENGINES), default=DEFAULT_ENGINE,
+                            help='execution engine (default: %(default)s)')
+        parser.add_argument('-O', '--optimize', type=int, default=DEFAULT_LEVEL,
+                            choices=range(MAX_LEVEL + 1), metavar='LEVEL',
+                            help='optimization level, 0 to disable (default: %(default)s)')
+        parser.add_argument('--no-slots', action='store_true',
+                            help='look variables up by name instead of resolving them to slots')
+        parser.add_argument('--emit-python', action='store_true',
+                            help='print the program translated to Python instead of running it')
+        parser.add_argument('--output', choices=sorted(SINKS), default=DEFAULT_SINK,
+                            help='output sink for prints (default: %(default)s)')
+        parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE, metavar='BYTES',
+                            help='flush buffered output at this size (default: %(default)s)')
+        parser.add_argument('--flush-interval', type=float, metavar='SECONDS',
+                            help='also flush buffered output this often')
+        parser.add_argument('--output-stats', action='store_true',
+                            help='report bytes printed and flushes made on stderr')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='always lex and parse instead of using the .yodac cache')
+        parser.add_argument('--cache-dir', metavar='DIR',
+                            help='keep .yodac cache files in DIR instead of next to the programs')
+        parser.add_argument('--profile', action='store_true',
+                            help='count and time every statement on the tree engine and report on stderr')
+        parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP, metavar='N',
+                            help='statements in the profile report (default: %(default)s)')
+        parser.add_argument('--max-steps', type=int, metavar='N',
+                            help='stop the program after N steps')
+        parser.add_argument('--max-time', type=float, metavar='SECONDS',
+                            help='stop the program after this many seconds')
+        parser.add_argument('--max-string', type=int, metavar='CHARACTERS',
+                            help='stop the program when it builds a longer string to print')
+        parser.add_argument('--warn-types', action='store_true',
+                            help='warn about variables that may hold more than one type')
+        return parser.parse_args()
+
+    def __parse(self, tokens):
+        """
+        Parses tokens, returning the program's AST or None on a parse error
+        """
+        parse_result = yoda_parse(tokens)
+        if not parse_result:
+            return None
+        return parse_result.value
+
+    def __warnTypes(self, program):
+        """
+        Reports the type-unstable variables of program on stderr
+        """
+        for (name, types, location) in unstable_variables(program):
+            where = ''
+            if location:
+                where = ' (first used at line %d, column %d)' % location
+            sys.stderr.write('Warning: variable %s may hold %s values%s\n' %
+                             (name, ' or '.join(types), where))
+
+    def __openSink(self):
+        """
+        Creates the output sink chosen with --output
+        """
+        if self.__args.output == 'buffered':
+            return BufferedSink(size=self.__args.buffer_size,
+                                interval=self.__args.flush_interval)
+        return SINKS[self.__args.output]()
 
     def __openFile(self):
         """
@@ -73,7 +214,7 @@ class starWarsInterpreter():
         file = None 
         #os.path.isfile(file)
         try: 
-            file = open(sys.argv[1], 'r')
+            file = open(self.__args.file, 'r')
         except IOError: 
             raise Exception('File not found\n')
 
@@ -83,7 +224,7 @@ class starWarsInterpreter():
         """
         Checks that file extension is supported.
         """
-        if not sys.argv[1].endswith('.yoda'):
+        if not self.__args.file.endswith('.yoda'):
             raise Exception('Please enter exactly one .yoda file error!\n')
 
 starWars = starWarsInterpreter()
\ No newline at end of file
@@ -0,0 +1,92 @@
+#######################################
+# tests/support.py
+# Helpers shared by the test modules
+#
+# Builds yoda programs from statements, parses them and runs them on
+# every engine configuration with the output captured.
+#######################################
+
+import glob
+import os
+from yoda_lexer import *
+from yoda_parser import *
+from yoda_optimizer import optimize, MAX_LEVEL
+from yoda_interpreter import ENGINES, prepare
+from yoda_output import CaptureSink, using
+from yoda_visitor import children
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+BEGIN = 'A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...\n'
+END = '\n...MAY THE FORCE BE WITH YOU\n'
+
+def program(*statements):
+	return BEGIN + ';\n'.join(statements) + END
+
+def show(exp):
+	return 'IVE GOT A BAD FEELING ABOUT THIS %s + "\\n"' % exp
+
+def when(condition, *statements):
+	return 'ITS A TRAP %s MOVE ALONG %s THESE ARENT THE DROIDS YOU ARE LOOKING FOR' % \
+		   (condition, ';\n'.join(statements))
+
+def loop(condition, *statements):
+	return 'DO %s OR DO NOT... %s THERE IS NO TRY' % (condition, ';\n'.join(statements))
+
+# Paths of the example programs in tests/
+def example_paths():
+	return sorted(glob.glob(os.path.join(TESTS, '*.yoda')))
+
+# Sources of the example programs, by file name
+def examples():
+	found = {}
+	for path in example_paths():
+		with open(path) as file:
+			found[os.path.basename(path)] = file.read()
+	return found
+
+def parse(source):
+	result = yoda_parse(yoda_tokenize(source, positions=True))
+	assert result, 'parse error'
+	return result.value
+
+# (class name, location) of every node, which equality leaves out
+def locations(node):
+	found = []
+	pending = [node]
+	while pending:
+		node = pending.pop()
+		found.append((node.__class__.__name__, getattr(node, 'location', None)))
+		pending.extend(reversed(children(node)))
+	return found
+
+# (output, name of the exception raised or None) of one run
+def run(ast, engine='tree', level=0, slots=False):
+	sink = CaptureSink()
+	error = None
+	with using(sink):
+		try:
+			prepare(optimize(ast, level), engine, slots)({})
+		except Exception, exception:
+			error = exception.__class__.__name__
+	return (sink.getvalue(), error)
+
+# (engine, level, slots) of every configuration
+def configurations():
+	for engine in sorted(ENGINES):
+		for level in range(MAX_LEVEL + 1):
+			for slots in (True, False):
+				yield (engine, level, slots)
+
+# Configurations that run source differently from the tree-walker at
+# -O 0, as messages
+def disagreements(name, source):
+	ast = parse(source)
+	expected = run(ast)
+	found = []
+	for (engine, level, slots) in configurations():
+		actual = run(ast, engine, level, slots)
+		if actual != expected:
+			found.append('%s on %s -O %d slots=%s: %r, expected %r' %
+						 (name, engine, level, slots, actual, expected))
+	return found
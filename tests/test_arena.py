@@ -0,0 +1,130 @@
+#######################################
+# tests/test_arena.py
+# Tests of slotted nodes and the flat arena form of yoda ASTs
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import inspect
+import pickle
+import unittest
+import yoda_ast
+from combinators import Result
+from equality import Equality
+from yoda_arena import Arena, NodeView, to_arena, NODE, LIST
+from yoda_ast import *
+from tests.support import *
+
+# Every node class of yoda_ast
+def node_classes():
+	return [value for value in vars(yoda_ast).values()
+			if inspect.isclass(value) and issubclass(value, Equality)]
+
+
+class SlotsTest(unittest.TestCase):
+	def test_no_instance_dicts(self):
+		for node_class in node_classes() + [Result]:
+			self.assertFalse(hasattr(node_class.__new__(node_class), '__dict__'), node_class)
+
+	def test_equality_and_repr(self):
+		self.assertEqual(AddExp(IntArithmExp(1), VarArithmExp('x')),
+						 AddExp(IntArithmExp(1), VarArithmExp('x')))
+		self.assertNotEqual(AddExp(IntArithmExp(1), VarArithmExp('x')),
+							AddExp(IntArithmExp(2), VarArithmExp('x')))
+		self.assertEqual(repr(Result(IntArithmExp(1), 3)), 'Result(IntArithmExp(1), 3)')
+
+	# Locations are annotations and are not compared
+	def test_locations_are_not_compared(self):
+		for (name, source) in examples().items():
+			self.assertEqual(parse(source), yoda_parse(yoda_tokenize(source)).value, name)
+
+
+class ArenaTest(unittest.TestCase):
+	def test_round_trip(self):
+		for (name, source) in examples().items():
+			ast = parse(source)
+			arena = to_arena(ast)
+			self.assertEqual(arena.to_node(), ast, name)
+			self.assertEqual(repr(arena.to_node()), repr(ast), name)
+			self.assertEqual(repr(arena.view()), repr(ast), name)
+
+	def test_views_compare_both_ways(self):
+		for (name, source) in examples().items():
+			ast = parse(source)
+			view = to_arena(ast).view()
+			self.assertTrue(view == ast, name)
+			self.assertTrue(ast == view, name)
+			self.assertFalse(ast != view, name)
+			self.assertTrue(view == to_arena(ast).view(), name)
+		self.assertFalse(view == None)
+		self.assertFalse(ast == None)
+
+	def test_views_differ_like_nodes(self):
+		(one, two) = (AddExp(IntArithmExp(1), VarArithmExp('x')), AddExp(IntArithmExp(2), VarArithmExp('x')))
+		self.assertFalse(to_arena(one).view() == two)
+		self.assertFalse(two == to_arena(one).view())
+		self.assertTrue(to_arena(one).view() != to_arena(two).view())
+
+	# Views follow the rule of Equality for specialised classes
+	def test_specialised_classes(self):
+		specialised = AddExp(IntArithmExp(1), VarArithmExp('x'))
+		generic = BinopArithmExp('VADER', IntArithmExp(1), VarArithmExp('x'))
+		for (left, right) in ((specialised, generic), (to_arena(specialised).view(), generic),
+							  (to_arena(generic).view(), specialised),
+							  (to_arena(generic).view(), to_arena(specialised).view())):
+			self.assertTrue(left == right)
+			self.assertTrue(right == left)
+		self.assertFalse(to_arena(SubExp(IntArithmExp(1), VarArithmExp('x'))).view() == generic)
+		self.assertFalse(generic == to_arena(SubExp(IntArithmExp(1), VarArithmExp('x'))).view())
+
+	def test_view_fields(self):
+		view = to_arena(AddExp(IntArithmExp(1), VarArithmExp('x'))).view()
+		self.assertTrue(view.node_class is AddExp)
+		self.assertTrue(isinstance(view.left, NodeView))
+		self.assertEqual(view.left, IntArithmExp(1))
+		self.assertEqual(view.right.name, 'x')
+		self.assertEqual(view.children(), [IntArithmExp(1), VarArithmExp('x')])
+		self.assertRaises(AttributeError, getattr, view, 'missing')
+		self.assertEqual(to_arena(view.to_node()).to_node(), view)
+
+	# Nodes of the same kind and values share a single shape (located
+	# nodes differ by their location)
+	def test_shared_shapes(self):
+		ast = yoda_parse(yoda_tokenize(program(*['x YODA x VADER 1'] * 100))).value
+		arena = to_arena(ast)
+		self.assertEqual(len(arena), 401)
+		self.assertEqual(len(arena.shape_table), 5)
+		self.assertEqual(arena.shape_table[0], (None, (LIST, 100)))
+		self.assertEqual(to_arena(IntArithmExp(True)).shape_table, [(True,)])
+		self.assertTrue(NODE in to_arena(NotBoolExp(TrueBoolExp('LIGHT_SIDE'))).shape_table[0])
+
+	def test_pickle(self):
+		ast = parse(examples()['fibonacci.yoda'])
+		for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+			arena = pickle.loads(pickle.dumps(to_arena(ast), protocol))
+			self.assertTrue(isinstance(arena, Arena))
+			self.assertEqual(arena.to_node(), ast)
+			self.assertTrue(NODE in sum(arena.shape_table, ()))
+
+	# Building and rebuilding do not recurse
+	def test_deep_tree(self):
+		depth = 20000
+		node = TrueBoolExp('LIGHT_SIDE')
+		for _ in range(depth):
+			node = NotBoolExp(node)
+		arena = to_arena(node)
+		self.assertEqual(len(arena), depth + 1)
+		rebuilt = arena.to_node()
+		for _ in range(depth):
+			rebuilt = rebuilt.exp
+		self.assertEqual(rebuilt, TrueBoolExp('LIGHT_SIDE'))
+
+	def test_subtree(self):
+		arena = to_arena(AddExp(IntArithmExp(1), VarArithmExp('x')))
+		self.assertEqual(arena.to_node(2), VarArithmExp('x'))
+		self.assertRaises(IndexError, arena.to_node, 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
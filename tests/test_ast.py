@@ -0,0 +1,61 @@
+#######################################
+# tests/test_ast.py
+# Tests of the AST node classes
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import unittest
+from yoda_ast import *
+from tests.support import *
+
+
+class StringTest(unittest.TestCase):
+	# Literals are unescaped once, when they are built
+	def test_literals(self):
+		literal = StringExp('"a\\tb\\"\\\\\\0"')
+		self.assertEqual(literal.value, u'a\tb"\\\x00')
+		self.assertTrue(literal.eval({}) is literal.value)
+		self.assertEqual(StringExp('"plain"').eval({}), 'plain')
+
+	def test_plus_chains_join_once(self):
+		statement = parse(program(show('x + " " + y + "!"')))
+		self.assertEqual(statement.stmt, JoinStringExp([VarArithmExp('x'), StringExp('" "'),
+														VarArithmExp('y'), StringExp('"!"'),
+														StringExp('"\\n"')]))
+		self.assertEqual(statement.stmt.eval({'x': 1, 'y': 2 ** 70}), u'1 %d!\n' % 2 ** 70)
+
+	# A chain is one node however long it is
+	def test_long_chain(self):
+		source = program(show(' + '.join(['x', '"-"'] * 2000)))
+		self.assertEqual(run(parse(source)), (u'0-' * 2000 + u'\n', None))
+		self.assertEqual(disagreements('long chain', source), [])
+
+
+class BlockTest(unittest.TestCase):
+	def test_statements_are_flat(self):
+		ast = parse(program('x YODA 1', 'y YODA 2', show('y')))
+		self.assertEqual(ast, BlockStatement([AssignStatement('x', IntArithmExp(1)),
+											  AssignStatement('y', IntArithmExp(2)),
+											  PrintStatement(JoinStringExp([VarArithmExp('y'),
+																			StringExp('"\\n"')]))]))
+		self.assertEqual(parse(program('x YODA 1')), AssignStatement('x', IntArithmExp(1)))
+
+	# Far more statements than the recursion limit parse, compare, print
+	# and run
+	def test_long_programs(self):
+		count = 5000
+		source = program(*['x YODA x VADER 1'] * count + [show('x')])
+		ast = parse(source)
+		self.assertTrue(isinstance(ast, BlockStatement))
+		self.assertEqual(len(ast.statements), count + 1)
+		self.assertEqual(ast, parse(source))
+		self.assertTrue(repr(ast).startswith('BlockStatement(AssignStatement(x, '))
+		for engine in sorted(ENGINES):
+			for slots in (True, False):
+				self.assertEqual(run(ast, engine, slots=slots), (u'%d\n' % count, None))
+
+
+if __name__ == '__main__':
+	unittest.main()
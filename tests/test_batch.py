@@ -0,0 +1,122 @@
+#######################################
+# tests/test_batch.py
+# Tests of the batch runner
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+from tests.support import *
+from yoda_batch import run_batch, save_outputs, summary, expand, \
+	OK, LEX_ERROR, PARSE_ERROR, RUNTIME_ERROR, OVER_BUDGET, MISSING
+
+ROOT = os.path.dirname(TESTS)
+
+# Programs of the batch by file name, with the status and output each
+# one ends with
+PROGRAMS = {
+	'hello.yoda': (program(show('"hello"')), OK, u'hello\n'),
+	'sum.yoda': (program('x YODA 0', 'i YODA 0', loop('i SITH 10', 'x YODA x VADER i', 'i YODA i VADER 1'),
+						 show('x')), OK, u'45\n'),
+	'failing.yoda': (program(show('"before"'), 'x YODA 1 LEAH 0', show('"after"')), RUNTIME_ERROR,
+					 u'before\n'),
+	'forever.yoda': (program('x YODA 0', loop('LIGHT_SIDE', 'x YODA x VADER 1')), OVER_BUDGET, u''),
+	'unparsable.yoda': (program('x YODA'), PARSE_ERROR, u''),
+	'illegal.yoda': (program('x YODA $'), LEX_ERROR, u''),
+}
+
+
+class BatchTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		for (name, (source, _, _)) in PROGRAMS.items():
+			with open(os.path.join(self.directory, name), 'w') as file:
+				file.write(source)
+		self.options = {'engine': 'tree', 'level': 2, 'cache': True,
+						'cache_dir': os.path.join(self.directory, 'cache'),
+						'limits': (10000, None, None)}
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def paths(self):
+		return expand([os.path.join(self.directory, '*.yoda'), os.path.join(self.directory, 'missing.yoda')])
+
+	def check(self, results):
+		paths = self.paths()
+		self.assertEqual([result['path'] for result in results], paths)
+		for result in results[:-1]:
+			(_, status, output) = PROGRAMS[os.path.basename(result['path'])]
+			self.assertEqual((result['path'], result['status'], result['output']),
+							 (result['path'], status, output))
+			self.assertTrue(result['time'] >= 0)
+			self.assertEqual(bool(result['errors']), status != OK, result['path'])
+		self.assertEqual(results[-1]['status'], MISSING)
+
+	def test_statuses_and_outputs(self):
+		for engine in sorted(ENGINES):
+			self.options['engine'] = engine
+			self.check(run_batch(self.paths(), self.options, 2))
+
+	def test_cached_runs(self):
+		self.check(run_batch(self.paths(), self.options, 3))
+		self.assertEqual(len(os.listdir(self.options['cache_dir'])), 4)
+		self.check(run_batch(self.paths(), self.options, 1))
+		self.options['cache'] = False
+		self.check(run_batch(self.paths(), self.options, 2))
+
+	def test_errors_are_captured(self):
+		results = dict([(os.path.basename(result['path']), result)
+						for result in run_batch(self.paths(), self.options, 2)])
+		self.assertTrue('ZeroDivisionError' in results['failing.yoda']['errors'])
+		self.assertEqual(results['unparsable.yoda']['errors'], 'Parse error!\n')
+		self.assertTrue(results['illegal.yoda']['errors'].startswith('Illegal character'))
+		self.assertTrue(results['forever.yoda']['errors'].startswith('Budget exceeded'))
+
+	def test_save_outputs(self):
+		results = [{'path': 'a/x.yoda', 'output': u'one\u2603', 'errors': ''},
+				   {'path': 'b/x.yoda', 'output': u'two', 'errors': 'Parse error!\n'},
+				   {'path': 'c/y.yoda', 'output': u'three', 'errors': ''}]
+		directory = os.path.join(self.directory, 'out')
+		save_outputs(results, directory)
+		self.assertEqual(sorted(os.listdir(directory)),
+						 ['x.0.err', 'x.0.out', 'x.1.err', 'x.1.out', 'y.err', 'y.out'])
+		with open(os.path.join(directory, 'x.0.out'), 'rb') as file:
+			self.assertEqual(file.read(), u'one\u2603'.encode('utf-8'))
+		with open(os.path.join(directory, 'x.1.err')) as file:
+			self.assertEqual(file.read(), 'Parse error!\n')
+
+	def test_summary(self):
+		results = [{'path': 'a.yoda', 'status': OK, 'time': 0.5, 'errors': ''},
+				   {'path': 'b.yoda', 'status': RUNTIME_ERROR, 'time': 0.25,
+					'errors': 'Traceback\nZeroDivisionError: division\n'}]
+		lines = summary(results, 1.0, 2).splitlines()
+		self.assertEqual(lines[1].split(), ['ok', '0.5000', 'a.yoda'])
+		self.assertTrue(lines[2].endswith('b.yoda  (ZeroDivisionError: division)'))
+		self.assertEqual(lines[3], '2 files: 1 ok, 1 failed in 1.00 s with 2 workers')
+
+	def test_command_line(self):
+		command = [sys.executable, os.path.join(ROOT, 'yoda_batch.py'), '--workers', '2',
+				   '--max-steps', '10000', '--no-cache', '--output-dir', os.path.join(self.directory, 'out'),
+				   os.path.join(self.directory, 'hello.yoda'), os.path.join(self.directory, 's*.yoda')]
+		process = subprocess.Popen(command, stdout=subprocess.PIPE)
+		output = process.communicate()[0]
+		self.assertEqual(process.returncode, 0)
+		self.assertTrue(output.endswith('2 files: 2 ok, 0 failed in %s s with 2 workers\n' %
+										output.split()[-5]))
+		with open(os.path.join(self.directory, 'out', 'sum.out')) as file:
+			self.assertEqual(file.read(), '45\n')
+		command[-1] = os.path.join(self.directory, 'f*.yoda')
+		process = subprocess.Popen(command, stdout=subprocess.PIPE)
+		process.communicate()
+		self.assertEqual(process.returncode, 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
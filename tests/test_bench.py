@@ -0,0 +1,113 @@
+#######################################
+# tests/test_bench.py
+# Tests of the benchmark harness
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import yoda_bench
+from yoda_bench import measure, compare, save, load, programs, generators, PHASES
+from tests.support import *
+
+OPTIONS = {'engine': 'tree', 'level': 2, 'repeat': 1}
+
+# A result with the same time in every phase
+def timings(name, seconds):
+	result = {'name': name}
+	for phase in PHASES:
+		result[phase] = seconds
+	return result
+
+
+class MeasureTest(unittest.TestCase):
+	def test_phases_and_counts(self):
+		(source, iterations) = generators['huge_loop'](1)
+		result = measure(('huge_loop', source, iterations, OPTIONS))
+		self.assertFalse('error' in result, result.get('error'))
+		for phase in PHASES:
+			self.assertTrue(result[phase] >= 0, phase)
+		self.assertEqual(result['iterations'], 100000)
+		self.assertEqual(result['tokens'], len(yoda_lex(source)))
+		self.assertTrue(result['nodes'] > 10)
+
+	# Without a known count the iterations come from a profiled run
+	def test_counted_iterations(self):
+		source = examples()['fibonacci.yoda']
+		result = measure(('fibonacci', source, None, OPTIONS))
+		self.assertEqual(result['iterations'], run(parse(source))[0].count(' ') + 9)
+
+	def test_errors_are_reported(self):
+		self.assertEqual(measure(('broken', program('x YODA'), None, OPTIONS))['error'],
+						 'ValueError: parse error')
+		result = measure(('failing', program('x YODA 1 LEAH 0'), None, OPTIONS))
+		self.assertTrue(result['error'].startswith('ZeroDivisionError'), result['error'])
+
+	def test_generated_programs_parse(self):
+		for (name, generator) in generators.items():
+			(source, iterations) = generator(1)
+			self.assertTrue(yoda_parse(yoda_lex(source)), name)
+		names = [name for (name, _, _) in programs([], 1)]
+		self.assertEqual(names, [os.path.splitext(os.path.basename(path))[0] for path in example_paths()] +
+						 sorted(generators))
+
+
+class CompareTest(unittest.TestCase):
+	def test_slower_phases(self):
+		baseline = {'a': timings('a', 1.0), 'b': timings('b', 1.0)}
+		(text, regressed) = compare([timings('a', 1.05), timings('b', 0.5)], baseline, 0.10)
+		self.assertFalse(regressed)
+		self.assertFalse('REGRESSION' in text)
+		(text, regressed) = compare([timings('a', 1.2)], baseline, 0.10)
+		self.assertTrue(regressed)
+		self.assertEqual(text.count('REGRESSION'), len(PHASES))
+
+	# Timer noise on tiny phases is not a regression
+	def test_tiny_phases(self):
+		(text, regressed) = compare([timings('a', 0.0004)], {'a': timings('a', 0.0001)}, 0.10)
+		self.assertFalse(regressed)
+
+	def test_new_errors_are_regressions(self):
+		failing = {'name': 'a', 'error': 'ZeroDivisionError: integer division or modulo by zero'}
+		(text, regressed) = compare([failing], {'a': timings('a', 1.0)}, 0.10)
+		self.assertTrue(regressed)
+		self.assertTrue('a                  error     ZeroDivisionError' in text)
+		self.assertTrue(text.rstrip().endswith('REGRESSION'))
+
+	# Programs that already failed in the baseline, or are not in it,
+	# are skipped
+	def test_skipped_programs(self):
+		baseline = {'a': {'name': 'a', 'error': 'ValueError: parse error'}}
+		for result in ({'name': 'a', 'error': 'ValueError: parse error'}, timings('a', 1.0),
+					   timings('new', 1.0)):
+			(text, regressed) = compare([result], baseline, 0.10)
+			self.assertFalse(regressed)
+			self.assertEqual(len(text.splitlines()), 1)
+
+
+class BaselineTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'baseline.json')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_round_trip(self):
+		results = [timings('a', 1.0), {'name': 'b', 'error': 'ValueError: parse error'}]
+		save(results, self.path, OPTIONS)
+		self.assertEqual(load(self.path), {'a': timings('a', 1.0), 'b': results[1]})
+
+	def test_other_versions(self):
+		with open(self.path, 'w') as file:
+			json.dump({'version': yoda_bench.BASELINE_VERSION + 1, 'results': {}}, file)
+		self.assertRaises(ValueError, load, self.path)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,110 @@
+#######################################
+# tests/test_budget.py
+# Tests of execution budgets
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import unittest
+from tests.support import *
+from yoda_interpreter import execute
+from yoda_visitor import Transformer
+from yoda_budget import Budget, BudgetExceeded, LimitedStringExp, StepStatement, govern, \
+	limited, current_budget
+
+FOREVER = program('i YODA 0', loop('LIGHT_SIDE', 'i YODA i VADER 1'))
+
+LONG_INTS = program('n YODA 1', 'i YODA 0',
+					loop('i SITH 70', 'n YODA n LUKE 3', 'i YODA i VADER 1'),
+					show('"n=" + n + " i=" + i + " " + n'))
+
+# Counts the nodes visited of each class
+class Census(Transformer):
+	def __init__(self):
+		self.seen = {}
+
+	def visit_LimitedStringExp(self, node):
+		self.seen['LimitedStringExp'] = self.seen.get('LimitedStringExp', 0) + 1
+		return self.generic_visit(node)
+
+	def visit_StepStatement(self, node):
+		self.seen['StepStatement'] = self.seen.get('StepStatement', 0) + 1
+		return self.generic_visit(node)
+
+	def visit_StringExp(self, node):
+		self.seen['StringExp'] = self.seen.get('StringExp', 0) + 1
+		return self.generic_visit(node)
+
+
+class BudgetTest(unittest.TestCase):
+	# Reasons the runs of source stopped for, over every configuration
+	def run_limited(self, source, budget):
+		ast = parse(source)
+		reasons = set()
+		for (engine, level, slots) in configurations():
+			with using(CaptureSink()):
+				try:
+					execute(optimize(ast, level), engine=engine, slots=slots, budget=budget)
+				except BudgetExceeded, error:
+					reasons.add(error.reason)
+				else:
+					reasons.add(None)
+		return reasons
+
+	def test_step_limit(self):
+		self.assertEqual(self.run_limited(FOREVER, Budget(max_steps=1000)), set(['steps']))
+
+	def test_string_limit(self):
+		self.assertEqual(self.run_limited(LONG_INTS, Budget(max_string=20)), set(['string']))
+		self.assertEqual(self.run_limited(LONG_INTS, Budget(max_string=200)), set([None]))
+
+	def test_time_limit(self):
+		self.assertEqual(self.run_limited(FOREVER, Budget(max_time=0.01)), set(['time']))
+
+	# Each loop iteration costs one check of its statements and itself
+	def test_steps_charged(self):
+		source = program('i YODA 0', loop('i SITH 10', 'x YODA i', 'i YODA i VADER 1'))
+		budget = Budget(max_steps=1000)
+		with using(CaptureSink()):
+			execute(parse(source), budget=budget)
+		self.assertEqual(budget.steps, 2 + 10 * 3)
+		self.assertRaises(BudgetExceeded, execute, parse(source), budget=Budget(max_steps=31))
+
+	def test_partial_environment(self):
+		for (engine, level, slots) in configurations():
+			try:
+				execute(optimize(parse(FOREVER), level), engine=engine, slots=slots,
+						budget=Budget(max_steps=100))
+			except BudgetExceeded, error:
+				self.assertEqual((error.reason, error.limit), ('steps', 100))
+				self.assertTrue(error.steps > 100)
+				self.assertTrue(0 < error.env['i'] <= 100, (engine, level, slots, error.env))
+			else:
+				self.fail('no budget exceeded on %s -O %d' % (engine, level))
+
+	# Governed programs run as before without a budget, or an ample one
+	def test_unlimited(self):
+		for (name, source) in examples().items():
+			if name == 'fibonacci.yoda':
+				continue
+			expected = run(parse(source))
+			self.assertEqual(run(govern(parse(source))), expected, name)
+			with limited(Budget(10 ** 6, 60, 10 ** 6)):
+				self.assertEqual(run(govern(parse(source))), expected, name)
+		self.assertEqual(current_budget().max_steps, None)
+
+	def test_transformers_see_check_nodes(self):
+		census = Census()
+		# Every print joins its string with "\n"
+		governed = govern(parse(program(show('"a" + x'), show('"b"'),
+										loop('DARK_SIDE', show('"c" + x')))))
+		visited = census.visit(governed)
+		self.assertEqual(visited, governed)
+		self.assertEqual(census.seen, {'LimitedStringExp': 3, 'StepStatement': 2, 'StringExp': 6})
+		self.assertTrue(isinstance(visited.statements[1].stmt, LimitedStringExp))
+		self.assertTrue(isinstance(visited.statements[0], StepStatement))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,135 @@
+#######################################
+# tests/test_cache.py
+# Tests of the on-disk cache of parsed programs
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import os
+import shutil
+import tempfile
+import unittest
+import yoda_cache
+from yoda_cache import parse_cached, cache_path, header, interpreter_version, EXTENSION
+from tests.support import *
+
+# parse, counting its calls
+class CountingParse:
+	def __init__(self):
+		self.calls = 0
+
+	def __call__(self, source):
+		self.calls += 1
+		result = yoda_parse(yoda_tokenize(source, positions=True))
+		return result and result.value
+
+
+class CacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'program.yoda')
+		self.parse = CountingParse()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def parse_cached(self, source, cache_dir=None):
+		return parse_cached(self.path, source, self.parse, cache_dir)
+
+	def cached(self):
+		return os.path.join(self.directory, 'program' + EXTENSION)
+
+	def test_hit_skips_the_parse(self):
+		for (name, source) in examples().items():
+			self.parse.calls = 0
+			first = self.parse_cached(source)
+			self.assertEqual(self.parse.calls, 1)
+			self.assertTrue(os.path.exists(self.cached()))
+			again = self.parse_cached(source)
+			self.assertEqual(self.parse.calls, 1, name)
+			self.assertEqual(again, first, name)
+			self.assertEqual(again, parse(source), name)
+
+	def test_locations_are_kept(self):
+		source = program('x YODA 1', show('x'))
+		self.parse_cached(source)
+		ast = self.parse_cached(source)
+		self.assertEqual(self.parse.calls, 1)
+		self.assertEqual([statement.location for statement in ast.statements], [(2, 1), (3, 1)])
+
+	def test_source_change_invalidates(self):
+		self.parse_cached(program(show('"one"')))
+		ast = self.parse_cached(program(show('"two"')))
+		self.assertEqual(self.parse.calls, 2)
+		self.assertEqual(run(ast), (u'two\n', None))
+		self.assertEqual(run(self.parse_cached(program(show('"two"')))), (u'two\n', None))
+		self.assertEqual(self.parse.calls, 2)
+		with open(self.cached(), 'rb') as file:
+			self.assertEqual(file.readline(), header(program(show('"two"'))))
+
+	def test_other_interpreter_version_invalidates(self):
+		source = program(show('"one"'))
+		self.parse_cached(source)
+		saved = yoda_cache._version[:]
+		yoda_cache._version[:] = ['yodac 0 python 2.7 grammar 0']
+		try:
+			self.parse_cached(source)
+		finally:
+			yoda_cache._version[:] = saved
+		self.assertEqual(self.parse.calls, 2)
+		self.parse_cached(source)
+		self.assertEqual(self.parse.calls, 3)
+
+	def test_header_names_the_grammar(self):
+		version = interpreter_version()
+		self.assertTrue(version.startswith('yodac %d python ' % yoda_cache.FORMAT_VERSION))
+		self.assertTrue(yoda_cache.yoda_arena in yoda_cache.grammar_modules)
+		self.assertTrue(yoda_cache.equality in yoda_cache.grammar_modules)
+		self.assertTrue(header('x').startswith(version + ' source '))
+
+	def test_corrupt_files_are_parsed_again(self):
+		source = program(show('"one"'))
+		self.parse_cached(source)
+		with open(self.cached(), 'rb') as file:
+			contents = file.read()
+		for corrupt in (contents[:len(contents) // 2], header(source) + 'junk', '', '\0' * 100):
+			with open(self.cached(), 'wb') as file:
+				file.write(corrupt)
+			calls = self.parse.calls
+			self.assertEqual(run(self.parse_cached(source)), (u'one\n', None))
+			self.assertEqual(self.parse.calls, calls + 1)
+		with open(self.cached(), 'rb') as file:
+			self.assertEqual(file.read(), contents)
+
+	def test_cache_dir(self):
+		source = program(show('"one"'))
+		cache_dir = os.path.join(self.directory, 'cache', 'nested')
+		self.parse_cached(source, cache_dir)
+		self.parse_cached(source, cache_dir)
+		self.assertEqual(self.parse.calls, 1)
+		self.assertFalse(os.path.exists(self.cached()))
+		self.assertTrue(os.path.exists(cache_path(self.path, source, cache_dir)))
+		self.assertEqual(os.listdir(cache_dir), [os.path.basename(cache_path(self.path, source, cache_dir))])
+
+	# A cache that cannot be written is not an error, and leaves no
+	# temporary files behind
+	def test_failed_store_is_skipped(self):
+		blocked = os.path.join(self.directory, 'blocked')
+		with open(blocked, 'w') as file:
+			file.write('not a directory')
+		source = program(show('"one"'))
+		for _ in range(2):
+			self.assertEqual(run(self.parse_cached(source, blocked)), (u'one\n', None))
+		self.assertEqual(self.parse.calls, 2)
+		unpicklable = IntArithmExp(lambda: 0)
+		self.assertTrue(parse_cached(self.path, source, lambda source: unpicklable) is unpicklable)
+		self.assertEqual(sorted(os.listdir(self.directory)), ['blocked'])
+
+	def test_parse_errors_are_not_cached(self):
+		self.assertEqual(self.parse_cached('x YODA'), None)
+		self.assertFalse(os.path.exists(self.cached()))
+
+
+if __name__ == '__main__':
+	unittest.main()
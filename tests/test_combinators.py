@@ -0,0 +1,98 @@
+#######################################
+# tests/test_combinators.py
+# Tests of the packrat memoization layer of the combinators
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import time
+import unittest
+from combinators import *
+
+WORD = 'WORD'
+
+def word(text):
+	return Reserved(text, WORD)
+
+def tokens(*texts):
+	return [(text, WORD) for text in texts]
+
+# Parser counting its calls
+class Counted(Parser):
+	def __init__(self, parser):
+		self.parser = parser
+		self.calls = 0
+
+	def __call__(self, tokens, pos):
+		self.calls += 1
+		return self.parser(tokens, pos)
+
+# Grammar where each level tries (level below + a) before
+# (level below + b), so that without memoization a chain of b's parses
+# the innermost level 2 ** depth times. Returns (grammar, innermost)
+def backtracking(depth):
+	innermost = Counted(word('x'))
+	level = innermost
+	for _ in range(depth):
+		level = Memo((level + word('a')) | (level + word('b')))
+	return (Phrase(level), innermost)
+
+def timed(parse):
+	start = time.time()
+	result = parse()
+	return (result, time.time() - start)
+
+
+class MemoTest(unittest.TestCase):
+	def test_hits_and_speedup(self):
+		depth = 16
+		source = tokens('x', *['b'] * depth)
+		(grammar, innermost) = backtracking(depth)
+		(plain, plain_time) = timed(lambda: grammar(source, 0))
+		self.assertEqual(innermost.calls, 2 ** depth)
+		innermost.calls = 0
+		table = MemoTable()
+		(memoized, memo_time) = timed(lambda: Packrat(grammar, table)(source, 0))
+		self.assertEqual(innermost.calls, 2)
+		self.assertEqual(memoized.value, plain.value)
+		self.assertEqual(memoized.pos, plain.pos)
+		self.assertEqual(table.hits, depth - 1)
+		self.assertTrue(table.stats()['hit_rate'] > 0)
+		self.assertTrue(memo_time * 10 < plain_time, (memo_time, plain_time))
+
+	def test_outside_packrat(self):
+		(grammar, innermost) = backtracking(3)
+		self.assertTrue(grammar(tokens('x', 'a', 'b', 'a'), 0))
+		self.assertEqual(active_memo(), None)
+
+	def test_failures_are_cached(self):
+		table = MemoTable()
+		memo = Memo(word('x'))
+		grammar = Packrat((memo + word('y')) | (memo + word('z')) | word('w'), table)
+		self.assertEqual(grammar(tokens('w'), 0).value, 'w')
+		self.assertEqual((table.hits, table.misses), (1, 1))
+
+	def test_bounded_entries(self):
+		depth = 12
+		table = MemoTable(max_entries=4)
+		(grammar, innermost) = backtracking(depth)
+		self.assertTrue(Packrat(grammar, table)(tokens('x', *['a'] * depth), 0))
+		self.assertTrue(table.size <= 4)
+		self.assertTrue(table.peak_size <= 5)
+		self.assertTrue(table.evictions > 0)
+
+	def test_commit_drops_earlier_positions(self):
+		table = MemoTable()
+		statement = Memo(word('s') + Opt(word('t')))
+		grammar = Packrat(Rep(statement + Commit(word(';'))), table)
+		result = grammar(tokens('s', ';', 's', 't', ';', 's', ';'), 0)
+		self.assertEqual(result.pos, 7)
+		self.assertEqual(table.floor, 7)
+		# Only the statement tried after the last separator is left
+		self.assertEqual(table.positions.keys(), [7])
+		self.assertEqual(table.evictions, 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
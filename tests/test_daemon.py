@@ -0,0 +1,197 @@
+#######################################
+# tests/test_daemon.py
+# Tests of the interpreter daemon, its client and their wire format
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+import yoda_client
+import yoda_daemon
+from tests.support import *
+from yoda_daemon import YodaServer, claim_socket
+from yoda_protocol import *
+
+# (frames, exit status) of the reply to raw request bytes
+def exchange(path, data):
+	connection = connect(path)
+	try:
+		file = connection.makefile('rwb', 0)
+		file.write(data)
+		connection.shutdown(socket.SHUT_WR)
+		frames = []
+		while True:
+			frame = read_frame(file)
+			if frame is None:
+				raise ProtocolError('no exit frame')
+			if frame[0] == EXIT:
+				return (frames, int(frame[1]))
+			frames.append(frame)
+	finally:
+		connection.close()
+
+def request(path, source, engine='tree', level=2):
+	data = StringIO()
+	write_request(data, source, engine, level, 'test.yoda')
+	return exchange(path, data.getvalue())
+
+
+class DaemonTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'yoda.sock')
+		self.servers = []
+
+	def tearDown(self):
+		for (server, thread) in self.servers:
+			server.shutdown()
+			server.server_close()
+			thread.join()
+		shutil.rmtree(self.directory)
+
+	def serve(self, path=None, **options):
+		server = YodaServer(path or self.path, **options)
+		thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01})
+		thread.start()
+		self.servers.append((server, thread))
+		return server
+
+	# (stdout, stderr, status) of a run through yoda_client
+	def client(self, source, engine='tree', level=2):
+		(saved_stdout, saved_stderr) = (sys.stdout, sys.stderr)
+		(sys.stdout, sys.stderr) = (StringIO(), StringIO())
+		try:
+			status = yoda_client.run('test.yoda', source, engine, level, self.path)
+			return (sys.stdout.getvalue(), sys.stderr.getvalue(), status)
+		finally:
+			(sys.stdout, sys.stderr) = (saved_stdout, saved_stderr)
+
+	def test_round_trip(self):
+		self.serve()
+		for (name, source) in examples().items():
+			if name == 'fibonacci.yoda':
+				continue
+			for engine in sorted(ENGINES):
+				for level in range(MAX_LEVEL + 1):
+					self.assertEqual(self.client(source, engine, level),
+									 (run(parse(source))[0].encode('utf-8'), '', 0), (name, engine, level))
+
+	def test_output_streams_in_frames(self):
+		self.serve(buffer_size=16)
+		source = program('i YODA 0', loop('i SITH 10', show('"line " + i'), 'i YODA i VADER 1'))
+		(frames, status) = request(self.path, source)
+		self.assertEqual(status, 0)
+		self.assertTrue(len(frames) > 3)
+		self.assertEqual([kind for (kind, _) in frames], [OUT] * len(frames))
+		self.assertEqual(''.join([data for (_, data) in frames]),
+						 ''.join(['line %d\n' % i for i in range(10)]))
+
+	def test_errors(self):
+		self.serve()
+		self.assertEqual(self.client(program('x YODA')), ('', 'Parse error!\n', 1))
+		(output, errors, status) = self.client(program('x YODA $'))
+		self.assertEqual((output, status), ('', 1))
+		self.assertTrue(errors.startswith('Illegal character'))
+		(output, errors, status) = self.client(program(show('"before"'), 'x YODA 1 LEAH 0'))
+		self.assertEqual((output, status), ('before\n', 1))
+		self.assertTrue('ZeroDivisionError' in errors)
+		self.assertEqual(self.client(program(show('"x"')), 'jit'), ('', 'unknown engine: jit\n', 1))
+		self.assertEqual(self.client(program(show('"x"')), 'tree', 9),
+						 ('', 'unknown optimization level: 9\n', 1))
+
+	def test_malformed_requests(self):
+		self.serve()
+		self.assertEqual(exchange(self.path, 'not json\n'), ([(ERR, 'malformed request header\n')], 1))
+		self.assertEqual(exchange(self.path, '{"length": 10}\nshort'),
+						 ([(ERR, 'connection closed after 5 of 10 bytes\n')], 1))
+		self.assertEqual(self.client(program(show('"still up"'))), ('still up\n', '', 0))
+
+	def test_prepared_programs_are_cached(self):
+		server = self.serve(cache_size=2)
+		calls = []
+		prepare_source = yoda_daemon.prepare_source
+		def counting(*arguments):
+			calls.append(arguments[1:3])
+			return prepare_source(*arguments)
+		yoda_daemon.prepare_source = counting
+		try:
+			sources = [program(show('"%d"' % i)) for i in range(3)]
+			for source in sources[:2] + sources[:2]:
+				self.assertEqual(self.client(source)[2], 0)
+			self.assertEqual(len(calls), 2)
+			self.client(sources[0], 'vm')
+			self.assertEqual(calls[-1], ('vm', 2))
+			self.assertEqual(len(server.cache.programs), 2)
+			# The least recently used program goes first
+			self.client(sources[1])
+			self.assertEqual(len(calls), 3)
+			self.client(sources[2])
+			self.assertEqual(self.client(sources[1]), ('1\n', '', 0))
+			self.assertEqual(len(calls), 4)
+			self.client(sources[0], 'vm')
+			self.assertEqual(len(calls), 5)
+		finally:
+			yoda_daemon.prepare_source = prepare_source
+
+	def test_budget(self):
+		self.serve(limits=(1000, None, None))
+		(output, errors, status) = self.client(program('x YODA 0', loop('LIGHT_SIDE', 'x YODA x VADER 1')))
+		self.assertEqual((output, status), ('', 1))
+		self.assertTrue(errors.startswith('Budget exceeded'))
+		self.assertEqual(self.client(program(show('"small"'))), ('small\n', '', 0))
+
+	def test_claim_socket(self):
+		claim_socket(self.path)
+		stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		stale.bind(self.path)
+		stale.close()
+		self.assertTrue(os.path.exists(self.path))
+		claim_socket(self.path)
+		self.assertFalse(os.path.exists(self.path))
+		self.serve()
+		saved_stderr = sys.stderr
+		sys.stderr = StringIO()
+		try:
+			self.assertRaises(SystemExit, claim_socket, self.path)
+		finally:
+			sys.stderr = saved_stderr
+
+	def test_no_daemon(self):
+		self.assertRaises(socket.error, self.client, program(show('"x"')))
+
+
+class ProtocolTest(unittest.TestCase):
+	def test_frames(self):
+		data = StringIO()
+		write_frame(data, OUT, 'two\nlines')
+		write_frame(data, EXIT, '0')
+		data.seek(0)
+		self.assertEqual(read_frame(data), (OUT, 'two\nlines'))
+		self.assertEqual(read_frame(data), (EXIT, '0'))
+		self.assertEqual(read_frame(data), None)
+
+	def test_bad_frames(self):
+		for reply in ('junk\n', 'what 3\nabc', 'out x\n', 'out 5\nabc'):
+			self.assertRaises(ProtocolError, read_frame, StringIO(reply))
+
+	def test_requests(self):
+		data = StringIO()
+		write_request(data, 'source\n', 'vm', 1, 'p.yoda')
+		data.seek(0)
+		self.assertEqual(read_request(data), ({'name': 'p.yoda', 'engine': 'vm', 'level': 1, 'length': 7},
+											  'source\n'))
+		self.assertEqual(read_request(StringIO('')), None)
+		for bad in ('{"length": 1}', '{}\n', '[1]\n'):
+			self.assertRaises(ProtocolError, read_request, StringIO(bad))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,241 @@
+#######################################
+# tests/test_engines.py
+# Differential tests of the execution engines
+#
+# Every program runs on every engine at every optimization level, with
+# and without slots, and must print what the tree-walker prints at
+# -O 0 and fail the same way.
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import os
+import sys
+import unittest
+from StringIO import StringIO
+from yoda_ast import *
+from yoda_closure import compile_closure
+from yoda_vm import *
+from yoda_transpile import to_python, compile_python
+from yoda_resolve import resolve
+from yoda_interpreter import execute, SLOT_ENGINES
+from tests.support import *
+
+# Programs beyond tests/*.yoda, by name
+PROGRAMS = {
+	# Chains as deep as they are long
+	'sum chain': program('x YODA 1', 'y YODA %s' % ' VADER '.join(['x'] * 300), show('y')),
+	'mixed chain': program(
+		'x YODA 1',
+		'y YODA %s' % ' SIDIOUS '.join(['(x LUKE 3 SIDIOUS (2 SIDIOUS x))'] * 150),
+		show('y')),
+	'and chain': program(
+		'x YODA 1',
+		when(' R2D2 '.join(['x ORDER 1'] * 200), show('"and"')),
+		when(' R2D2 '.join(['BB8 x ORDER 2'] * 200), show('"not"'))),
+	'concat chain': program('x YODA 1', show(' + '.join(['x', '"-"'] * 150))),
+	# R2D2 must not evaluate its right side when the left is false
+	'short circuit': program(
+		'x YODA 0',
+		when('x JEDI 0 R2D2 10 LEAH x JEDI 1', show('"no"')),
+		when('DARK_SIDE R2D2 1 CHEWBACCA x ORDER 0', show('"no"')),
+		when('BB8 (x JEDI 0 R2D2 1 LEAH x ORDER 0)', show('"yes"'))),
+	# C3PO must not evaluate its right side when the left is true, and
+	# R2D2 binds tighter
+	'or short circuit': program(
+		'x YODA 0',
+		when('x ORDER 0 C3PO 1 LEAH x ORDER 1', show('"yes"')),
+		when('LIGHT_SIDE C3PO 1 CHEWBACCA x ORDER 0', show('"yes"')),
+		when('x JEDI 0 C3PO x ORDER 1', show('"no"')),
+		when('DARK_SIDE C3PO x ORDER 0 R2D2 LIGHT_SIDE', show('"and first"')),
+		when('x ORDER 0 C3PO 1 LEAH x ORDER 1 R2D2 DARK_SIDE', show('"skipped and"')),
+		when('(DARK_SIDE C3PO LIGHT_SIDE) R2D2 DARK_SIDE', show('"no"')),
+		when('BB8 (x ORDER 1 C3PO x ORDER 2)', show('"yes"'))),
+	'or chain': program(
+		'x YODA 150',
+		when(' C3PO '.join(['x ORDER %d' % i for i in range(200)]), show('"or"')),
+		when(' C3PO '.join(['x ORDER 1000'] * 200), show('"no"'))),
+	'division by zero': program(show('"before"'), 'x YODA 0', 'y YODA 1 LEAH x', show('"after"')),
+	'unset variables': program(show('x'), 'y YODA x VADER 1', show('y + x')),
+	'nested loops': program(
+		'i YODA 0', 's YODA 0',
+		loop('i SITH 5', 'j YODA 0',
+			 loop('j SITH i', when('j CHEWBACCA 2 ORDER 0', 's YODA s VADER j'), 'j YODA j VADER 1'),
+			 'i YODA i VADER 1'),
+		show('"s=" + s')),
+}
+
+
+class EngineTest(unittest.TestCase):
+	def test_engines_agree(self):
+		failures = []
+		programs = examples()
+		programs.update(PROGRAMS)
+		for (name, source) in sorted(programs.items()):
+			failures.extend(disagreements(name, source))
+		self.assertEqual(failures, [], '\n'.join(failures))
+
+	def test_short_circuit(self):
+		self.assertEqual(run(parse(PROGRAMS['short circuit'])), ('yes\n', None))
+
+	def test_or_short_circuit(self):
+		ast = parse(PROGRAMS['or short circuit'])
+		for (engine, level, slots) in configurations():
+			self.assertEqual(run(ast, engine, level, slots), ('yes\nyes\nand first\nskipped and\nyes\n', None),
+							 (engine, level, slots))
+		ast = parse(PROGRAMS['or chain'])
+		for (engine, level, slots) in configurations():
+			self.assertEqual(run(ast, engine, level, slots), ('or\n', None), (engine, level, slots))
+
+	def test_division_by_zero(self):
+		self.assertEqual(run(parse(PROGRAMS['division by zero'])), ('before\n', 'ZeroDivisionError'))
+
+	def test_long_operator_chain(self):
+		ast = parse(PROGRAMS['sum chain'])
+		for (engine, level, slots) in configurations():
+			self.assertEqual(run(ast, engine, level, slots), ('300\n', None))
+
+
+class ClosureTest(unittest.TestCase):
+	# Nodes without a compiler run through their own eval
+	def test_unknown_nodes_use_eval(self):
+		class Twice(ArithmExp):
+			__slots__ = ('exp',)
+
+			def __init__(self, exp):
+				self.exp = exp
+
+			def eval(self, env):
+				return 2 * self.exp.eval(env)
+		env = {'x': 4}
+		compile_closure(AssignStatement('y', AddExp(Twice(VarArithmExp('x')), IntArithmExp(1))))(env)
+		self.assertEqual(env, {'x': 4, 'y': 9})
+
+
+class VMTest(unittest.TestCase):
+	def opcodes(self, program):
+		return [opcode_names[program.code[pc]]
+				for pc in range(0, len(program.code), INSTRUCTION_SIZE)]
+
+	# Loops and ifs are jumps, with the loop condition at the bottom
+	def test_control_flow_is_jumps(self):
+		source = program('x YODA 1', loop('x SITH 10', 'x YODA x VADER 1'),
+						 when('x ORDER 10', show('x')))
+		compiled = compile_bytecode(parse(source))
+		self.assertEqual(self.opcodes(compiled),
+						 ['LOAD_CONST', 'STORE_VAR', 'JUMP', 'BINARY_VAR_CONST', 'STORE_VAR',
+						  'BINARY_VAR_CONST', 'JUMP_IF_TRUE', 'BINARY_VAR_CONST', 'JUMP_IF_FALSE',
+						  'LOAD_VAR', 'LOAD_CONST', 'JOIN', 'PRINT'])
+		self.assertEqual(compiled.code[2 * INSTRUCTION_SIZE + 1], 5 * INSTRUCTION_SIZE)
+		self.assertEqual(compiled.code[6 * INSTRUCTION_SIZE + 1], 3 * INSTRUCTION_SIZE)
+		self.assertEqual(compiled.code[8 * INSTRUCTION_SIZE + 1], len(compiled.code))
+		self.assertEqual(compiled.names, ['x'])
+
+	# 1 and True are equal in Python but are different constants
+	def test_constant_pool(self):
+		source = program('x YODA 1', 'y YODA 1', when('LIGHT_SIDE R2D2 x ORDER 1', 'z YODA 1'))
+		compiled = compile_bytecode(parse(source))
+		self.assertEqual([(type(value), value) for value in compiled.constants],
+						 [(int, 1), (bool, True)])
+
+	def test_unknown_nodes_use_eval(self):
+		node = PrintStatement(JoinStringExp([VarArithmExp('x'), StringExp('"!"')]))
+		class Shout(Statement):
+			__slots__ = ()
+
+			def eval(self, env):
+				env['x'] = 'hey'
+		compiled = compile_bytecode(BlockStatement([Shout(), node]))
+		self.assertEqual(self.opcodes(compiled)[0], 'EXEC')
+		with using(CaptureSink()) as sink:
+			compiled({})
+		self.assertEqual(sink.getvalue(), u'hey!')
+
+
+# Calls function with sys.stderr captured and fd 2, where CPython's own
+# parser complains, sent to /dev/null. Returns (result, captured text)
+def warnings_of(function, *args):
+	(stderr, sys.stderr) = (sys.stderr, StringIO())
+	saved = os.dup(2)
+	null = os.open(os.devnull, os.O_WRONLY)
+	os.dup2(null, 2)
+	try:
+		return (function(*args), sys.stderr.getvalue())
+	finally:
+		os.dup2(saved, 2)
+		os.close(saved)
+		os.close(null)
+		sys.stderr = stderr
+
+
+class TranspileTest(unittest.TestCase):
+	def assignment(self, source):
+		lines = to_python(parse(program('y YODA ' + source))).splitlines()
+		return [line.strip() for line in lines if line.strip().startswith('v_y =')][-1]
+
+	# Parentheses only where Python would group differently
+	def test_parentheses(self):
+		self.assertEqual(self.assignment('1 VADER 2 VADER x'), 'v_y = 1 + 2 + v_x')
+		self.assertEqual(self.assignment('x SIDIOUS (2 SIDIOUS 1)'), 'v_y = v_x - (2 - 1)')
+		self.assertEqual(self.assignment('(x VADER 2) LUKE 3'), 'v_y = (v_x + 2) * 3')
+		self.assertEqual(self.assignment('x VADER 2 LUKE 3'), 'v_y = v_x + 2 * 3')
+
+	# Yoda variables named like Python keywords or the parameters of the
+	# generated function
+	def test_names(self):
+		source = program('env YODA 2', 'def YODA env LUKE 3', 'main YODA def VADER text',
+						 show('main + " " + write'))
+		self.assertEqual(disagreements('names', source), [])
+		self.assertEqual(run(parse(source), 'python'), ('6 0\n', None))
+
+	# Expressions too deep for CPython's compiler run on the closure
+	# engine, with a warning
+	def test_fallback(self):
+		exp = VarArithmExp('x')
+		for _ in range(150):
+			exp = AddExp(IntArithmExp(1), exp)
+		ast = BlockStatement([AssignStatement('x', IntArithmExp(2)), AssignStatement('y', exp)])
+		(compiled, warning) = warnings_of(compile_python, ast)
+		self.assertTrue('running it on the closure engine' in warning, warning)
+		env = {}
+		compiled(env)
+		self.assertEqual(env, {'x': 2, 'y': 152})
+
+	def test_no_warning(self):
+		(_, warning) = warnings_of(compile_python, parse(PROGRAMS['sum chain']))
+		self.assertEqual(warning, '')
+
+
+class SlotTest(unittest.TestCase):
+	def test_resolve(self):
+		ast = parse(program('x YODA y VADER 1', 'y YODA x', show('z')))
+		(resolved, symbols) = resolve(ast)
+		self.assertEqual(symbols.names, ['x', 'y', 'z'])
+		self.assertEqual(symbols.assigned, set(['x', 'y']))
+		self.assertEqual(resolved.statements[0],
+						 SlotAssignStatement('x', 0, AddExp(SlotArithmExp('y', 1), IntArithmExp(1))))
+		self.assertEqual(resolved.statements[0].location, (2, 1))
+		self.assertEqual(ast.statements[0].exp.left, VarArithmExp('y'))
+
+	def test_frames(self):
+		(_, symbols) = resolve(parse(program('x YODA y VADER 1', 'y YODA x')))
+		frame = symbols.frame({'x': 5, 'unused': 7})
+		self.assertEqual(frame, [5, 0])
+		self.assertEqual(symbols.to_env([3, 4]), {'x': 3, 'y': 4})
+		env = {'unused': 7}
+		self.assertTrue(symbols.to_env([3, 4], env) is env)
+		self.assertEqual(env, {'x': 3, 'y': 4, 'unused': 7})
+
+	# Variables come from env and go back to it, even on errors
+	def test_env_in_and_out(self):
+		ast = parse(program('x YODA a VADER 1', 'y YODA x LEAH a', 'z YODA 1'))
+		for engine in SLOT_ENGINES:
+			self.assertEqual(execute(ast, {'a': 2}, engine), {'a': 2, 'x': 3, 'y': 1, 'z': 1})
+			env = {}
+			self.assertRaises(ZeroDivisionError, execute, ast, env, engine)
+			self.assertEqual(env['x'], 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
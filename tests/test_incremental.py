@@ -0,0 +1,114 @@
+#######################################
+# tests/test_incremental.py
+# Tests of incremental lexing and parsing
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import random
+import unittest
+from lexer import LexError
+from yoda_incremental import parse_document, reparse
+from tests.support import *
+
+# (tokens, ast) of a full parse of source; either is None on an error
+def full_parse(source):
+	try:
+		tokens = yoda_tokenize(source, positions=True)
+	except LexError:
+		return (None, None)
+	result = yoda_parse(tokens)
+	return (tokens, result.value if result else None)
+
+LONG = program(*['x%d YODA %d' % (i, i) for i in range(200)] +
+			   [loop('x0 SITH 3', 'x0 YODA x0 VADER 1'), show('x0 + " " + x199')])
+
+
+class ReparseTest(unittest.TestCase):
+	def check(self, document, source):
+		(tokens, ast) = full_parse(source)
+		self.assertEqual(document.source, source)
+		self.assertEqual(document.tokens, tokens)
+		self.assertEqual(document.ast, ast)
+		if ast is not None:
+			self.assertEqual(locations(document.ast), locations(ast))
+
+	def test_statement_edits(self):
+		source = examples()['chewie.yoda']
+		document = parse_document(source)
+		offset = source.index(';') + 1
+		for inserted in ('\n\tzz YODA 4;', ' ', '\n\n'):
+			document = reparse(document, offset, 0, inserted)
+			source = source[:offset] + inserted + source[offset:]
+			self.check(document, source)
+		document = reparse(document, offset, len(inserted), '')
+		source = source[:offset] + source[offset + len(inserted):]
+		self.check(document, source)
+
+	def test_random_edits(self):
+		generator = random.Random(25)
+		snippets = [' ', '\n', ';', 'x', ' VADER 1', ';\nzz YODA 4', 'DO ', '"s"', '$']
+		for (name, original) in sorted(examples().items()):
+			source = original
+			document = parse_document(source)
+			for _ in range(100):
+				offset = generator.randrange(len(source))
+				removed = min(generator.choice([0, 0, 1, 3]), len(source) - offset)
+				inserted = generator.choice(snippets)
+				edited = source[:offset] + inserted + source[offset + removed:]
+				document = reparse(document, offset, removed, inserted)
+				self.check(document, edited)
+				if document.ast is None:
+					# Undo edits that break the program, so that most
+					# edits apply to one that parses
+					document = reparse(document, offset, len(inserted), source[offset:offset + removed])
+					self.check(document, source)
+				else:
+					source = edited
+
+	# Only the edited statement is parsed again; the others are the same
+	# objects, moved when the edit adds lines
+	def test_other_statements_are_reused(self):
+		source = LONG
+		document = parse_document(source)
+		before = list(document.statements)
+		self.assertEqual(len(before), 202)
+		offset = source.index('x100 YODA 100') + len('x100 YODA 10')
+		for (at, removed, inserted) in ((offset, 1, '7'), (offset + 1, 0, ' VADER\n1')):
+			document = reparse(document, at, removed, inserted)
+			source = source[:at] + inserted + source[at + removed:]
+			self.check(document, source)
+			self.assertTrue(document.statements[100] is not before[100])
+			for index in range(202):
+				if index != 100:
+					self.assertTrue(document.statements[index] is before[index], index)
+		self.assertEqual(document.statements[100], AssignStatement('x100', AddExp(IntArithmExp(107),
+																				   IntArithmExp(1))))
+		self.assertEqual(document.statements[101].location, (104, 1))
+		self.assertEqual(run(document.ast), (u'3 199\n', None))
+
+	def test_errors(self):
+		document = parse_document(LONG)
+		document = reparse(document, LONG.index('x5 YODA'), 0, '$')
+		self.assertEqual((document.ast, document.tokens), (None, None))
+		self.assertTrue(document.errors().startswith('Illegal character'))
+		offset = LONG.index('x5 YODA') + len('x5 YODA')
+		document = reparse(parse_document(LONG), offset, 0, ' VADER')
+		self.assertEqual(document.ast, None)
+		self.assertEqual(document.errors(), 'Parse error!\n')
+		self.assertEqual(document.statements.count(None), 1)
+		document = reparse(document, offset, len(' VADER'), '')
+		self.check(document, LONG)
+		self.assertEqual(document.errors(), None)
+
+	# Edits of the program's frame parse it all again
+	def test_frame_edits(self):
+		document = reparse(parse_document(LONG), 0, 1, 'B')
+		self.assertEqual(document.ast, None)
+		document = reparse(document, 0, 1, 'A')
+		self.check(document, LONG)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,143 @@
+#######################################
+# tests/test_lexer.py
+# Tests of the token table and the ways it lexes a source
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import re
+import unittest
+from StringIO import StringIO
+from array import array
+from lexer import TokenTable, TokenStream, LexError
+from combinators import Reserved, Tag
+from yoda_lexer import *
+from yoda_parser import yoda_parse
+from tests.support import examples, locations
+
+# The lexer before the master regex: every expression is tried in turn
+# at each position and the first one that matches wins
+def lex_one_at_a_time(characters, token_exprs):
+	pos = 0
+	tokens = []
+	while pos < len(characters):
+		for (pattern, tag) in token_exprs:
+			match = re.compile(pattern).match(characters, pos)
+			if match:
+				if tag:
+					tokens.append((match.group(0), tag))
+				break
+		else:
+			raise LexError('Illegal character: %s\\n' % characters[pos])
+		pos = match.end(0)
+	return tokens
+
+# Keywords that start with another keyword or with an identifier
+PREFIXES = 'SITH_ORDER SITH SITHS JEDI_ORDER JEDI_ORDERS BB8_ORDER BB8 ORDER ORDERS ' \
+		   'DO DOX OR DO NOT... R2D2 C3PO YODAS "a\\"b\\\\" "\\0\\n\\t" 007 x_1'
+
+
+class MasterRegexTest(unittest.TestCase):
+	def test_same_tokens_as_one_at_a_time(self):
+		for source in examples().values() + [PREFIXES]:
+			self.assertEqual(yoda_tokenize(source), lex_one_at_a_time(source, internalTokens))
+
+	def test_first_expression_wins(self):
+		table = TokenTable([(r'[a-z]+', 'WORD'), (r'if', 'IF'), (r'[0-9]+', 'INT'), (r' ', None)])
+		self.assertEqual(table.tokenize('if x 12'), [('if', 'WORD'), ('x', 'WORD'), ('12', 'INT')])
+
+	def test_nested_groups_keep_their_tag(self):
+		table = TokenTable([(r'(a(b)?)+', 'AB'), (r'(c)', 'C')])
+		self.assertEqual(table.tokenize('ababac'), [('ababa', 'AB'), ('c', 'C')])
+
+	def test_positions(self):
+		tokens = yoda_tokenize('A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...\n  x YODA 1', True)
+		self.assertEqual(tokens[1:], [('x', IDENTIFIER, 2, 3), ('YODA', SYS_VAR, 2, 5),
+									  ('1', INTEGER, 2, 10)])
+
+	def test_illegal_character(self):
+		self.assertRaises(LexError, yoda_tokenize, 'x YODA $')
+
+
+class StreamTest(unittest.TestCase):
+	def test_same_tokens_as_tokenize(self):
+		for source in examples().values():
+			for positions in (True, False):
+				expected = yoda_tokenize(source, positions)
+				for chunk_size in (4096, 64, 13, 7, 2, 1):
+					tokens = list(yoda_lex_stream(StringIO(source), chunk_size, positions))
+					self.assertEqual(tokens, expected)
+
+	# Chunks shorter than the keywords must not split the first keyword
+	# into identifiers
+	def test_keywords_across_chunks(self):
+		source = examples()['helloWorld.yoda']
+		self.assertEqual(tokenTable.lookahead, len('A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...'))
+		tokens = list(yoda_lex_stream(StringIO(source), 7))
+		self.assertEqual(tokens[0], ('A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...', SYS_VAR, 1, 1))
+
+	def test_long_tokens(self):
+		source = '"%s" %s' % ('s' * 1000, 'x' * 1000)
+		self.assertEqual(list(yoda_lex_stream(StringIO(source), 16, False)), yoda_tokenize(source))
+
+
+class TokenStreamTest(unittest.TestCase):
+	def test_same_tokens_and_trees(self):
+		for (name, source) in examples().items():
+			for positions in (False, True):
+				tokens = yoda_tokenize(source, positions)
+				stream = yoda_tokenize(source, positions, compact=True)
+				self.assertTrue(isinstance(stream, TokenStream))
+				self.assertEqual(list(stream), tokens)
+				self.assertEqual(len(stream), len(tokens))
+				self.assertEqual(stream[-1], tokens[-1])
+				self.assertEqual(stream[1:4], tokens[1:4])
+				(expected, actual) = (yoda_parse(tokens), yoda_parse(stream))
+				self.assertEqual(actual.value, expected.value, name)
+				self.assertEqual(actual.pos, expected.pos)
+				self.assertEqual(locations(actual.value), locations(expected.value))
+
+	# Kinds and offsets are arrays over the source, and text is sliced
+	# out only when it is asked for
+	def test_arrays(self):
+		source = 'x YODA 12 VADER yy'
+		stream = yoda_tokenize(source, compact=True)
+		for buffer in (stream.kinds, stream.starts, stream.ends):
+			self.assertTrue(isinstance(buffer, array))
+		self.assertEqual((list(stream.starts), list(stream.ends)), ([0, 2, 7, 10, 16], [1, 6, 9, 15, 18]))
+		self.assertTrue(stream.source is source)
+		self.assertEqual(stream.text(4), 'yy')
+		self.assertEqual(stream.kinds[1], tokenTable.kind_of('YODA'))
+		self.assertEqual(stream.kinds[0], stream.kinds[4])
+		self.assertEqual(stream.kinds.itemsize, 1)
+
+	def test_keywords_match_by_kind(self):
+		stream = yoda_tokenize('YODA SITH x', compact=True)
+		self.assertEqual(Reserved('YODA', SYS_VAR)(stream, 0).value, 'YODA')
+		self.assertEqual(Reserved('YODA', SYS_VAR)(stream, 1), None)
+		self.assertEqual(Tag(IDENTIFIER)(stream, 2).value, 'x')
+		self.assertEqual(Reserved('x', SYS_VAR)(stream, 2), None)
+		self.assertEqual(Reserved('YODA', SYS_VAR)(stream, 3), None)
+		# A keyword bound to one table is bound again for another
+		keyword = Reserved('IF', 'KEYWORD')
+		table = TokenTable([(r'IF', 'KEYWORD'), (r'[A-Z]+', 'WORD'), (r' ', None)])
+		self.assertEqual(keyword(table.tokenize('IF X', compact=True), 0).value, 'IF')
+		self.assertEqual(keyword(yoda_tokenize('x', compact=True), 0), None)
+		self.assertEqual(keyword(table.tokenize('X IF', compact=True), 1).value, 'IF')
+
+	def test_keyword_that_is_not_literal(self):
+		# The last keyword's expression starts with '...', which matches
+		# any three characters; only the real keyword ends a program
+		source = examples()['helloWorld.yoda'].replace('...MAY', 'xyzMAY')
+		self.assertEqual(yoda_parse(yoda_tokenize(source)), None)
+		self.assertEqual(yoda_parse(yoda_tokenize(source, compact=True)), None)
+
+	def test_illegal_character(self):
+		source = examples()['chewie.yoda'].replace(';', '$', 1)
+		self.assertRaises(LexError, yoda_tokenize, source)
+		self.assertRaises(LexError, yoda_tokenize, source, False, True)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,90 @@
+#######################################
+# tests/test_loops.py
+# Tests of loop-invariant hoisting and induction updates (-O 3)
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import unittest
+from yoda_ast import *
+from yoda_optimizer import optimize, MAX_LEVEL
+from yoda_loops import optimize_loops
+from yoda_interpreter import execute
+from tests.support import *
+
+(a, b, i, j, temp) = [VarArithmExp(name) for name in ('a', 'b', 'i', 'j', '_licm0')]
+
+PROGRAMS = {
+	'loop invariants': program(
+		'a YODA 3', 'b YODA 4', 'i YODA 0',
+		loop('i SITH 10', 'y YODA a LUKE b VADER i', 'i YODA i VADER 1'),
+		show('y + " " + i')),
+	'nested invariants': program(
+		'a YODA 3', 'b YODA 4', 'i YODA 0', 's YODA 0',
+		loop('i SITH 10', 'j YODA 0',
+			 loop('j SITH 3', 's YODA s VADER a LUKE b VADER j', 'z YODA a LEAH b', 'j YODA j VADER 1'),
+			 'i YODA 1 VADER i'),
+		show('s + " " + z')),
+	# A hoisted expression runs even when its loop does not, so only
+	# expressions that cannot raise move
+	'loop that never runs': program(
+		'b YODA 0',
+		loop('b JEDI 0', 'y YODA 10 LEAH b', 'z YODA b VADER 1 LUKE 2'),
+		show('"done " + y')),
+	'updates': program(
+		'n YODA 1', 'k YODA 0',
+		loop('k SITH 20', 'n YODA 3 LUKE n', 'n YODA n SIDIOUS n LEAH 2', 'k YODA 1 VADER k'),
+		show('n + " " + k')),
+}
+
+def loop_of(node):
+	if isinstance(node, WhileStatement):
+		return node
+	return [statement for statement in node.statements if isinstance(statement, WhileStatement)][0]
+
+
+class LoopTest(unittest.TestCase):
+	def test_engines_agree(self):
+		failures = []
+		for (name, source) in sorted(PROGRAMS.items()):
+			failures.extend(disagreements(name, source))
+		self.assertEqual(failures, [], '\n'.join(failures))
+
+	def test_hoisting(self):
+		ast = optimize_loops(parse(PROGRAMS['loop invariants']))
+		(hoisted, loop) = ast.statements[3].statements
+		self.assertEqual(hoisted, AssignStatement('_licm0', MulExp(a, b)))
+		self.assertEqual(loop.body.statements,
+						 [AssignStatement('y', AddExp(temp, i)),
+						  AugAssignStatement('i', 'VADER', IntArithmExp(1))])
+		# The temporary is attributed to the loop it came from
+		self.assertEqual(hoisted.location, loop.location)
+
+	# The inner loop's temporary moves out of the outer loop too; the
+	# division stays where it is
+	def test_nested_loops(self):
+		ast = optimize(parse(PROGRAMS['nested invariants']), MAX_LEVEL)
+		self.assertEqual(ast.statements[4], AssignStatement('_licm0', MulExp(a, b)))
+		inner = loop_of(loop_of(ast).body)
+		self.assertEqual(inner.body.statements[1], AssignStatement('z', DivExp(a, b)))
+
+	def test_updates(self):
+		body = loop_of(optimize_loops(parse(PROGRAMS['updates']))).body
+		self.assertEqual(body.statements,
+						 [AugAssignStatement('n', 'LUKE', IntArithmExp(3)),
+						  AssignStatement('n', SubExp(VarArithmExp('n'), DivExp(VarArithmExp('n'),
+																				  IntArithmExp(2)))),
+						  AugAssignStatement('k', 'VADER', IntArithmExp(1))])
+
+	def test_temporaries_stay_out_of_env(self):
+		ast = optimize(parse(PROGRAMS['loop invariants']), MAX_LEVEL)
+		for engine in sorted(ENGINES):
+			for slots in (True, False):
+				with using(CaptureSink()):
+					env = execute(ast, engine=engine, slots=slots)
+				self.assertEqual(sorted(env), ['a', 'b', 'i', 'y'])
+
+
+if __name__ == '__main__':
+	unittest.main()
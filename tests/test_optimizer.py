@@ -0,0 +1,102 @@
+#######################################
+# tests/test_optimizer.py
+# Tests of constant folding and branch pruning
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import unittest
+from yoda_ast import *
+from yoda_optimizer import optimize, join_literals
+from tests.support import *
+
+PROGRAMS = {
+	# Escapes must not run into the literal after them when the
+	# optimizer joins literals
+	'escapes': program(
+		'IVE GOT A BAD FEELING ABOUT THIS "a\\0" + "12" + "\\n"',
+		'IVE GOT A BAD FEELING ABOUT THIS "\\\\" + "n" + "\\t" + "0" + "\\n"',
+		'IVE GOT A BAD FEELING ABOUT THIS "\\"" + "x\\"" + "\\n"',
+		'x YODA 7',
+		'IVE GOT A BAD FEELING ABOUT THIS "\\0" + x + "1" + "%d" + "\\n"'),
+	'constant chain': program('y YODA %s' % ' VADER '.join(['1'] * 300), show('y')),
+	'pruning': program(
+		'x YODA 3 LUKE 4 SIDIOUS 2',
+		when('x JEDI 5 R2D2 LIGHT_SIDE', show('"big"')),
+		when('BB8 BB8 (2 SITH 1)', show('"never"')),
+		loop('DARK_SIDE', show('"never"')),
+		'y YODA 1 LEAH 0',
+		show('"unreached"')),
+	'constant conditions': program(
+		'x YODA 0',
+		when('DARK_SIDE R2D2 1 LEAH x ORDER 1', show('"no"')),
+		when('1 LEAH x ORDER 1 R2D2 DARK_SIDE', show('"no"'))),
+}
+
+def statements(source, level):
+	ast = optimize(parse(source), level)
+	if isinstance(ast, BlockStatement):
+		return ast.statements
+	return [ast]
+
+# String literal node holding value
+def literal(value):
+	node = StringExp('""')
+	node.value = value
+	return node
+
+
+class FoldingTest(unittest.TestCase):
+	def test_engines_agree(self):
+		failures = []
+		for (name, source) in sorted(PROGRAMS.items()):
+			failures.extend(disagreements(name, source))
+		self.assertEqual(failures, [], '\n'.join(failures))
+
+	def test_escapes_across_joins(self):
+		ast = parse(PROGRAMS['escapes'])
+		self.assertEqual(run(ast, 'tree', 1), (u'a\x0012\n\\n\t0\n"x"\n\x0071%d\n', None))
+
+	# Joined literals are written with escapes the lexer accepts, so
+	# that a folded tree reads back as source
+	def test_joined_literals_lex(self):
+		values = [u'a\x00', u'12', u'\x00', u'0', u'\\', u'n', u'"', u'\n', u'\t', u'\xe9\x01', u'']
+		for left in values:
+			for right in values:
+				joined = join_literals(literal(left), literal(right))
+				self.assertEqual(yoda_tokenize(joined.s), [(joined.s, STRING)])
+				self.assertEqual(joined.value, left + right)
+				self.assertEqual(StringExp(joined.s).value, left + right)
+
+	def test_folding(self):
+		(assign,) = statements(program('x YODA 1 VADER 2 LUKE (3 SIDIOUS 1)'), 1)
+		self.assertEqual(assign, AssignStatement('x', IntArithmExp(5)))
+		(assign,) = statements(program('x YODA 1 LEAH 0'), 1)
+		self.assertEqual(assign, AssignStatement('x', DivExp(IntArithmExp(1), IntArithmExp(0))))
+		(assign,) = statements(program('x YODA %s' % ' VADER '.join(['1'] * 5000)), 1)
+		self.assertEqual(assign, AssignStatement('x', IntArithmExp(5000)))
+
+	def test_pruning(self):
+		self.assertEqual(len(statements(PROGRAMS['pruning'], 1)), 6)
+		pruned = statements(PROGRAMS['pruning'], 2)
+		self.assertEqual([statement.__class__ for statement in pruned],
+						 [AssignStatement, IfStatement, AssignStatement, PrintStatement])
+		self.assertEqual(pruned[1].condition, GtExp(VarArithmExp('x'), IntArithmExp(5)))
+
+	# A constant operand only replaces the other one when that cannot
+	# raise, or when it is on the left and so decides first
+	def test_constant_operands(self):
+		(assign, first, second) = statements(PROGRAMS['constant conditions'], 1)
+		self.assertEqual(first.condition, FalseBoolExp('DARK_SIDE'))
+		self.assertTrue(isinstance(second.condition, AndBoolExp))
+
+	def test_parsed_tree_untouched(self):
+		ast = parse(PROGRAMS['pruning'])
+		before = repr(ast)
+		optimize(ast, 3)
+		self.assertEqual(repr(ast), before)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,94 @@
+#######################################
+# tests/test_output.py
+# Tests of the output sinks
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+from yoda_output import *
+from tests.support import *
+
+# Prints with and without escapes, so both str and unicode
+PRINTS = ['abc', u'caf\xe9 \u2603\n', '', u'\x00']
+
+# Sinks of every kind, each with a function returning what it wrote
+def sinks():
+	stream = StringIO()
+	yield (StreamSink(stream), stream.getvalue)
+	for sink_class in (BufferedSink, FdSink):
+		file = tempfile.TemporaryFile()
+		yield (sink_class(file.fileno()), written_to(file))
+	capture = CaptureSink()
+	yield (capture, capture.getvalue)
+	yield (NullSink(), lambda: None)
+
+def written_to(file):
+	def written():
+		file.seek(0)
+		return file.read()
+	return written
+
+
+class SinkTest(unittest.TestCase):
+	# --output-stats gives the same numbers whichever sink prints
+	def test_bytes_are_encoded_bytes(self):
+		expected = len(''.join([encode(text) for text in PRINTS]))
+		for (sink, written) in sinks():
+			with using(sink):
+				for text in PRINTS:
+					write(text)
+			self.assertEqual(sink.stats()['bytes'], expected, sink)
+			if written() is not None:
+				self.assertEqual(encode(written()), ''.join([encode(text) for text in PRINTS]), sink)
+
+	def test_buffered_flushes_at_size(self):
+		file = tempfile.TemporaryFile()
+		sink = BufferedSink(file.fileno(), size=25)
+		for _ in range(4):
+			sink.write('x' * 10)
+		self.assertEqual(written_to(file)(), 'x' * 30)
+		self.assertEqual(sink.flushes, 1)
+		sink.close()
+		self.assertEqual(written_to(file)(), 'x' * 40)
+		self.assertEqual(sink.stats(), {'bytes': 40, 'flushes': 2})
+
+	# Output left pending by a program that goes quiet is written by
+	# the timer
+	def test_buffered_flushes_on_timer(self):
+		file = tempfile.TemporaryFile()
+		sink = BufferedSink(file.fileno(), interval=0.05)
+		sink.write('early')
+		deadline = time.time() + 5
+		while not written_to(file)() and time.time() < deadline:
+			time.sleep(0.01)
+		self.assertEqual(written_to(file)(), 'early')
+		sink.write(' late')
+		sink.flush()
+		self.assertEqual(written_to(file)(), 'early late')
+		self.assertEqual(sink.timer, None)
+		self.assertEqual(sink.flushes, 2)
+
+	# The sink is flushed and the previous one restored even when the
+	# program fails
+	def test_using_on_errors(self):
+		outer = current_sink()
+		file = tempfile.TemporaryFile()
+		sink = BufferedSink(file.fileno())
+		ast = parse(program(show('"before"'), 'x YODA 1 LEAH 0'))
+		for engine in sorted(ENGINES):
+			try:
+				with using(sink):
+					prepare(ast, engine)({})
+			except ZeroDivisionError:
+				pass
+			self.assertTrue(current_sink() is outer)
+		self.assertEqual(written_to(file)(), 'before\n' * len(ENGINES))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,198 @@
+#######################################
+# tests/test_parser.py
+# Tests of the yoda grammar and the trees it builds
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import random
+import unittest
+from combinators import *
+from yoda_lexer import *
+from yoda_ast import *
+from yoda_parser import YodaParser, yodaParser, yoda_parse, parser, stmt, stmt_list, bool_exp, \
+	ExpressionParser, ARITHM_EXP, BOOL_EXP, STRING_EXP, keyword, arithm_precedence_levels, \
+	bool_precedence_levels, string_precedence_levels, relop_operators, process_binop, \
+	process_logic, process_string, process_group
+from tests.support import examples
+
+# Every parser reachable from start
+def reachable(start):
+	seen = {}
+	pending = [start]
+	while pending:
+		node = pending.pop()
+		if id(node) in seen:
+			continue
+		seen[id(node)] = node
+		pending.extend(value for value in vars(node).values() if isinstance(value, Parser))
+	return seen.values()
+
+
+class GrammarTest(unittest.TestCase):
+	def test_rules_are_built_once(self):
+		self.assertTrue(stmt() is stmt())
+		self.assertTrue(bool_exp() is bool_exp())
+		self.assertTrue(yodaParser.grammar is parser())
+
+	def test_grammar_is_frozen(self):
+		lazies = [node for node in reachable(yodaParser.grammar) if isinstance(node, Lazy)]
+		self.assertTrue(lazies)
+		for lazy in lazies:
+			self.assertTrue(lazy.parser is stmt_list())
+
+	def test_reused_across_parses(self):
+		sources = examples().values()
+		first = [yoda_parse(yoda_tokenize(source)).value for source in sources]
+		for _ in range(3):
+			again = [yodaParser.parse(yoda_tokenize(source)).value for source in sources]
+			self.assertEqual(again, first)
+		fresh = YodaParser()
+		self.assertEqual([fresh.parse(yoda_tokenize(source)).value for source in sources], first)
+
+
+# The expression grammar ExpressionParser replaced: one Exp per level
+# of the same precedence tables, and a boolean term that tries BB8, a
+# relop, a constant and a group in turn. Returns the arithmetic, boolean
+# and string expression parsers
+def exp_chain_grammar():
+	rules = {}
+	def any_of(ops):
+		return reduce(lambda left, right: left | right, [keyword(op) for op in ops])
+	def precedence(value, levels, combine):
+		for level in levels:
+			value = value * (any_of(level) ^ combine)
+		return value
+	def group(name):
+		return keyword('(') + Lazy(lambda: rules[name]) + keyword(')') ^ process_group
+	def process_relop(parsed):
+		((left, op), right) = parsed
+		return relop_classes[op](left, right)
+	variable = Tag(IDENTIFIER) ^ VarArithmExp
+	arithm_value = (Tag(INTEGER) ^ (lambda i: IntArithmExp(int(i)))) | variable
+	rules['arithm'] = precedence(arithm_value | group('arithm'), arithm_precedence_levels,
+								 process_binop)
+	bool_term = (keyword('BB8') + Lazy(lambda: rules['bool_term']) ^ (lambda parsed: NotBoolExp(parsed[1]))) | \
+				(rules['arithm'] + any_of(relop_operators) + rules['arithm'] ^ process_relop) | \
+				(keyword('LIGHT_SIDE') ^ TrueBoolExp) | (keyword('DARK_SIDE') ^ FalseBoolExp) | \
+				group('bool')
+	rules['bool_term'] = bool_term
+	rules['bool'] = precedence(bool_term, bool_precedence_levels, process_logic)
+	string_value = (Tag(STRING) ^ StringExp) | variable
+	rules['string'] = precedence(string_value, string_precedence_levels, process_string)
+	return (rules['arithm'], rules['bool'], rules['string'])
+
+WORDS = ['1', '22', 'x', 'y', '(', ')', '"s"', '+', 'VADER', 'SIDIOUS', 'LUKE', 'LEAH', 'CHEWBACCA',
+		 'SITH', 'SITH_ORDER', 'JEDI', 'JEDI_ORDER', 'ORDER', 'BB8_ORDER', 'R2D2', 'C3PO', 'BB8',
+		 'LIGHT_SIDE', 'DARK_SIDE']
+
+# Random well-formed expressions of each kind, as source
+def arithm_source(generator, depth):
+	choice = generator.randrange(4 if depth else 2)
+	if choice == 0:
+		return generator.choice(['1', '22', 'x', 'y'])
+	elif choice == 1:
+		return 'x'
+	elif choice == 2:
+		return '( %s )' % arithm_source(generator, depth - 1)
+	return '%s %s %s' % (arithm_source(generator, depth - 1),
+						 generator.choice(['VADER', 'SIDIOUS', 'LUKE', 'LEAH', 'CHEWBACCA']),
+						 arithm_source(generator, depth - 1))
+
+def bool_source(generator, depth):
+	choice = generator.randrange(5 if depth else 2)
+	if choice == 0:
+		return generator.choice(['LIGHT_SIDE', 'DARK_SIDE'])
+	elif choice == 1:
+		return '%s %s %s' % (arithm_source(generator, depth), generator.choice(relop_operators),
+							 arithm_source(generator, depth))
+	elif choice == 2:
+		return 'BB8 %s' % bool_source(generator, depth - 1)
+	elif choice == 3:
+		return '( %s )' % bool_source(generator, depth - 1)
+	return '%s %s %s' % (bool_source(generator, depth - 1), generator.choice(['R2D2', 'C3PO']),
+						 bool_source(generator, depth - 1))
+
+def string_source(generator, depth):
+	return ' + '.join([generator.choice(['"s"', '"t"', 'x']) for _ in range(depth + 1)])
+
+
+class ExpressionTest(unittest.TestCase):
+	def parse(self, kind, source):
+		result = ExpressionParser(kind)(yoda_tokenize(source), 0)
+		return result and result.value
+
+	def test_precedence_and_grouping(self):
+		(one, two, three, x) = (IntArithmExp(1), IntArithmExp(2), IntArithmExp(3), VarArithmExp('x'))
+		self.assertEqual(self.parse(ARITHM_EXP, '1 VADER 2 LUKE 3'), AddExp(one, MulExp(two, three)))
+		self.assertEqual(self.parse(ARITHM_EXP, '1 SIDIOUS 2 SIDIOUS 3'), SubExp(SubExp(one, two), three))
+		self.assertEqual(self.parse(ARITHM_EXP, '1 LEAH (2 CHEWBACCA x)'), DivExp(one, ModExp(two, x)))
+		self.assertEqual(self.parse(BOOL_EXP, 'BB8 x SITH 1 R2D2 LIGHT_SIDE'),
+						 AndBoolExp(NotBoolExp(LtExp(x, one)), TrueBoolExp('LIGHT_SIDE')))
+		self.assertEqual(self.parse(BOOL_EXP, '(x VADER 1) ORDER (2)'), EqExp(AddExp(x, one), two))
+		self.assertEqual(self.parse(STRING_EXP, '"a" + x + "b"'),
+						 JoinStringExp([StringExp('"a"'), x, StringExp('"b"')]))
+
+	# Operators parse to their specialised classes, which compare equal
+	# to the generic ones both ways
+	def test_specialised_classes(self):
+		(x, y) = (VarArithmExp('x'), VarArithmExp('y'))
+		for (op, node_class) in arithm_classes.items():
+			node = self.parse(ARITHM_EXP, 'x %s y' % op)
+			self.assertTrue(node.__class__ is node_class, op)
+			self.assertEqual(node, BinopArithmExp(op, x, y))
+			self.assertEqual(BinopArithmExp(op, x, y), node)
+			self.assertEqual(repr(node), repr(BinopArithmExp(op, x, y)))
+		for (op, node_class) in relop_classes.items():
+			node = self.parse(BOOL_EXP, 'x %s y' % op)
+			self.assertTrue(node.__class__ is node_class, op)
+			self.assertEqual(node, RelopBoolExp(op, x, y))
+			self.assertEqual(RelopBoolExp(op, x, y), node)
+		node = self.parse(BOOL_EXP, 'x ORDER 1 C3PO x SITH 2 R2D2 LIGHT_SIDE')
+		self.assertTrue(isinstance(node, OrBoolExp))
+		self.assertEqual(node, OrBoolExp(EqExp(x, IntArithmExp(1)),
+										 AndBoolExp(LtExp(x, IntArithmExp(2)), TrueBoolExp('LIGHT_SIDE'))))
+		self.assertNotEqual(AddExp(x, y), BinopArithmExp('SIDIOUS', x, y))
+		self.assertNotEqual(BinopArithmExp('SIDIOUS', x, y), AddExp(x, y))
+		self.assertNotEqual(AddExp(x, y), SubExp(x, y))
+		self.assertNotEqual(AndBoolExp(x, y), OrBoolExp(x, y))
+
+	def test_kinds(self):
+		self.assertEqual(self.parse(BOOL_EXP, 'x'), None)
+		self.assertEqual(self.parse(ARITHM_EXP, 'LIGHT_SIDE'), None)
+		self.assertEqual(self.parse(STRING_EXP, '1'), None)
+		self.assertEqual(self.parse(BOOL_EXP, 'x VADER LIGHT_SIDE'), None)
+
+	# An operator without a right operand is left for the caller
+	def test_unconsumed_operator(self):
+		result = ExpressionParser(ARITHM_EXP)(yoda_tokenize('x VADER ; 1'), 0)
+		self.assertEqual((result.value, result.pos), (VarArithmExp('x'), 1))
+		result = ExpressionParser(STRING_EXP)(yoda_tokenize('"a" + 1'), 0)
+		self.assertEqual((result.value, result.pos), (StringExp('"a"'), 1))
+
+	def test_same_trees_as_exp_chains(self):
+		generator = random.Random(5)
+		parsers = dict(zip((ARITHM_EXP, BOOL_EXP, STRING_EXP), exp_chain_grammar()))
+		sources = []
+		for depth in range(4):
+			for _ in range(50):
+				sources.append(arithm_source(generator, depth))
+				sources.append(bool_source(generator, depth))
+				sources.append(string_source(generator, depth))
+		for _ in range(1000):
+			sources.append(' '.join([generator.choice(WORDS)
+									 for _ in range(generator.randrange(1, 9))]))
+		for source in sources:
+			tokens = yoda_tokenize(source)
+			for (kind, reference) in parsers.items():
+				(expected, actual) = (reference(tokens, 0), ExpressionParser(kind)(tokens, 0))
+				if expected is None or actual is None:
+					self.assertEqual((kind, source, actual), (kind, source, expected))
+				else:
+					self.assertEqual((kind, source, actual.value, actual.pos),
+									 (kind, source, expected.value, expected.pos))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+#######################################
+# tests/test_profile.py
+# Tests of the per-statement profiler
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import unittest
+import yoda_profile
+from yoda_profile import Profile, ProfiledStatement, instrument
+from tests.support import *
+
+# Stands for the time module: every reading is one second after the
+# last, so a statement's time is the number of readings it spans
+class Clock:
+	def __init__(self):
+		self.now = 0.0
+
+	def time(self):
+		self.now += 1
+		return self.now
+
+SOURCE = program('x YODA 0',
+				 loop('x SITH 3', 'x YODA x VADER 1',
+					  when('x ORDER 2', show('"two"'))))
+
+# {(label, location): (count, time)} of a profile
+def table(profile):
+	return dict([((stats.label, stats.location), (stats.count, stats.time))
+				 for stats in profile.stats])
+
+
+class ProfileTest(unittest.TestCase):
+	def setUp(self):
+		self.time = yoda_profile.time
+		yoda_profile.time = Clock()
+
+	def tearDown(self):
+		yoda_profile.time = self.time
+
+	def profile(self, source):
+		profile = Profile()
+		ast = instrument(parse(source), profile)
+		return (profile, run(ast))
+
+	def test_output_is_unchanged(self):
+		for (name, source) in examples().items():
+			if name != 'fibonacci.yoda':
+				self.assertEqual(self.profile(source)[1], run(parse(source)), name)
+		self.assertEqual(self.profile(SOURCE)[1], (u'two\n', None))
+
+	def test_counts_and_times_by_location(self):
+		(profile, _) = self.profile(SOURCE)
+		self.assertEqual(table(profile), {
+			('AssignStatement x', (2, 1)): (1, 1),
+			('WhileStatement', (3, 1)): (1, 23),
+			('WhileStatement iteration', (3, 1)): (3, 19),
+			('AssignStatement x', (3, 26)): (3, 3),
+			('IfStatement', (4, 1)): (3, 7),
+			('IfStatement then taken', (4, 1)): (1, 3),
+			('PrintStatement', (4, 33)): (1, 1),
+		})
+
+	def test_failing_statements_are_counted(self):
+		(profile, result) = self.profile(program('x YODA 1', 'y YODA x LEAH 0', show('x')))
+		self.assertEqual(result, (u'', 'ZeroDivisionError'))
+		self.assertEqual(table(profile), {
+			('AssignStatement x', (2, 1)): (1, 1),
+			('AssignStatement y', (3, 1)): (1, 1),
+			('PrintStatement', (4, 1)): (0, 0),
+		})
+
+	def test_only_statements_are_wrapped(self):
+		profile = Profile()
+		ast = instrument(parse(SOURCE), profile)
+		self.assertTrue(isinstance(ast, BlockStatement))
+		self.assertEqual([statement.__class__ for statement in ast.statements], [ProfiledStatement] * 2)
+		loop = ast.statements[1].stmt
+		self.assertEqual(loop.condition, LtExp(VarArithmExp('x'), IntArithmExp(3)))
+		self.assertTrue(isinstance(loop.body, ProfiledStatement))
+		self.assertEqual(len(profile.stats), 7)
+
+	def test_report(self):
+		(profile, _) = self.profile(SOURCE)
+		lines = profile.report().splitlines()
+		self.assertEqual(lines[0], 'Profile: top 7 of 7 statements by time (including nested statements)')
+		self.assertEqual(lines[1].split(), ['line:col', 'count', 'total', 's', 'per', 'call', 'us', 'statement'])
+		self.assertEqual([line.split()[:3] for line in lines[2:]],
+						 [['3:1', '1', '23.000000'], ['3:1', '3', '19.000000'], ['4:1', '3', '7.000000'],
+						  ['3:26', '3', '3.000000'], ['4:1', '1', '3.000000'], ['2:1', '1', '1.000000'],
+						  ['4:33', '1', '1.000000']])
+		self.assertTrue(lines[2].endswith('23000000.000  WhileStatement'))
+		lines = profile.report(2).splitlines()
+		self.assertEqual(lines[0], 'Profile: top 2 of 7 statements by time (including nested statements)')
+		self.assertEqual(len(lines), 4)
+
+	def test_unknown_locations(self):
+		profile = Profile()
+		ast = instrument(yoda_parse(yoda_tokenize(program('x YODA 1'))).value, profile)
+		run(ast)
+		self.assertEqual(profile.report().splitlines()[2].split()[:2], ['?', '1'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,110 @@
+#######################################
+# tests/test_types.py
+# Tests of type inference and type specialization
+#
+# How to Use:
+#     python -m unittest discover
+#######################################
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+from tests.support import *
+from yoda_types import TypeInference, specialize, unstable_variables, INT, STRING, BOOL, UNKNOWN
+
+ROOT = os.path.dirname(TESTS)
+
+# Type of z is int or unknown: it is only assigned on one branch
+UNSTABLE = program('y YODA x',
+				   loop('x SITH 3', 'x YODA x VADER 1', when('x ORDER 2', 'z YODA 1')),
+				   show('"%" + x + z'))
+
+
+class InferenceTest(unittest.TestCase):
+	# Types of the variables at the end of source
+	def state(self, source, initial=UNKNOWN):
+		return TypeInference(initial).program(parse(source))
+
+	def test_assignments(self):
+		state = self.state(program('x YODA 1', 'y YODA x LEAH 2 VADER x CHEWBACCA 3', 'z YODA w'))
+		self.assertEqual(state, {'x': frozenset([INT]), 'y': frozenset([INT]), 'z': frozenset([UNKNOWN])})
+		self.assertEqual(self.state(program('z YODA w'), INT), {'z': frozenset([INT])})
+
+	# A variable assigned on one branch only may still be unset after
+	def test_branches_join(self):
+		state = self.state(program(when('x ORDER 1', 'y YODA 1')))
+		self.assertEqual(state['y'], frozenset([INT, 'unset']))
+		state = self.state(program('y YODA 0', when('x ORDER 1', 'y YODA w')))
+		self.assertEqual(state['y'], frozenset([INT, UNKNOWN]))
+
+	def test_loops_reach_a_fixed_point(self):
+		source = program('a YODA 0', 'i YODA 0',
+						 loop('i SITH 10', 'b YODA a', 'a YODA w', 'i YODA i VADER 1'))
+		state = self.state(source)
+		self.assertEqual(state['b'], frozenset([INT, UNKNOWN, 'unset']))
+		self.assertEqual(state['i'], frozenset([INT]))
+
+	def test_expression_types(self):
+		ast = parse(program('x YODA 1', when('x SITH 2', show('"a" + x'))))
+		inference = TypeInference()
+		inference.program(ast)
+		condition = ast.statements[1].condition
+		self.assertEqual(inference.types_of(condition), frozenset([BOOL]))
+		self.assertEqual(inference.types_of(condition.left), frozenset([INT]))
+		self.assertEqual(inference.types_of(ast.statements[1].true_stmt.stmt), frozenset([STRING]))
+		self.assertEqual(inference.types_of(IntArithmExp(1)), None)
+
+	def test_unstable_variables(self):
+		self.assertEqual(unstable_variables(parse(UNSTABLE)), [('z', [INT, UNKNOWN], (4, 33))])
+		self.assertEqual(unstable_variables(parse(UNSTABLE), INT), [])
+		for (name, source) in examples().items():
+			self.assertEqual(unstable_variables(parse(source)), [], name)
+
+
+class SpecializeTest(unittest.TestCase):
+	def test_known_parts(self):
+		ast = specialize(parse(program('n YODA 2', 'm YODA n LUKE n', show('"100% " + n + " " + m'))))
+		self.assertEqual(ast.statements[2].stmt,
+						 FormatStringExp(u'100%% %d %d\n', [VarArithmExp('n'), VarArithmExp('m')]))
+		self.assertEqual(run(ast), (u'100% 2 4\n', None))
+
+	def test_unknown_parts_are_left(self):
+		ast = parse(UNSTABLE)
+		self.assertEqual(specialize(ast).statements[-1], ast.statements[-1])
+		self.assertEqual(specialize(ast, INT).statements[-1].stmt,
+						 FormatStringExp(u'%%%d%d\n', [VarArithmExp('x'), VarArithmExp('z')]))
+
+	# Ints grown into longs still print through %d, at every level
+	def test_long_ints(self):
+		source = program('n YODA 1', 'i YODA 0',
+						 loop('i SITH 70', 'n YODA n LUKE 3', 'i YODA i VADER 1'),
+						 show('"n=" + n + " i=" + i + " " + n'))
+		self.assertEqual(run(parse(source), level=2), (u'n=%d i=70 %d\n' % (3 ** 70, 3 ** 70), None))
+		self.assertTrue(isinstance(optimize(parse(source), 2).statements[-1].stmt, FormatStringExp))
+		self.assertEqual(disagreements('long ints', source), [])
+
+
+class WarningTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_warn_types(self):
+		path = os.path.join(self.directory, 'unstable.yoda')
+		with open(path, 'w') as file:
+			file.write(UNSTABLE)
+		process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'starWarsPT.py'), path, '--warn-types',
+									'--no-cache'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		(output, errors) = process.communicate()
+		self.assertEqual(output, '%31\n')
+		self.assertEqual(errors, 'Warning: variable z may hold int or unknown values '
+								 '(first used at line 4, column 33)\n')
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,275 @@
+#######################################
+# yoda_arena.py
+# Flat arena form of yoda ASTs
+#
+# An Arena stores a whole tree in parallel typed arrays instead of one
+# object per node. Node i has
+#   kinds[i]    index of its class in the arena's class table
+#   starts[i]   position of its first child in child_indices
+#   shapes[i]   index of its shape in the shape table
+# where a shape is the tuple of the node's slot values, with NODE
+# standing for a child node and (LIST, n) for a list of n children.
+# Shapes are shared, so every VarArithmExp of the same variable, or
+# every BinopArithmExp of the same operator, stores a single tuple.
+#
+# Children always come after their parent, so the arena can be built
+# and turned back into nodes without recursion. NodeView gives the
+# nodes of an arena the attributes, repr and equality of the nodes
+# they stand for.
+#######################################
+
+from array import array
+from equality import Equality, slot_names
+
+# Marker - stands for child fields in shapes, so that no field value
+# can be mistaken for one. Markers pickle by name, so an unpickled
+# arena still holds the very same objects
+class Marker(object):
+	__slots__ = ('name',)
+
+	def __init__(self, name):
+		self.name = name
+
+	def __repr__(self):
+		return self.name
+
+	def __reduce__(self):
+		return self.name
+
+NODE = Marker('NODE')
+LIST = Marker('LIST')
+
+# Typecodes of the arrays of an Arena
+array_codes = {
+	'kinds': 'B',
+	'starts': 'l',
+	'shapes': 'l',
+	'child_indices': 'l',
+}
+array_fields = sorted(array_codes)
+
+def is_node(value):
+	return isinstance(value, Equality)
+
+# Returns a new Arena holding ast
+def to_arena(ast):
+	arena = Arena()
+	arena.add(ast)
+	return arena
+
+
+class Arena:
+	def __init__(self):
+		for name in array_fields:
+			setattr(self, name, array(array_codes[name]))
+		self.classes = []
+		self.class_index = {}
+		self.shape_table = []
+		self.shape_index = {}
+
+	def __len__(self):
+		return len(self.kinds)
+
+	def __repr__(self):
+		return 'Arena(%d nodes, %d classes, %d shapes)' % \
+			   (len(self.kinds), len(self.classes), len(self.shape_table))
+
+	# The lookup tables are left out of pickles and rebuilt on loading,
+	# and the arrays are pickled as raw bytes
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		del state['class_index']
+		del state['shape_index']
+		for name in array_fields:
+			state[name] = state[name].tostring()
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		for name in array_fields:
+			setattr(self, name, array(array_codes[name], state[name]))
+		self.class_index = dict([(node_class, i) for (i, node_class) in enumerate(self.classes)])
+		self.shape_index = dict([(self.shape_key(values), i)
+								 for (i, values) in enumerate(self.shape_table)])
+
+	def kind(self, node_class):
+		if node_class not in self.class_index:
+			self.class_index[node_class] = len(self.classes)
+			self.classes.append(node_class)
+		return self.class_index[node_class]
+
+	# Shapes are keyed with the value types too, so that 1 and True stay
+	# apart
+	def shape_key(self, values):
+		return tuple([(type(value), value) for value in values])
+
+	def shape(self, values):
+		key = self.shape_key(values)
+		if key not in self.shape_index:
+			self.shape_index[key] = len(self.shape_table)
+			self.shape_table.append(values)
+		return self.shape_index[key]
+
+	def reserve(self):
+		self.kinds.append(0)
+		self.starts.append(0)
+		self.shapes.append(0)
+		return len(self.kinds) - 1
+
+	# Stores the tree rooted at node and returns the view of its root
+	def add(self, node):
+		root = self.reserve()
+		pending = [(node, root)]
+		while pending:
+			(node, index) = pending.pop()
+			self.kinds[index] = self.kind(node.__class__)
+			self.starts[index] = len(self.child_indices)
+			values = []
+			for name in slot_names(node.__class__):
+				value = getattr(node, name, None)
+				if is_node(value):
+					values.append(NODE)
+					children = [value]
+				elif isinstance(value, list):
+					values.append((LIST, len(value)))
+					children = value
+				else:
+					values.append(value)
+					continue
+				for child in children:
+					child_index = self.reserve()
+					self.child_indices.append(child_index)
+					pending.append((child, child_index))
+			self.shapes[index] = self.shape(tuple(values))
+		return NodeView(self, root)
+
+	def view(self, index=0):
+		return NodeView(self, index)
+
+	# (name, value) pairs of node index; child nodes are returned by
+	# make_child(child_index)
+	def fields(self, index, make_child):
+		node_class = self.classes[self.kinds[index]]
+		position = self.starts[index]
+		fields = []
+		for (name, value) in zip(slot_names(node_class), self.shape_table[self.shapes[index]]):
+			if value is NODE:
+				value = make_child(self.child_indices[position])
+				position += 1
+			elif isinstance(value, tuple) and value[0] is LIST:
+				value = [make_child(child) for child in
+						 self.child_indices[position:position + value[1]]]
+				position += len(value)
+			fields.append((name, value))
+		return fields
+
+	# Rebuilds the node objects of the tree rooted at index
+	def to_node(self, index=0):
+		if not 0 <= index < len(self.kinds):
+			raise IndexError('no node %d in %r' % (index, self))
+		(kinds, starts, shapes, child_indices) = \
+			(self.kinds, self.starts, self.shapes, self.child_indices)
+		plans = {}
+		built = {}
+		pop = built.pop
+		# Children come after their parent, so building in reverse order
+		# always finds them built
+		for current in xrange(len(kinds) - 1, index - 1, -1):
+			key = (kinds[current], shapes[current])
+			plan = plans.get(key)
+			if plan is None:
+				plan = plans[key] = self.plan(*key)
+			(node_class, fields) = plan
+			node = node_class.__new__(node_class)
+			position = starts[current]
+			for (name, value) in fields:
+				if value is NODE:
+					value = pop(child_indices[position])
+					position += 1
+				elif value.__class__ is tuple:
+					value = value[0]
+				else:
+					value = [pop(child) for child in child_indices[position:position + value]]
+					position += len(value)
+				setattr(node, name, value)
+			built[current] = node
+		return built[index]
+
+	# How to_node builds the nodes of a kind and shape: the node class
+	# and, per slot, NODE for a child, the length of a list of children
+	# or the value wrapped in a tuple
+	def plan(self, kind, shape):
+		node_class = self.classes[kind]
+		fields = []
+		for (name, value) in zip(slot_names(node_class), self.shape_table[shape]):
+			if isinstance(value, tuple) and value[0] is LIST:
+				value = value[1]
+			elif value is not NODE:
+				value = (value,)
+			fields.append((name, value))
+		return (node_class, fields)
+
+
+# NodeView - a node of an arena
+# Child fields read as NodeViews (or lists of them) and the other fields
+# as their values. repr is the one of the node class, and a view is
+# equal to views and nodes with the same structure
+class NodeView(object):
+	__slots__ = ('arena', 'index')
+
+	def __init__(self, arena, index):
+		self.arena = arena
+		self.index = index
+
+	@property
+	def node_class(self):
+		return self.arena.classes[self.arena.kinds[self.index]]
+
+	def fields(self):
+		return self.arena.fields(self.index, self.arena.view)
+
+	def children(self):
+		found = []
+		for (_, value) in self.fields():
+			if isinstance(value, NodeView):
+				found.append(value)
+			elif isinstance(value, list):
+				found.extend(value)
+		return found
+
+	def to_node(self):
+		return self.arena.to_node(self.index)
+
+	def __getattr__(self, name):
+		for (field, value) in self.fields():
+			if field == name:
+				return value
+		raise AttributeError(name)
+
+	def __repr__(self):
+		return self.node_class.__repr__.im_func(self)
+
+	def __eq__(self, other):
+		if isinstance(other, NodeView):
+			other_class = other.node_class
+			other_values = [value for (_, value) in other.fields()]
+		elif is_node(other):
+			other_class = other.__class__
+			other_values = [getattr(other, name, None) for name in slot_names(other_class)]
+		else:
+			return NotImplemented
+		# The rule of Equality: a specialised class compares equal to
+		# the generic class it names
+		node_class = self.node_class
+		if not issubclass(other_class, node_class.generic or node_class):
+			return False
+		for ((name, value), other_value) in zip(self.fields(), other_values):
+			if name not in other_class.annotations and value != other_value:
+				return False
+		return True
+
+	def __ne__(self, other):
+		equal = self.__eq__(other)
+		if equal is NotImplemented:
+			return equal
+		return not equal
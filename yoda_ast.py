@@ -8,23 +8,38 @@
 #######################################
 
 import sys
+import operator
+import yoda_output
 from equality import *
 
+# Functions of the arithmetic operators, for nodes that apply an
+# operator they only know by name
+arithm_functions = {
+	'VADER': operator.add,
+	'SIDIOUS': operator.sub,
+	'LUKE': operator.mul,
+	'LEAH': operator.div,
+	'CHEWBACCA': operator.mod,
+}
+
 # Statements
+# location is the (line, column) of the first token of the statement,
+# when the parser was given tokens with positions
 class Statement(Equality):
-	pass		
+	__slots__ = ('location',)
+	annotations = ('location',)
 
 # Arithmetic Expressions
 class ArithmExp(Equality):
-	pass
+	__slots__ = ()
 
 # Binary Expressions
 class BoolExp(Equality):
-	pass
+	__slots__ = ()
 
 # String Expressions
 class StringExp(Equality):
-	pass
+	__slots__ = ()
 
 
 #######################################
@@ -33,6 +48,8 @@ class StringExp(Equality):
 
 # Compound statements
 class CompoundStatement(Statement):
+	__slots__ = ('first', 'second')
+
 	def __init__(self, first, second):
 		self.first = first
 		self.second = second
@@ -44,8 +61,25 @@ class CompoundStatement(Statement):
 		self.first.eval(env)
 		self.second.eval(env)
 
+# Block statements - a statement list, kept flat so that neither
+# running it nor its repr and equality recurse once per statement
+class BlockStatement(Statement):
+	__slots__ = ('statements',)
+
+	def __init__(self, statements):
+		self.statements = statements
+
+	def __repr__(self):
+		return 'BlockStatement(%s)' % ', '.join(['%s' % statement for statement in self.statements])
+
+	def eval(self, env):
+		for statement in self.statements:
+			statement.eval(env)
+
 # Assignment statements
 class AssignStatement(Statement):
+	__slots__ = ('name', 'exp')
+
 	def __init__(self, name, exp):
 		self.name = name
 		self.exp = exp
@@ -57,8 +91,61 @@ class AssignStatement(Statement):
 		value = self.exp.eval(env)
 		env[self.name] = value
 
+# Assignment to a variable resolved to a slot of a frame list
+class SlotAssignStatement(Statement):
+	__slots__ = ('name', 'slot', 'exp')
+
+	def __init__(self, name, slot, exp):
+		self.name = name
+		self.slot = slot
+		self.exp = exp
+
+	def __repr__(self):
+		return 'SlotAssignStatement(%s, %d, %s)' % (self.name, self.slot, self.exp)
+
+	def eval(self, env):
+		env[self.slot] = self.exp.eval(env)
+
+# Update of a variable by an expression that does not read it
+# (x YODA x VADER 1), created by the loop optimizer
+class AugAssignStatement(Statement):
+	__slots__ = ('name', 'op', 'exp')
+
+	def __init__(self, name, op, exp):
+		self.name = name
+		self.op = op
+		self.exp = exp
+
+	def __repr__(self):
+		return 'AugAssignStatement(%s, %s, %s)' % (self.name, self.op, self.exp)
+
+	def eval(self, env):
+		if self.name in env:
+			value = env[self.name]
+		else:
+			value = 0 # Variables are initialized to 0
+		env[self.name] = arithm_functions[self.op](value, self.exp.eval(env))
+
+# Update of a variable resolved to a slot of a frame list
+class SlotAugAssignStatement(Statement):
+	__slots__ = ('name', 'slot', 'op', 'exp')
+
+	def __init__(self, name, slot, op, exp):
+		self.name = name
+		self.slot = slot
+		self.op = op
+		self.exp = exp
+
+	def __repr__(self):
+		return 'SlotAugAssignStatement(%s, %d, %s, %s)' % (self.name, self.slot, self.op, self.exp)
+
+	def eval(self, env):
+		env[self.slot] = arithm_functions[self.op](env[self.slot], self.exp.eval(env))
+
 # If statements
 class IfStatement(Statement):
+	__slots__ = ('condition', 'true_stmt', 'false_stmt')
+
 	def __init__(self, condition, true_stmt, false_stmt):
 		self.condition = condition
 		self.true_stmt = true_stmt
@@ -77,6 +164,8 @@ class IfStatement(Statement):
 
 # While statements
 class WhileStatement(Statement):
+	__slots__ = ('condition', 'body')
+
 	def __init__(self, condition, body):
 		self.condition = condition
 		self.body = body
@@ -90,8 +179,21 @@ class WhileStatement(Statement):
 			self.body.eval(env)
 			condition_value = self.condition.eval(env)
 
+# Statement that does nothing - left by the optimizer where it
+# removes a statement that has to be replaced by something
+class PassStatement(Statement):
+	__slots__ = ()
+
+	def __repr__(self):
+		return 'PassStatement()'
+
+	def eval(self, env):
+		pass
+
 # Print statements
 class PrintStatement(Statement):
+	__slots__ = ('stmt',)
+
 	def __init__(self, stmt):
 		self.stmt = stmt
 
@@ -100,7 +202,7 @@ class PrintStatement(Statement):
 
 	def eval(self, env):
 		stmt_value = self.stmt.eval(env)
-		sys.stdout.write('%s' % stmt_value)
+		yoda_output.write('%s' % stmt_value)
 
 
 #######################################
@@ -109,6 +211,8 @@ class PrintStatement(Statement):
 
 # Binary operations - made of two other ArithmExps
 class BinopArithmExp(ArithmExp):
+	__slots__ = ('op', 'left', 'right')
+
 	def __init__(self, op, left, right):
 		self.op = op
 		self.left = left
@@ -134,8 +238,71 @@ class BinopArithmExp(ArithmExp):
 			raise RuntimeError('unknown operator: ' + self.op)
 		return value
 
+# Binary operations specialised by operator, built by the parser. Each
+# evaluates its operator directly; op, repr and equality are those of
+# the generic BinopArithmExp, so they compare equal to it
+class AddExp(BinopArithmExp):
+	__slots__ = ()
+	generic = BinopArithmExp
+
+	def __init__(self, left, right):
+		BinopArithmExp.__init__(self, 'VADER', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) + self.right.eval(env)
+
+class SubExp(BinopArithmExp):
+	__slots__ = ()
+	generic = BinopArithmExp
+
+	def __init__(self, left, right):
+		BinopArithmExp.__init__(self, 'SIDIOUS', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) - self.right.eval(env)
+
+class MulExp(BinopArithmExp):
+	__slots__ = ()
+	generic = BinopArithmExp
+
+	def __init__(self, left, right):
+		BinopArithmExp.__init__(self, 'LUKE', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) * self.right.eval(env)
+
+class DivExp(BinopArithmExp):
+	__slots__ = ()
+	generic = BinopArithmExp
+
+	def __init__(self, left, right):
+		BinopArithmExp.__init__(self, 'LEAH', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) / self.right.eval(env)
+
+class ModExp(BinopArithmExp):
+	__slots__ = ()
+	generic = BinopArithmExp
+
+	def __init__(self, left, right):
+		BinopArithmExp.__init__(self, 'CHEWBACCA', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) % self.right.eval(env)
+
+arithm_classes = {
+	'VADER': AddExp,
+	'SIDIOUS': SubExp,
+	'LUKE': MulExp,
+	'LEAH': DivExp,
+	'CHEWBACCA': ModExp,
+}
+
 # Integer constants
 class IntArithmExp(ArithmExp):
+	__slots__ = ('i',)
+
 	def __init__(self, i):
 		self.i = i
 		
@@ -147,6 +314,8 @@ class IntArithmExp(ArithmExp):
 
 # Variable
 class VarArithmExp(ArithmExp):
+	__slots__ = ('name',)
+
 	def __init__(self, name):
 		self.name = name
 		
@@ -159,12 +328,28 @@ class VarArithmExp(ArithmExp):
 		else:
 			return 0 # Variables are initialized to 0
 
+# Variable resolved to a slot of a frame list by yoda_resolve.py
+class SlotArithmExp(ArithmExp):
+	__slots__ = ('name', 'slot')
+
+	def __init__(self, name, slot):
+		self.name = name
+		self.slot = slot
+
+	def __repr__(self):
+		return 'SlotArithmExp(%s, %d)' % (self.name, self.slot)
+
+	def eval(self, env):
+		return env[self.slot]
+
 #######################################
 # Boolean expressions subclasses
 #######################################
 
 # AND expressions - left and right sides are BoolExps
 class AndBoolExp(BoolExp):
+	__slots__ = ('left', 'right')
+
 	def __init__(self, left, right):
 		self.left = left
 		self.right = right
@@ -172,13 +357,14 @@ class AndBoolExp(BoolExp):
 	def __repr__(self):
 		return 'AndBoolExp(%s, %s)' % (self.left, self.right)
 
+	# The right side is only evaluated when the left one is true
 	def eval(self, env):
-		left_value = self.left.eval(env)
-		right_value = self.right.eval(env)
-		return left_value and right_value
+		return self.left.eval(env) and self.right.eval(env)
 
 # OR expressions - left and right sides are BoolExps
 class OrBoolExp(BoolExp):
+	__slots__ = ('left', 'right')
+
 	def __init__(self, left, right):
 		self.left = left
 		self.right = right
@@ -186,13 +372,14 @@ class OrBoolExp(BoolExp):
 	def __repr__(self):
 		return 'OrBoolExp(%s, %s)' % (self.left, self.right)
 
+	# The right side is only evaluated when the left one is false
 	def eval(self, env):
-		left_value = self.left.eval(env)
-		right_value = self.right.eval(env)
-		return left_value or right_value
+		return self.left.eval(env) or self.right.eval(env)
 
 # NOT expressions - left and right sides are BoolExps
 class NotBoolExp(BoolExp):
+	__slots__ = ('exp',)
+
 	def __init__(self, exp):
 		self.exp = exp
 
@@ -205,6 +392,8 @@ class NotBoolExp(BoolExp):
 
 # Relational expressions - left and right sides are ArithmExps
 class RelopBoolExp(BoolExp):
+	__slots__ = ('op', 'left', 'right')
+
 	def __init__(self, op, left, right):
 		self.op = op
 		self.left = left
@@ -232,8 +421,81 @@ class RelopBoolExp(BoolExp):
 			raise RuntimeError('unknown operator: ' + self.op)
 		return value
 
+# Relational expressions specialised by operator, like the arithmetic
+# ones above
+class LtExp(RelopBoolExp):
+	__slots__ = ()
+	generic = RelopBoolExp
+
+	def __init__(self, left, right):
+		RelopBoolExp.__init__(self, 'SITH', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) < self.right.eval(env)
+
+class LeExp(RelopBoolExp):
+	__slots__ = ()
+	generic = RelopBoolExp
+
+	def __init__(self, left, right):
+		RelopBoolExp.__init__(self, 'SITH_ORDER', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) <= self.right.eval(env)
+
+class GtExp(RelopBoolExp):
+	__slots__ = ()
+	generic = RelopBoolExp
+
+	def __init__(self, left, right):
+		RelopBoolExp.__init__(self, 'JEDI', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) > self.right.eval(env)
+
+class GeExp(RelopBoolExp):
+	__slots__ = ()
+	generic = RelopBoolExp
+
+	def __init__(self, left, right):
+		RelopBoolExp.__init__(self, 'JEDI_ORDER', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) >= self.right.eval(env)
+
+class EqExp(RelopBoolExp):
+	__slots__ = ()
+	generic = RelopBoolExp
+
+	def __init__(self, left, right):
+		RelopBoolExp.__init__(self, 'ORDER', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) == self.right.eval(env)
+
+class NeExp(RelopBoolExp):
+	__slots__ = ()
+	generic = RelopBoolExp
+
+	def __init__(self, left, right):
+		RelopBoolExp.__init__(self, 'BB8_ORDER', left, right)
+
+	def eval(self, env):
+		return self.left.eval(env) != self.right.eval(env)
+
+relop_classes = {
+	'SITH': LtExp,
+	'SITH_ORDER': LeExp,
+	'JEDI': GtExp,
+	'JEDI_ORDER': GeExp,
+	'ORDER': EqExp,
+	'BB8_ORDER': NeExp,
+}
+
 # True Expression
 class TrueBoolExp(BoolExp):
+	__slots__ = ('t',)
+
 	def __init__(self, t):
 		self.t = t
 
@@ -245,6 +507,8 @@ class TrueBoolExp(BoolExp):
 
 # False Expression
 class FalseBoolExp(BoolExp):
+	__slots__ = ('f',)
+
 	def __init__(self, 	f):
 		self.f = f
 			
@@ -260,6 +524,8 @@ class FalseBoolExp(BoolExp):
 #######################################
 
 class ConcatStringExp(	StringExp):
+	__slots__ = ('left', 'right')
+
  	def __init__(self, left, right):
   		self.left = left
  		self.right = right
@@ -270,23 +536,62 @@ class ConcatStringExp(	StringExp):
  	def eval(self, env):
  		left_value = self.left.eval(env)
  		right_value = self.right.eval(env)
- 		if isinstance(left_value, int):
+ 		if isinstance(left_value, (int, long)):
  			value = '%d' % left_value
  		else:
  			value = left_value
- 		if isinstance(right_value, int):
+ 		if isinstance(right_value, (int, long)):
  			value = value + '%d' % right_value
  		else:
  			value = value + right_value
  		return value
 
+# N-ary concatenation - a whole + chain, joined in one go
+class JoinStringExp(StringExp):
+	__slots__ = ('parts',)
+
+	def __init__(self, parts):
+		self.parts = parts
+
+	def __repr__(self):
+		return 'JoinStringExp(%s)' % ', '.join(['%s' % part for part in self.parts])
+
+	def eval(self, env):
+		values = []
+		for part in self.parts:
+			value = part.eval(env)
+			if isinstance(value, (int, long)):
+				value = '%d' % value
+			values.append(value)
+		return ''.join(values)
+
+# Concatenation whose parts have known types, built by yoda_types.py:
+# literals are folded into format and every other part is converted by
+# the directive chosen for its type, so nothing is checked at run time
+class FormatStringExp(StringExp):
+	__slots__ = ('format', 'args')
+
+	def __init__(self, format, args):
+		self.format = format
+		self.args = args
+
+	def __repr__(self):
+		return 'FormatStringExp(%r, %s)' % (self.format, ', '.join(['%s' % arg for arg in self.args]))
+
+	def eval(self, env):
+		return self.format % tuple([arg.eval(env) for arg in self.args])
+
 # String
+# s is the literal in source form; it is unescaped once, here
 class StringExp(StringExp):
+	__slots__ = ('s', 'value')
+
 	def __init__(self, s):
 		self.s = s
+		self.value = s[1:-1].decode('unicode_escape')
 		
 	def __repr__(self):
 		return 'StringExp(%s)' % self.s
 
 	def eval(self, env):
-		return self.s[1:-1].decode('unicode_escape')
\ No newline at end of file
+		return self.value
\ No newline at end of file
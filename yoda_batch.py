@@ -0,0 +1,200 @@
+#! /usr/bin/env python
+#######################################
+# yoda_batch.py
+# Batch runner for many .yoda programs
+#
+# Runs every program named on the command line (files or glob
+# patterns) on a pool of worker processes. Workers are forked after the
+# grammar is built, so they all reuse it, and each program's output and
+# errors are captured separately. The run ends with a status and timing
+# line per program; the exit status is 1 when any program failed.
+#
+# How to Use:
+#     python yoda_batch.py [OPTIONS] FILE_OR_GLOB ...
+#
+# Options:
+#     --workers N           worker processes (default: one per CPU)
+#     --engine ENGINE       execution engine (default: tree)
+#     -O LEVEL              optimization level (default: 2)
+#     --no-cache            always lex and parse instead of using .yodac
+#                           cache files
+#     --cache-dir DIR       keep .yodac files in DIR
+#     --output-dir DIR      write each program's output and errors to
+#                           DIR/NAME.out and DIR/NAME.err
+#     --max-steps N         stop each program after N steps
+#     --max-time SECONDS    stop each program after this long
+#     --max-string CHARACTERS
+#                           stop a program that builds a longer string
+#######################################
+
+import sys
+import os
+import glob
+import time
+import argparse
+import traceback
+import multiprocessing
+from StringIO import StringIO
+from yoda_lexer import *
+from yoda_parser import *
+from yoda_interpreter import *
+from yoda_optimizer import optimize, DEFAULT_LEVEL, MAX_LEVEL
+from yoda_output import CaptureSink, using, encode
+from yoda_cache import parse_cached
+from yoda_budget import Budget, BudgetExceeded, govern, run_limited
+
+# Statuses of a program run
+OK = 'ok'
+LEX_ERROR = 'lex error'
+PARSE_ERROR = 'parse error'
+RUNTIME_ERROR = 'error'
+OVER_BUDGET = 'over budget'
+MISSING = 'missing'
+
+# Options of the current batch, set in each worker by init_worker
+_options = {}
+
+def init_worker(options):
+	_options.update(options)
+
+def parse(tokens):
+	parse_result = yoda_parse(tokens)
+	if not parse_result:
+		return None
+	return parse_result.value
+
+# Runs one program and returns its result: a dict with the path,
+# status, time in seconds, captured output and captured errors
+def run_file(path):
+	result = {'path': path, 'status': OK, 'output': '', 'errors': ''}
+	start = time.time()
+	errors = StringIO()
+	(saved_stderr, sys.stderr) = (sys.stderr, errors)
+	sink = CaptureSink()
+	try:
+		try:
+			with open(path) as file:
+				source = file.read()
+		except IOError, error:
+			result['status'] = MISSING
+			errors.write('%s\n' % error)
+			return result
+		if _options.get('cache', True):
+			program = parse_cached(path, source, lambda source: parse(yoda_lex(source, positions=True, compact=True)),
+								   _options.get('cache_dir'))
+		else:
+			program = parse(yoda_lex(source, positions=True, compact=True))
+		if program is None:
+			result['status'] = PARSE_ERROR
+			errors.write('Parse error!\n')
+			return result
+		ast = optimize(program, _options.get('level', DEFAULT_LEVEL))
+		budget = Budget(*_options.get('limits', (None, None, None)))
+		if budget.has_limits():
+			ast = govern(ast)
+		run = prepare(ast, _options.get('engine', DEFAULT_ENGINE))
+		with using(sink):
+			run_limited(run, {}, budget)
+	except SystemExit:
+		# The lexer reports illegal characters on stderr and exits
+		result['status'] = LEX_ERROR
+	except BudgetExceeded, error:
+		result['status'] = OVER_BUDGET
+		errors.write('Budget exceeded: %s\n' % error)
+	except Exception:
+		result['status'] = RUNTIME_ERROR
+		errors.write(traceback.format_exc())
+	finally:
+		sys.stderr = saved_stderr
+		result['time'] = time.time() - start
+		result['output'] = sink.getvalue()
+		result['errors'] = errors.getvalue()
+	return result
+
+# Expands glob patterns; names that match nothing are kept, so that they
+# are reported as missing
+def expand(patterns):
+	paths = []
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern))
+		paths.extend(matches or [pattern])
+	return paths
+
+def run_batch(paths, options, workers=None):
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	pool = multiprocessing.Pool(workers, init_worker, (options,))
+	try:
+		chunk_size = max(1, len(paths) // (workers * 4))
+		return pool.map(run_file, paths, chunk_size)
+	finally:
+		pool.close()
+		pool.join()
+
+# Writes the output and errors of each program to directory
+def save_outputs(results, directory):
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	names = [os.path.splitext(os.path.basename(result['path']))[0] for result in results]
+	for (index, result) in enumerate(results):
+		name = names[index]
+		# Programs with the same name in different directories get
+		# numbered files
+		if names.count(name) > 1:
+			name = '%s.%d' % (name, index)
+		for (suffix, text) in (('.out', result['output']), ('.err', result['errors'])):
+			with open(os.path.join(directory, name + suffix), 'wb') as file:
+				file.write(encode(text))
+
+def summary(results, elapsed, workers):
+	lines = ['%-12s %9s  %s' % ('status', 'time s', 'file')]
+	for result in results:
+		line = '%-12s %9.4f  %s' % (result['status'], result['time'], result['path'])
+		errors = result['errors'].strip()
+		if result['status'] != OK and errors:
+			line += '  (%s)' % errors.splitlines()[-1]
+		lines.append(line)
+	failed = len([result for result in results if result['status'] != OK])
+	lines.append('%d files: %d ok, %d failed in %.2f s with %d workers' %
+				 (len(results), len(results) - failed, failed, elapsed, workers))
+	return '\n'.join(lines) + '\n'
+
+def main():
+	parser = argparse.ArgumentParser(description='Star Wars Interpreter batch runner')
+	parser.add_argument('files', nargs='+', metavar='FILE_OR_GLOB',
+						help='.yoda programs or glob patterns matching them')
+	parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+						help='worker processes (default: %(default)s)')
+	parser.add_argument('--engine', choices=sorted(ENGINES), default=DEFAULT_ENGINE,
+						help='execution engine (default: %(default)s)')
+	parser.add_argument('-O', '--optimize', type=int, default=DEFAULT_LEVEL,
+						choices=range(MAX_LEVEL + 1), metavar='LEVEL',
+						help='optimization level (default: %(default)s)')
+	parser.add_argument('--no-cache', action='store_true',
+						help='always lex and parse instead of using the .yodac cache')
+	parser.add_argument('--cache-dir', metavar='DIR',
+						help='keep .yodac cache files in DIR instead of next to the programs')
+	parser.add_argument('--output-dir', metavar='DIR',
+						help="write each program's output and errors to DIR")
+	parser.add_argument('--max-steps', type=int, metavar='N',
+						help='stop each program after N steps')
+	parser.add_argument('--max-time', type=float, metavar='SECONDS',
+						help='stop each program after this many seconds')
+	parser.add_argument('--max-string', type=int, metavar='CHARACTERS',
+						help='stop a program when it builds a longer string to print')
+	args = parser.parse_args()
+
+	options = {'engine': args.engine, 'level': args.optimize,
+			   'cache': not args.no_cache, 'cache_dir': args.cache_dir,
+			   'limits': (args.max_steps, args.max_time, args.max_string)}
+	paths = expand(args.files)
+	start = time.time()
+	results = run_batch(paths, options, args.workers)
+	if args.output_dir:
+		save_outputs(results, args.output_dir)
+	sys.stdout.write(summary(results, time.time() - start, args.workers))
+	if [result for result in results if result['status'] != OK]:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
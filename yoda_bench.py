@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+#######################################
+# yoda_bench.py
+# Benchmark harness for the interpreter
+#
+# Times each phase of running a program separately - lexing, parsing,
+# optimizing and evaluating - on the programs in tests/ and on
+# generated programs scaled with --scale. Every program is measured in
+# a fresh worker process so that its peak memory is its own.
+#
+# How to Use:
+#     python yoda_bench.py [OPTIONS] [PROGRAM ...]
+#
+# PROGRAM is a .yoda file or the name of a generated program; without
+# any, every test program and every generated program is run.
+#
+# Options:
+#     --engine ENGINE       engine of the eval phase (default: tree)
+#     -O LEVEL              optimization level (default: 2)
+#     --scale N             size factor of the generated programs
+#     --repeat N            runs per phase; the fastest is kept
+#     --save FILE           store the results as a JSON baseline
+#     --compare FILE        compare against a stored baseline; exits
+#                           with status 1 when a phase got slower than
+#                           --threshold allows or a program that ran
+#                           in the baseline fails
+#     --threshold FRACTION  slowdown counted as a regression (0.10)
+#######################################
+
+import sys
+import os
+import glob
+import json
+import time
+import resource
+import argparse
+import multiprocessing
+from yoda_lexer import *
+from yoda_parser import *
+from yoda_interpreter import *
+from yoda_optimizer import optimize, DEFAULT_LEVEL, MAX_LEVEL
+from yoda_output import NullSink, using
+from yoda_profile import Profile, instrument
+from yoda_visitor import children
+
+BASELINE_VERSION = 1
+PHASES = ('lex', 'parse', 'optimize', 'eval')
+DEFAULT_THRESHOLD = 0.10
+# Phases faster than this in both runs are timer noise and are never
+# reported as regressions
+MIN_TIME = 0.001
+# Each nested statement costs the parser a few dozen Python frames, so
+# workers allow deeper recursion than the default
+RECURSION_LIMIT = 10000
+TEST_PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', '*.yoda')
+
+BEGIN = 'A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...\n'
+END = '\n...MAY THE FORCE BE WITH YOU\n'
+
+
+#######################################
+# Generated programs
+#
+# Each generator takes the scale and returns (source, iterations),
+# the number of loop iterations the program runs
+#######################################
+
+# Ifs nested inside each other
+def deep_nesting(scale):
+	depth = 15 * scale
+	opening = ''.join(['ITS A TRAP n SITH %d MOVE ALONG n YODA n VADER 1;\n' % (i + 1)
+					   for i in range(depth)])
+	closing = '\nTHESE ARENT THE DROIDS YOU ARE LOOKING FOR' * depth
+	return (BEGIN + opening + 'IVE GOT A BAD FEELING ABOUT THIS n + "\\n"' + closing + END, 0)
+
+# One long straight-line sequence of statements
+def long_statements(scale):
+	count = 20000 * scale
+	statements = ['x YODA x VADER %d' % (i % 7) for i in range(count)]
+	statements.append('IVE GOT A BAD FEELING ABOUT THIS x + "\\n"')
+	return (BEGIN + ';\n'.join(statements) + END, 0)
+
+# A single arithmetic loop
+def huge_loop(scale):
+	count = 100000 * scale
+	return (BEGIN + """i YODA 0; total YODA 0;
+DO i SITH %d OR DO NOT...
+	total YODA total VADER i LUKE 3 CHEWBACCA 7;
+	i YODA i VADER 1
+THERE IS NO TRY;
+IVE GOT A BAD FEELING ABOUT THIS total + "\\n\"""" % count + END, count)
+
+# A loop printing long + chains
+def concatenation(scale):
+	count = 20000 * scale
+	parts = ' + " " + '.join(['i'] * 10)
+	return (BEGIN + """i YODA 0;
+DO i SITH %d OR DO NOT...
+	IVE GOT A BAD FEELING ABOUT THIS "line " + %s + "\\n";
+	i YODA i VADER 1
+THERE IS NO TRY""" % (count, parts) + END, count)
+
+generators = {
+	'deep_nesting': deep_nesting,
+	'long_statements': long_statements,
+	'huge_loop': huge_loop,
+	'concatenation': concatenation,
+}
+
+
+#######################################
+# Measurement (runs in a worker process)
+#######################################
+
+# Peak resident memory of this process, in kilobytes on Linux
+def peak_memory():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def count_nodes(ast):
+	count = 0
+	pending = [ast]
+	while pending:
+		node = pending.pop()
+		count += 1
+		pending.extend(children(node))
+	return count
+
+# Loop iterations of a program, from a profiled run
+def count_iterations(ast):
+	profile = Profile()
+	with using(NullSink()):
+		prepare(instrument(ast, profile), 'tree', False)({})
+	return sum([stats.count for stats in profile.stats
+				if stats.label == 'WhileStatement iteration'])
+
+# Calls function repeat times and returns (fastest time, last result)
+def timed(function, repeat):
+	best = None
+	for _ in range(repeat):
+		start = time.time()
+		result = function()
+		elapsed = time.time() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return (best, result)
+
+def measure(task):
+	(name, source, iterations, options) = task
+	sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+	start_memory = peak_memory()
+	result = {'name': name}
+	try:
+		(result['lex'], tokens) = timed(lambda: yoda_lex(source), options['repeat'])
+		(result['parse'], parsed) = timed(lambda: yoda_parse(tokens), options['repeat'])
+		if not parsed:
+			raise ValueError('parse error')
+		ast = parsed.value
+		(result['optimize'], ast) = timed(lambda: optimize(parsed.value, options['level']),
+										 options['repeat'])
+		def evaluate():
+			run = prepare(ast, options['engine'])
+			with using(NullSink()):
+				run({})
+		(result['eval'], _) = timed(evaluate, options['repeat'])
+		result['tokens'] = len(tokens)
+		result['nodes'] = count_nodes(parsed.value)
+		result['peak_kb'] = peak_memory() - start_memory
+		if iterations is None:
+			iterations = count_iterations(ast)
+		result['iterations'] = iterations
+	except Exception, error:
+		result['error'] = '%s: %s' % (error.__class__.__name__, error)
+	return result
+
+
+#######################################
+# Reports
+#######################################
+
+def rate(count, seconds):
+	if not seconds:
+		return '-'
+	value = count / seconds
+	for (unit, size) in (('G', 1e9), ('M', 1e6), ('k', 1e3)):
+		if value >= size:
+			return '%.2f%s/s' % (value / size, unit)
+	return '%.0f/s' % value
+
+def report(results):
+	lines = ['%-18s %9s %11s %9s %11s %9s %9s %12s %9s' %
+			 ('program', 'lex s', 'tokens', 'parse s', 'nodes', 'opt s', 'eval s',
+			  'iterations', 'peak MB')]
+	for result in results:
+		if 'error' in result:
+			lines.append('%-18s %s' % (result['name'], result['error']))
+			continue
+		lines.append('%-18s %9.4f %11s %9.4f %11s %9.4f %9.4f %12s %9.1f' % (
+			result['name'],
+			result['lex'], rate(result['tokens'], result['lex']),
+			result['parse'], rate(result['nodes'], result['parse']),
+			result['optimize'], result['eval'],
+			rate(result['iterations'], result['eval']) if result['iterations'] else '-',
+			result['peak_kb'] / 1024.0))
+	return '\n'.join(lines) + '\n'
+
+# Compares results with a baseline; returns the report and whether any
+# phase got slower than threshold allows. A program that fails now but
+# ran in the baseline is a regression too; one that already failed in
+# the baseline is skipped
+def compare(results, baseline, threshold):
+	lines = ['%-18s %-9s %10s %10s %8s' % ('program', 'phase', 'base s', 'now s', 'change')]
+	regressed = False
+	for result in results:
+		base = baseline.get(result['name'])
+		if not base or 'error' in base:
+			continue
+		if 'error' in result:
+			lines.append('%-18s %-9s %s  REGRESSION' % (result['name'], 'error', result['error']))
+			regressed = True
+			continue
+		for phase in PHASES:
+			(old, new) = (base[phase], result[phase])
+			change = (new - old) / old if old else 0.0
+			mark = ''
+			if change > threshold and max(old, new) >= MIN_TIME:
+				mark = '  REGRESSION'
+				regressed = True
+			lines.append('%-18s %-9s %10.4f %10.4f %+7.1f%%%s' %
+						 (result['name'], phase, old, new, change * 100, mark))
+	return ('\n'.join(lines) + '\n', regressed)
+
+def save(results, path, options):
+	with open(path, 'w') as file:
+		json.dump({'version': BASELINE_VERSION, 'options': options,
+				   'results': dict([(result['name'], result) for result in results])},
+				  file, indent=1, sort_keys=True)
+
+def load(path):
+	with open(path) as file:
+		data = json.load(file)
+	if data.get('version') != BASELINE_VERSION:
+		raise ValueError('%s is not a version %d baseline' % (path, BASELINE_VERSION))
+	return data['results']
+
+
+#######################################
+# Command line
+#######################################
+
+# (name, source, iterations) of the programs named on the command line
+def programs(names, scale):
+	if not names:
+		names = sorted(glob.glob(TEST_PROGRAMS)) + sorted(generators)
+	found = []
+	for name in names:
+		if name in generators:
+			(source, iterations) = generators[name](scale)
+			found.append((name, source, iterations or None))
+		else:
+			with open(name) as file:
+				found.append((os.path.splitext(os.path.basename(name))[0], file.read(), None))
+	return found
+
+def main():
+	parser = argparse.ArgumentParser(description='Star Wars Interpreter benchmarks')
+	parser.add_argument('programs', nargs='*', metavar='PROGRAM',
+						help='.yoda files or generated programs (%s)' % ', '.join(sorted(generators)))
+	parser.add_argument('--engine', choices=sorted(ENGINES), default=DEFAULT_ENGINE,
+						help='engine of the eval phase (default: %(default)s)')
+	parser.add_argument('-O', '--optimize', type=int, default=DEFAULT_LEVEL,
+						choices=range(MAX_LEVEL + 1), metavar='LEVEL',
+						help='optimization level (default: %(default)s)')
+	parser.add_argument('--scale', type=int, default=1,
+						help='size factor of the generated programs (default: %(default)s)')
+	parser.add_argument('--repeat', type=int, default=3,
+						help='runs per phase, keeping the fastest (default: %(default)s)')
+	parser.add_argument('--save', metavar='FILE', help='store the results as a baseline')
+	parser.add_argument('--compare', metavar='FILE', help='compare against a stored baseline')
+	parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+						help='slowdown reported as a regression (default: %(default)s)')
+	args = parser.parse_args()
+
+	options = {'engine': args.engine, 'level': args.optimize, 'repeat': args.repeat}
+	tasks = [program + (options,) for program in programs(args.programs, args.scale)]
+	# One fresh process per program keeps peak memory figures apart
+	pool = multiprocessing.Pool(1, maxtasksperchild=1)
+	try:
+		results = pool.map(measure, tasks, 1)
+	finally:
+		pool.close()
+		pool.join()
+	sys.stdout.write(report(results))
+	if args.save:
+		save(results, args.save, options)
+	if args.compare:
+		(text, regressed) = compare(results, load(args.compare), args.threshold)
+		sys.stdout.write('\n' + text)
+		if regressed:
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,202 @@
+#######################################
+# yoda_budget.py
+# Execution budgets: step, time and string size limits
+#
+# govern() returns a copy of a program with checks added: the program
+# and every loop body start with a StepStatement charging the statements
+# they run (a loop body one more, for the iteration), and every string a
+# print joins goes through a LimitedStringExp. Steps are counted once
+# per statement list rather than per statement, and an if counts as its
+# longer branch, so a loop iteration costs a single check. The checks charge the
+# budget installed for the current thread with limited(), so a governed
+# program can be prepared once and run under any budget; without one it
+# runs unlimited. When a limit is hit BudgetExceeded is raised, and
+# run_limited() gives it the environment as the program left it.
+#
+# The clock is read every CLOCK_STEPS steps, so a time limit is only
+# noticed between statements, and a single slow statement (a product of
+# huge numbers) cannot be interrupted.
+#######################################
+
+import time
+import threading
+from yoda_ast import *
+from yoda_visitor import Transformer
+
+# Steps between readings of the clock
+CLOCK_STEPS = 1000
+
+INFINITY = float('inf')
+
+# Returns a copy of ast that charges the current budget as it runs
+def govern(ast):
+	return counted(Governor().visit(ast))
+
+
+# Raised by Budget when a limit is hit. reason is 'steps', 'time' or
+# 'string'; env is the environment of the stopped program, when the
+# program was run with run_limited
+class BudgetExceeded(Exception):
+	def __init__(self, reason, limit, steps):
+		Exception.__init__(self, '%s limit of %s exceeded after %d steps' % (reason, limit, steps))
+		self.reason = reason
+		self.limit = limit
+		self.steps = steps
+		self.env = None
+
+
+# Budget - limits of one run; None means no limit. max_time is in
+# seconds from start(), max_string in characters
+class Budget:
+	def __init__(self, max_steps=None, max_time=None, max_string=None):
+		self.max_steps = max_steps
+		self.max_time = max_time
+		self.max_string = max_string
+		self.start()
+
+	def start(self):
+		self.steps = 0
+		self.deadline = None
+		if self.max_time is not None:
+			self.deadline = time.time() + self.max_time
+		self.next_check = 0
+		self.check()
+
+	# Charges count steps; the limits are only checked once next_check
+	# is reached, so the common case is one addition and one comparison
+	def step(self, count=1):
+		self.steps += count
+		if self.steps >= self.next_check:
+			self.check()
+
+	def check(self):
+		if self.max_steps is not None and self.steps > self.max_steps:
+			raise BudgetExceeded('steps', self.max_steps, self.steps)
+		if self.deadline is None:
+			next_check = INFINITY
+		elif time.time() > self.deadline:
+			raise BudgetExceeded('time', self.max_time, self.steps)
+		else:
+			next_check = self.steps + CLOCK_STEPS
+		if self.max_steps is not None:
+			next_check = min(next_check, self.max_steps + 1)
+		self.next_check = next_check
+
+	# Returns text, or raises if it is longer than max_string
+	def check_text(self, text):
+		if self.max_string is not None and len(text) > self.max_string:
+			raise BudgetExceeded('string', self.max_string, self.steps)
+		return text
+
+	def has_limits(self):
+		return self.max_steps is not None or self.max_time is not None or \
+			   self.max_string is not None
+
+	def __repr__(self):
+		return 'Budget(%s, %s, %s)' % (self.max_steps, self.max_time, self.max_string)
+
+
+_budget = threading.local()
+
+def current_budget():
+	budget = getattr(_budget, 'budget', None)
+	if budget is None:
+		budget = _budget.budget = Budget()
+	return budget
+
+# limited - installs budget for the current thread and starts it; the
+# previous budget is restored when the block ends
+class limited:
+	def __init__(self, budget):
+		self.budget = budget
+
+	def __enter__(self):
+		self.saved = getattr(_budget, 'budget', None)
+		_budget.budget = self.budget
+		self.budget.start()
+		return self.budget
+
+	def __exit__(self, *exc_info):
+		_budget.budget = self.saved
+		return False
+
+# Runs a prepared program under budget. A BudgetExceeded raised by the
+# program carries env, with the variables assigned up to that point
+def run_limited(run, env, budget):
+	with limited(budget):
+		try:
+			run(env)
+		except BudgetExceeded, error:
+			error.env = env
+			raise
+	return env
+
+
+#######################################
+# Check nodes
+#######################################
+
+# Charges count steps to the current budget
+class StepStatement(Statement):
+	__slots__ = ('count',)
+
+	def __init__(self, count):
+		self.count = count
+
+	def __repr__(self):
+		return 'StepStatement(%d)' % self.count
+
+	def eval(self, env):
+		current_budget().step(self.count)
+
+# String expression whose value is checked against the string limit
+# (the abstract StringExp of yoda_ast is shadowed by the literal class
+# of the same name, so this derives from Equality like it does;
+# Transformer.visit still dispatches it to visit_LimitedStringExp)
+class LimitedStringExp(Equality):
+	__slots__ = ('exp',)
+
+	def __init__(self, exp):
+		self.exp = exp
+
+	def __repr__(self):
+		return 'LimitedStringExp(%s)' % self.exp
+
+	def eval(self, env):
+		return current_budget().check_text(self.exp.eval(env))
+
+
+# Steps charged for running node: one per statement, with the longer
+# branch of an if. Loops count one; their bodies charge themselves
+def steps(node):
+	if isinstance(node, BlockStatement):
+		return sum([steps(statement) for statement in node.statements])
+	elif isinstance(node, CompoundStatement):
+		return steps(node.first) + steps(node.second)
+	elif isinstance(node, IfStatement):
+		return 1 + max(steps(node.true_stmt), node.false_stmt and steps(node.false_stmt) or 0)
+	elif isinstance(node, (PassStatement, StepStatement)):
+		return 0
+	return 1
+
+# Statement list of node, led by a StepStatement charging it and extra
+# more steps
+def counted(node, extra=0):
+	if isinstance(node, BlockStatement):
+		statements = node.statements
+	else:
+		statements = [node]
+	return BlockStatement([StepStatement(steps(node) + extra)] + statements)
+
+class Governor(Transformer):
+	def visit_WhileStatement(self, node):
+		node = self.generic_visit(node)
+		node.body = counted(node.body, 1)
+		return node
+
+	# Only joined strings can grow; literals are as long as the source
+	def visit_PrintStatement(self, node):
+		node = self.generic_visit(node)
+		if isinstance(node.stmt, (ConcatStringExp, JoinStringExp, FormatStringExp)):
+			node.stmt = LimitedStringExp(node.stmt)
+		return node
@@ -0,0 +1,103 @@
+#######################################
+# yoda_cache.py
+# On-disk cache of parsed programs (.yodac files)
+#
+# A cache file holds a header line and the parsed program pickled in
+# arena form (see yoda_arena.py). The header names the cache format,
+# the Python version and a digest of the lexer, grammar, AST and arena
+# modules, followed by the SHA-1 of the source; a file whose header
+# does not match exactly is stale and is parsed again and replaced.
+# Files are written to a temporary name and renamed into place, so a
+# run never reads a half-written cache file.
+#
+# Cache files are trusted like .pyc files: only use a cache directory
+# that no one else can write to.
+#######################################
+
+import os
+import sys
+import hashlib
+import tempfile
+import cPickle as pickle
+import lexer
+import combinators
+import yoda_lexer
+import yoda_parser
+import yoda_ast
+import yoda_arena
+import equality
+from yoda_arena import to_arena
+
+FORMAT_VERSION = 1
+EXTENSION = '.yodac'
+
+# Modules whose source decides how a program parses and how its
+# pickled arena form reads back
+grammar_modules = (lexer, combinators, yoda_lexer, yoda_parser, yoda_ast, yoda_arena, equality)
+
+_version = []
+
+# Names the cache format, the Python version and the grammar; computed
+# once per process
+def interpreter_version():
+	if not _version:
+		digest = hashlib.sha1()
+		for module in grammar_modules:
+			path = os.path.splitext(module.__file__)[0] + '.py'
+			with open(path, 'rb') as file:
+				digest.update(file.read())
+		_version.append('yodac %d python %d.%d grammar %s' % (
+			(FORMAT_VERSION,) + tuple(sys.version_info[:2]) + (digest.hexdigest(),)))
+	return _version[0]
+
+def header(source):
+	return '%s source %s\n' % (interpreter_version(), hashlib.sha1(source).hexdigest())
+
+# The cache file of the program at path: next to it, or in cache_dir
+# under the digest of its source
+def cache_path(path, source, cache_dir=None):
+	if cache_dir is None:
+		return os.path.splitext(path)[0] + EXTENSION
+	return os.path.join(cache_dir, hashlib.sha1(source).hexdigest() + EXTENSION)
+
+# Returns the cached AST of source, or None when there is no cache file
+# or it is stale or unreadable
+def load(path, source, cache_dir=None):
+	try:
+		with open(cache_path(path, source, cache_dir), 'rb') as file:
+			if file.readline() != header(source):
+				return None
+			return pickle.load(file).to_node()
+	except Exception:
+		return None
+
+# Writes the cache file of source; failing to write it, or to pickle
+# the program, is not an error: the program is just parsed next time
+def store(path, source, ast, cache_dir=None):
+	target = cache_path(path, source, cache_dir)
+	directory = os.path.dirname(target) or '.'
+	try:
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		(fd, temp) = tempfile.mkstemp(EXTENSION, '.tmp', directory)
+		try:
+			with os.fdopen(fd, 'wb') as file:
+				file.write(header(source))
+				pickle.dump(to_arena(ast), file, pickle.HIGHEST_PROTOCOL)
+			os.rename(temp, target)
+		except Exception:
+			os.remove(temp)
+			raise
+	except Exception:
+		pass
+
+# Returns the AST of source, from the cache when it is up to date and
+# otherwise from parse(source), which is cached. parse returns None on
+# a parse error, and then nothing is cached
+def parse_cached(path, source, parse, cache_dir=None):
+	ast = load(path, source, cache_dir)
+	if ast is None:
+		ast = parse(source)
+		if ast is not None:
+			store(path, source, ast, cache_dir)
+	return ast
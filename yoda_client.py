@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+#######################################
+# yoda_client.py
+# Runs a .yoda program on a running yoda_daemon.py
+#
+# Sends the program to the daemon and copies its output to stdout and
+# its errors to stderr as they arrive; exits with the program's status.
+#
+# How to Use:
+#     python yoda_client.py [OPTIONS] FILE.yoda
+#
+# Options:
+#     --socket PATH         socket of the daemon (default: DEFAULT_SOCKET
+#                           in yoda_protocol.py)
+#     --engine ENGINE       execution engine (default: tree)
+#     -O LEVEL              optimization level (default: 2)
+#######################################
+
+import sys
+import argparse
+import socket
+from yoda_protocol import *
+
+# Engine and level defaults are checked by the daemon; they are repeated
+# here so that the client does not import the interpreter
+DEFAULT_ENGINE = 'tree'
+DEFAULT_LEVEL = 2
+
+def run(path, source, engine, level, socket_path=DEFAULT_SOCKET):
+	connection = connect(socket_path)
+	try:
+		file = connection.makefile('rwb', 0)
+		write_request(file, source, engine, level, path)
+		connection.shutdown(socket.SHUT_WR)
+		while True:
+			frame = read_frame(file)
+			if frame is None:
+				raise ProtocolError('connection closed before the exit status')
+			(kind, data) = frame
+			if kind == OUT:
+				sys.stdout.write(data)
+				sys.stdout.flush()
+			elif kind == ERR:
+				sys.stderr.write(data)
+			else:
+				return int(data)
+	finally:
+		connection.close()
+
+def main():
+	parser = argparse.ArgumentParser(description='Star Wars Interpreter client')
+	parser.add_argument('file', help='.yoda program to run')
+	parser.add_argument('--socket', default=DEFAULT_SOCKET, metavar='PATH',
+						help='socket of the daemon (default: %(default)s)')
+	parser.add_argument('--engine', default=DEFAULT_ENGINE,
+						help='execution engine (default: %(default)s)')
+	parser.add_argument('-O', '--optimize', type=int, default=DEFAULT_LEVEL, metavar='LEVEL',
+						help='optimization level (default: %(default)s)')
+	args = parser.parse_args()
+
+	try:
+		with open(args.file) as file:
+			source = file.read()
+	except IOError, error:
+		sys.stderr.write('%s\n' % error)
+		sys.exit(1)
+	try:
+		status = run(args.file, source, args.engine, args.optimize, args.socket)
+	except socket.error, error:
+		sys.stderr.write('Cannot reach the daemon on %s: %s\n' % (args.socket, error))
+		sys.exit(2)
+	except ProtocolError, error:
+		sys.stderr.write('Bad reply from the daemon: %s\n' % error)
+		sys.exit(2)
+	sys.exit(status)
+
+if __name__ == '__main__':
+	main()
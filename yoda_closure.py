@@ -0,0 +1,320 @@
+#######################################
+# yoda_closure.py
+# Closure compilation engine
+#
+# Compiles a parsed program once into nested Python closures. Operators
+# are bound to functions from the operator module at compile time, so
+# running the program never dispatches on operator names again.
+#######################################
+
+import inspect
+import operator
+from yoda_ast import *
+from yoda_output import current_sink
+from yoda_budget import current_budget, StepStatement, LimitedStringExp
+
+arithm_operators = {
+	'VADER': operator.add,
+	'SIDIOUS': operator.sub,
+	'LUKE': operator.mul,
+	'LEAH': operator.div,
+	'CHEWBACCA': operator.mod,
+}
+
+relop_operators = {
+	'SITH': operator.lt,
+	'SITH_ORDER': operator.le,
+	'JEDI': operator.gt,
+	'JEDI_ORDER': operator.ge,
+	'ORDER': operator.eq,
+	'BB8_ORDER': operator.ne,
+}
+
+# Called by the interpreter
+# Returns a function that runs the program against an environment dict
+def compile_closure(ast):
+	return compile_node(ast)
+
+compilers = {}
+
+def compiles(node_class):
+	def register(compiler):
+		compilers[node_class] = compiler
+		return compiler
+	return register
+
+# Compiles a node with the compiler registered for its class (or for
+# the nearest base class). Nodes without a compiler are run by their
+# own eval, so new node types work before they get a compiler here
+def compile_node(node):
+	for node_class in inspect.getmro(node.__class__):
+		compiler = compilers.get(node_class)
+		if compiler:
+			return compiler(node)
+	return node.eval
+
+
+#######################################
+# Statements
+#######################################
+
+# Blocks and left-nested CompoundStatements are flattened into one
+# sequence
+def statement_sequence(node):
+	statements = []
+	pending = [node]
+	while pending:
+		node = pending.pop()
+		if isinstance(node, BlockStatement):
+			pending.extend(reversed(node.statements))
+		elif isinstance(node, CompoundStatement):
+			pending.append(node.second)
+			pending.append(node.first)
+		elif not isinstance(node, PassStatement):
+			statements.append(compile_node(node))
+	return statements
+
+@compiles(BlockStatement)
+@compiles(CompoundStatement)
+def compile_compound(node):
+	statements = statement_sequence(node)
+	if len(statements) == 1:
+		return statements[0]
+	elif len(statements) == 2:
+		(first, second) = statements
+		def run(env):
+			first(env)
+			second(env)
+	elif len(statements) == 3:
+		(first, second, third) = statements
+		def run(env):
+			first(env)
+			second(env)
+			third(env)
+	else:
+		statements = tuple(statements)
+		def run(env):
+			for statement in statements:
+				statement(env)
+	return run
+
+@compiles(AssignStatement)
+def compile_assign(node):
+	name = node.name
+	exp = compile_node(node.exp)
+	def run(env):
+		env[name] = exp(env)
+	return run
+
+@compiles(SlotAssignStatement)
+def compile_slot_assign(node):
+	slot = node.slot
+	exp = compile_node(node.exp)
+	def run(env):
+		env[slot] = exp(env)
+	return run
+
+@compiles(AugAssignStatement)
+def compile_aug_assign(node):
+	name = node.name
+	function = arithm_operators[node.op]
+	if isinstance(node.exp, IntArithmExp):
+		i = node.exp.i
+		def run(env):
+			env[name] = function(env.get(name, 0), i)
+	else:
+		exp = compile_node(node.exp)
+		def run(env):
+			env[name] = function(env.get(name, 0), exp(env))
+	return run
+
+@compiles(SlotAugAssignStatement)
+def compile_slot_aug_assign(node):
+	slot = node.slot
+	function = arithm_operators[node.op]
+	if isinstance(node.exp, IntArithmExp):
+		i = node.exp.i
+		def run(env):
+			env[slot] = function(env[slot], i)
+	else:
+		exp = compile_node(node.exp)
+		def run(env):
+			env[slot] = function(env[slot], exp(env))
+	return run
+
+@compiles(IfStatement)
+def compile_if(node):
+	condition = compile_node(node.condition)
+	true_stmt = compile_node(node.true_stmt)
+	if node.false_stmt:
+		false_stmt = compile_node(node.false_stmt)
+		def run(env):
+			if condition(env):
+				true_stmt(env)
+			else:
+				false_stmt(env)
+	else:
+		def run(env):
+			if condition(env):
+				true_stmt(env)
+	return run
+
+@compiles(WhileStatement)
+def compile_while(node):
+	condition = compile_node(node.condition)
+	body = compile_node(node.body)
+	def run(env):
+		while condition(env):
+			body(env)
+	return run
+
+@compiles(PassStatement)
+def compile_pass(node):
+	return lambda env: None
+
+@compiles(PrintStatement)
+def compile_print(node):
+	exp = compile_node(node.stmt)
+	def run(env):
+		current_sink().write('%s' % exp(env))
+	return run
+
+@compiles(StepStatement)
+def compile_step(node):
+	count = node.count
+	def run(env):
+		current_budget().step(count)
+	return run
+
+
+#######################################
+# Arithmetic expressions
+#######################################
+
+# Binary operations over a variable and a constant, or two variables,
+# are the common case and are compiled without inner closure calls
+def compile_operation(function, left, right):
+	if isinstance(left, SlotArithmExp) and isinstance(right, IntArithmExp):
+		(slot, i) = (left.slot, right.i)
+		return lambda env: function(env[slot], i)
+	if isinstance(left, SlotArithmExp) and isinstance(right, SlotArithmExp):
+		(left_slot, right_slot) = (left.slot, right.slot)
+		return lambda env: function(env[left_slot], env[right_slot])
+	if isinstance(left, VarArithmExp) and isinstance(right, IntArithmExp):
+		(name, i) = (left.name, right.i)
+		return lambda env: function(env.get(name, 0), i)
+	if isinstance(left, VarArithmExp) and isinstance(right, VarArithmExp):
+		(left_name, right_name) = (left.name, right.name)
+		return lambda env: function(env.get(left_name, 0), env.get(right_name, 0))
+	(left, right) = (compile_node(left), compile_node(right))
+	return lambda env: function(left(env), right(env))
+
+@compiles(BinopArithmExp)
+def compile_binop(node):
+	if node.op not in arithm_operators:
+		return node.eval
+	return compile_operation(arithm_operators[node.op], node.left, node.right)
+
+@compiles(IntArithmExp)
+def compile_int(node):
+	i = node.i
+	return lambda env: i
+
+@compiles(VarArithmExp)
+def compile_var(node):
+	name = node.name
+	return lambda env: env.get(name, 0) # Variables are initialized to 0
+
+@compiles(SlotArithmExp)
+def compile_slot(node):
+	slot = node.slot
+	return lambda env: env[slot]
+
+
+#######################################
+# Boolean expressions
+#######################################
+
+@compiles(AndBoolExp)
+def compile_and(node):
+	(left, right) = (compile_node(node.left), compile_node(node.right))
+	return lambda env: left(env) and right(env)
+
+@compiles(OrBoolExp)
+def compile_or(node):
+	(left, right) = (compile_node(node.left), compile_node(node.right))
+	return lambda env: left(env) or right(env)
+
+@compiles(NotBoolExp)
+def compile_not(node):
+	exp = compile_node(node.exp)
+	return lambda env: not exp(env)
+
+@compiles(RelopBoolExp)
+def compile_relop(node):
+	if node.op not in relop_operators:
+		return node.eval
+	return compile_operation(relop_operators[node.op], node.left, node.right)
+
+@compiles(TrueBoolExp)
+def compile_true(node):
+	return lambda env: True
+
+@compiles(FalseBoolExp)
+def compile_false(node):
+	return lambda env: False
+
+
+#######################################
+# String expressions
+#######################################
+
+@compiles(ConcatStringExp)
+def compile_concat(node):
+	(left, right) = (compile_node(node.left), compile_node(node.right))
+	def run(env):
+		left_value = left(env)
+		right_value = right(env)
+		if isinstance(left_value, (int, long)):
+			value = '%d' % left_value
+		else:
+			value = left_value
+		if isinstance(right_value, (int, long)):
+			return value + '%d' % right_value
+		return value + right_value
+	return run
+
+# Literal parts are kept as strings, so only the other parts are called
+@compiles(JoinStringExp)
+def compile_join(node):
+	parts = tuple([part.value if isinstance(part, StringExp) else compile_node(part)
+				   for part in node.parts])
+	def run(env):
+		values = []
+		for part in parts:
+			if part.__class__ is not str and part.__class__ is not unicode:
+				part = part(env)
+				if isinstance(part, (int, long)):
+					part = '%d' % part
+			values.append(part)
+		return ''.join(values)
+	return run
+
+@compiles(FormatStringExp)
+def compile_format(node):
+	format = node.format
+	args = tuple([compile_node(arg) for arg in node.args])
+	if len(args) == 1:
+		(arg,) = args
+		return lambda env: format % (arg(env),)
+	return lambda env: format % tuple([arg(env) for arg in args])
+
+@compiles(StringExp)
+def compile_string(node):
+	s = node.value
+	return lambda env: s
+
+@compiles(LimitedStringExp)
+def compile_limited(node):
+	exp = compile_node(node.exp)
+	return lambda env: current_budget().check_text(exp(env))
@@ -0,0 +1,238 @@
+#! /usr/bin/env python
+#######################################
+# yoda_daemon.py
+# Interpreter daemon on a Unix socket
+#
+# Keeps one interpreter process running so that programs skip the
+# start-up cost: the lexer tables and the grammar are built once, when
+# the daemon starts, and the most recently run programs are kept
+# prepared for their engine, so running one again neither lexes, parses
+# nor optimizes it. Each connection runs one program (see
+# yoda_protocol.py) on its own thread and gets the printed output
+# streamed back while the program runs. yoda_client.py is the matching
+# command.
+#
+# How to Use:
+#     python yoda_daemon.py [OPTIONS]
+#
+# Options:
+#     --socket PATH         socket to listen on (default: DEFAULT_SOCKET
+#                           in yoda_protocol.py)
+#     --cache-size N        prepared programs to keep (default: 256)
+#     --buffer-size BYTES   send output once this much is pending
+#     --max-steps N         stop each program after N steps
+#     --max-time SECONDS    stop each program after this long
+#     --max-string CHARACTERS
+#                           stop a program that builds a longer string
+#######################################
+
+import sys
+import os
+import errno
+import socket
+import hashlib
+import argparse
+import threading
+import traceback
+import SocketServer
+from collections import OrderedDict
+from lexer import LexError
+from yoda_lexer import *
+from yoda_parser import *
+from yoda_interpreter import *
+from yoda_optimizer import optimize, DEFAULT_LEVEL, MAX_LEVEL
+from yoda_output import OutputSink, using, encode
+from yoda_budget import Budget, BudgetExceeded, govern, run_limited
+from yoda_protocol import *
+
+DEFAULT_CACHE_SIZE = 256
+# Output is sent in frames of about this size, so that long-running
+# programs stream without a frame per print
+DEFAULT_BUFFER_SIZE = 4096
+
+
+# Raised when a request cannot be run; the message goes to the client
+class RequestError(Exception):
+	pass
+
+
+# ProgramCache - least recently used programs, prepared for an engine
+# and level, keyed by the digest of their source. Shared by the threads
+# of all connections. Governed programs charge the budget of the run
+class ProgramCache:
+	def __init__(self, size=DEFAULT_CACHE_SIZE, governed=False):
+		self.size = size
+		self.governed = governed
+		self.programs = OrderedDict()
+		self.lock = threading.Lock()
+
+	# Returns the prepared program of source, preparing it on a miss.
+	# Lex and parse errors raise RequestError and are not cached
+	def get(self, source, engine, level):
+		key = (hashlib.sha1(source).hexdigest(), engine, level)
+		with self.lock:
+			run = self.programs.pop(key, None)
+			if run is not None:
+				self.programs[key] = run
+				return run
+		# Preparing runs outside the lock; two threads missing on the
+		# same program both prepare it, which is harmless
+		run = prepare_source(source, engine, level, self.governed)
+		with self.lock:
+			self.programs[key] = run
+			while len(self.programs) > self.size:
+				self.programs.popitem(last=False)
+		return run
+
+
+def prepare_source(source, engine, level, governed=False):
+	try:
+		tokens = yoda_tokenize(source, positions=True, compact=True)
+	except LexError, error:
+		raise RequestError(str(error))
+	parse_result = yoda_parse(tokens)
+	if not parse_result:
+		raise RequestError('Parse error!\n')
+	ast = optimize(parse_result.value, level)
+	if governed:
+		ast = govern(ast)
+	return prepare(ast, engine)
+
+
+# SocketSink - sends prints to the client as out frames, batched up to
+# size bytes
+class SocketSink(OutputSink):
+	def __init__(self, file, size=DEFAULT_BUFFER_SIZE):
+		OutputSink.__init__(self)
+		self.file = file
+		self.size = size
+		self.parts = []
+		self.pending = 0
+
+	def write(self, text):
+		data = encode(text)
+		self.parts.append(data)
+		self.pending += len(data)
+		self.bytes += len(data)
+		if self.pending >= self.size:
+			self.flush()
+
+	def flush(self):
+		if not self.parts:
+			return
+		data = ''.join(self.parts)
+		self.parts = []
+		self.pending = 0
+		self.flushes += 1
+		write_frame(self.file, OUT, data)
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+	def handle(self):
+		try:
+			request = read_request(self.rfile)
+		except ProtocolError, error:
+			self.reply_error('%s\n' % error)
+			return
+		if request is None:
+			# Connected and closed, as claim_socket does
+			return
+		(header, source) = request
+		status = 0
+		sink = SocketSink(self.wfile, self.server.buffer_size)
+		try:
+			run = self.server.cache.get(source, *self.request_options(header))
+			with using(sink):
+				run_limited(run, {}, self.server.budget())
+		except RequestError, error:
+			write_frame(self.wfile, ERR, str(error))
+			status = 1
+		except BudgetExceeded, error:
+			write_frame(self.wfile, ERR, 'Budget exceeded: %s\n' % error)
+			status = 1
+		except socket.error:
+			# The client went away; there is no one left to reply to
+			return
+		except Exception:
+			write_frame(self.wfile, ERR, traceback.format_exc())
+			status = 1
+		write_frame(self.wfile, EXIT, str(status))
+
+	def request_options(self, header):
+		engine = header.get('engine', DEFAULT_ENGINE)
+		if engine not in ENGINES:
+			raise RequestError('unknown engine: %s\n' % engine)
+		level = header.get('level', DEFAULT_LEVEL)
+		if level not in range(MAX_LEVEL + 1):
+			raise RequestError('unknown optimization level: %s\n' % level)
+		return (engine, level)
+
+	def reply_error(self, message):
+		try:
+			write_frame(self.wfile, ERR, message)
+			write_frame(self.wfile, EXIT, '1')
+		except socket.error:
+			pass
+
+
+class YodaServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	daemon_threads = True
+
+	# limits are the (max_steps, max_time, max_string) of a Budget
+	def __init__(self, path, cache_size=DEFAULT_CACHE_SIZE, buffer_size=DEFAULT_BUFFER_SIZE,
+				 limits=(None, None, None)):
+		self.limits = limits
+		self.cache = ProgramCache(cache_size, self.budget().has_limits())
+		self.buffer_size = buffer_size
+		SocketServer.UnixStreamServer.__init__(self, path, RequestHandler)
+
+	# A fresh budget for each run, since runs share no state
+	def budget(self):
+		return Budget(*self.limits)
+
+
+# Removes a socket file left behind by a daemon that is gone; fails if
+# a daemon still answers on it
+def claim_socket(path):
+	try:
+		connect(path).close()
+	except socket.error, error:
+		if error.errno == errno.ENOENT:
+			return
+		if error.errno != errno.ECONNREFUSED:
+			raise
+		os.remove(path)
+		return
+	sys.stderr.write('A daemon is already listening on %s\n' % path)
+	sys.exit(1)
+
+def main():
+	parser = argparse.ArgumentParser(description='Star Wars Interpreter daemon')
+	parser.add_argument('--socket', default=DEFAULT_SOCKET, metavar='PATH',
+						help='socket to listen on (default: %(default)s)')
+	parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, metavar='N',
+						help='prepared programs to keep (default: %(default)s)')
+	parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE, metavar='BYTES',
+						help='send output once this much is pending (default: %(default)s)')
+	parser.add_argument('--max-steps', type=int, metavar='N',
+						help='stop each program after N steps')
+	parser.add_argument('--max-time', type=float, metavar='SECONDS',
+						help='stop each program after this many seconds')
+	parser.add_argument('--max-string', type=int, metavar='CHARACTERS',
+						help='stop a program when it builds a longer string to print')
+	args = parser.parse_args()
+
+	claim_socket(args.socket)
+	server = YodaServer(args.socket, args.cache_size, args.buffer_size,
+						(args.max_steps, args.max_time, args.max_string))
+	sys.stderr.write('Listening on %s\n' % args.socket)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		os.remove(args.socket)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,283 @@
+#######################################
+# yoda_incremental.py
+# Incremental lexing and parsing for editors and hot reloading
+#
+# A Document holds a program's source, its tokens (with line and
+# column) and its top-level statements, each parsed on its own: the
+# program's statement list is split at the ';' tokens outside any DO or
+# ITS A TRAP, which is where stmt_list separates its statements.
+# reparse() applies a text edit to a Document. It lexes again from the
+# start of the edited line only until the new tokens fall back into
+# step with the old ones, and parses again only the top-level statements
+# those tokens belong to; every other statement is reused as it is.
+#
+# The result is the Document a full parse of the new source would give:
+# the same tokens, and the same AST with the same locations. Edits that
+# reach the first or last token of the program, or that open or close
+# a DO or ITS A TRAP without its partner, fall back to a full parse.
+# Beyond the edited statements, an edit that adds or removes lines also
+# moves the lines of the tokens and statements after it.
+#######################################
+
+from bisect import bisect_right
+from lexer import LexError
+from yoda_lexer import *
+from yoda_parser import *
+from yoda_visitor import children
+
+# Keywords that open and close nested statement lists
+OPENING = ('DO', 'ITS A TRAP')
+CLOSING = ('THERE IS NO TRY', 'THESE ARENT THE DROIDS YOU ARE LOOKING FOR')
+SEPARATOR = ';'
+
+# Returns the Document of source, lexed and parsed in full
+def parse_document(source):
+	try:
+		tokens = yoda_tokenize(source, positions=True)
+	except LexError, error:
+		return Document(source, None, [], [], str(error))
+	if not framed(tokens):
+		return Document(source, tokens, [], [], 'Parse error!\n')
+	pieces = split_statements(tokens, 1, len(tokens) - 1, True)
+	if pieces is None:
+		return Document(source, tokens, [], [], 'Parse error!\n')
+	(lengths, statements) = parse_pieces(tokens, pieces)
+	return Document(source, tokens, lengths, statements)
+
+
+class Document:
+	# lengths[k] is the number of tokens of top-level statement k with
+	# the ';' after it; statements[k] is its AST, or None when it does
+	# not parse. A document whose tokens could not be split into
+	# statements has none, and error says why
+	def __init__(self, source, tokens, lengths, statements, error=None):
+		self.source = source
+		self.tokens = tokens
+		self.lengths = lengths
+		self.statements = statements
+		self.error = error
+
+	# The program's AST as yoda_parse builds it, or None when the
+	# program does not lex or parse
+	@property
+	def ast(self):
+		if self.error or None in self.statements:
+			return None
+		if len(self.statements) == 1:
+			return self.statements[0]
+		return BlockStatement(list(self.statements))
+
+	# Message for the first error in the program, or None
+	def errors(self):
+		if self.error:
+			return self.error
+		if None in self.statements:
+			return 'Parse error!\n'
+		return None
+
+	def __repr__(self):
+		return 'Document(%d characters, %d tokens, %d statements)' % \
+			   (len(self.source), len(self.tokens or ()), len(self.statements))
+
+
+# Whether tokens are enclosed in the program's first and last keywords
+def framed(tokens):
+	return len(tokens) >= 2 and \
+		   tokens[0][:2] == ('A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...', SYS_VAR) and \
+		   tokens[-1][:2] == ('...MAY THE FORCE BE WITH YOU', SYS_VAR)
+
+# Splits tokens[start:end] at the top-level separators into
+# (start, end) index pairs, the separators left out. With last set the
+# range runs to the end of the statement list; otherwise it ends with a
+# separator, which closes the last piece. Returns None when the range
+# opens or closes a statement list it does not contain
+def split_statements(tokens, start, end, last):
+	pieces = []
+	depth = 0
+	piece_start = start
+	for index in xrange(start, end):
+		(text, tag) = tokens[index][:2]
+		if tag is not SYS_VAR:
+			continue
+		if text in OPENING:
+			depth += 1
+		elif text in CLOSING:
+			depth -= 1
+			if depth < 0:
+				return None
+		elif text == SEPARATOR and depth == 0:
+			pieces.append((piece_start, index))
+			piece_start = index + 1
+	if depth != 0:
+		return None
+	if last:
+		pieces.append((piece_start, end))
+	elif piece_start != end:
+		return None
+	return pieces
+
+# Parses each piece as one statement. Returns (lengths, statements)
+def parse_pieces(tokens, pieces):
+	statement = stmt()
+	lengths = []
+	statements = []
+	for (index, (start, end)) in enumerate(pieces):
+		piece = tokens[start:end]
+		result = statement(piece, 0)
+		if result and result.pos == len(piece):
+			statements.append(result.value)
+		else:
+			statements.append(None)
+		if index + 1 < len(pieces):
+			end = pieces[index + 1][0]
+		lengths.append(end - start)
+	# The last piece of a range that ends with a separator owns it
+	if pieces and lengths and pieces[-1][1] < len(tokens) and \
+	   tokens[pieces[-1][1]][:2] == (SEPARATOR, SYS_VAR):
+		lengths[-1] += 1
+	return (lengths, statements)
+
+
+# Offsets of the starts of the lines of a text, found as they are asked
+# for, from one known line start onwards
+class LineStarts:
+	def __init__(self, text, line, start):
+		self.text = text
+		self.starts = {line: start}
+		self.last = line
+
+	def __getitem__(self, line):
+		while self.last < line:
+			start = self.text.find('\n', self.starts[self.last]) + 1
+			self.last += 1
+			self.starts[self.last] = start
+		return self.starts[line]
+
+# Index of the first token at or after (line, column)
+def token_at(tokens, line, column):
+	(low, high) = (0, len(tokens))
+	while low < high:
+		middle = (low + high) // 2
+		if tokens[middle][2:4] < (line, column):
+			low = middle + 1
+		else:
+			high = middle
+	return low
+
+# Returns the Document of the source document.source becomes when
+# removed characters at offset are replaced by inserted. The statements
+# of document are reused, so document itself must not be used again
+def reparse(document, offset, removed, inserted):
+	old = document.source
+	source = old[:offset] + inserted + old[offset + removed:]
+	tokens = document.tokens
+	if document.error or not document.statements:
+		return parse_document(source)
+
+	# Lex from the start of the edited line. No token but whitespace
+	# spans lines, so that is where the old tokens start to depend on
+	# the edit
+	line = old.count('\n', 0, offset) + 1
+	line_start = old.rfind('\n', 0, offset) + 1
+	first = token_at(tokens, line, 1)
+	delta = len(inserted) - removed
+	edit_end = offset + len(inserted)
+	old_starts = LineStarts(old, line, line_start)
+	new_line = line
+	new_line_start = line_start
+	lexed = []
+	following = first
+	synced = False
+	try:
+		for (text, tag, start, end) in tokenTable.scan(source, line_start):
+			if tag:
+				if start >= edit_end:
+					# The rest lexes as before from the first new token
+					# that starts where an old one did
+					while following < len(tokens):
+						(old_line, old_column) = tokens[following][2:4]
+						old_start = old_starts[old_line] + old_column - 1
+						if old_start >= start - delta:
+							break
+						following += 1
+					if following < len(tokens) and old_start == start - delta:
+						synced = True
+						break
+				lexed.append((text, tag, new_line, start - new_line_start + 1))
+			newlines = text.count('\n')
+			if newlines:
+				new_line += newlines
+				new_line_start = source.rindex('\n', start, end) + 1
+	except LexError:
+		return parse_document(source)
+	if not synced:
+		following = len(tokens)
+
+	# Tokens after the edit keep their text; their lines move by the
+	# lines the edit added, and those on its last line by its columns
+	following_tokens = tokens[following:]
+	if synced:
+		line_shift = new_line - old_line
+		column_shift = (start - new_line_start) - (old_start - old_starts[old_line])
+		shift_tokens(following_tokens, old_line, line_shift, column_shift)
+	tokens = tokens[:first] + lexed + following_tokens
+	if first == 0 or following >= len(document.tokens) or not framed(tokens):
+		return parse_document(source)
+
+	# Statements overlapping the old tokens first to following (and the
+	# one after, in case a separator went) are parsed again
+	starts = [1]
+	for length in document.lengths:
+		starts.append(starts[-1] + length)
+	count = len(document.lengths)
+	first_statement = min(bisect_right(starts, first) - 1, count - 1)
+	last_statement = min(bisect_right(starts, following) - 1, count - 1)
+	last = last_statement == count - 1
+	if last:
+		range_end = len(tokens) - 1
+	else:
+		range_end = starts[last_statement + 1] + len(lexed) - (following - first)
+	pieces = split_statements(tokens, starts[first_statement], range_end, last)
+	if pieces is None:
+		return parse_document(source)
+	(lengths, statements) = parse_pieces(tokens, pieces)
+
+	reused = document.statements[last_statement + 1:]
+	if synced:
+		shift_statements(reused, old_line, line_shift, column_shift)
+	return Document(source, tokens,
+					document.lengths[:first_statement] + lengths + document.lengths[last_statement + 1:],
+					document.statements[:first_statement] + statements + reused)
+
+# Moves tokens, which follow an edit ending on line, to their new
+# positions, in place
+def shift_tokens(tokens, line, line_shift, column_shift):
+	if not line_shift and not column_shift:
+		return
+	for (index, (text, tag, token_line, column)) in enumerate(tokens):
+		if token_line == line:
+			tokens[index] = (text, tag, token_line + line_shift, column + column_shift)
+		elif line_shift:
+			tokens[index] = (text, tag, token_line + line_shift, column)
+		else:
+			break
+
+# Moves the locations of the statements after an edit, and of the
+# statements nested in them, in place
+def shift_statements(statements, line, line_shift, column_shift):
+	if not line_shift and not column_shift:
+		return
+	for statement in statements:
+		location = getattr(statement, 'location', None)
+		if not line_shift and location and location[0] != line:
+			break
+		pending = [statement]
+		while pending:
+			node = pending.pop()
+			location = getattr(node, 'location', None)
+			if location:
+				if location[0] == line:
+					node.location = (location[0] + line_shift, location[1] + column_shift)
+				elif line_shift:
+					node.location = (location[0] + line_shift, location[1])
+			pending.extend([child for child in children(node) if isinstance(child, Statement)])
@@ -0,0 +1,81 @@
+#######################################
+# yoda_interpreter.py
+# Execution engines for parsed yoda programs
+#
+# Every engine takes the AST returned by yoda_parse and prepares a
+# function that runs the program against an environment dict.
+#######################################
+
+from yoda_closure import compile_closure
+from yoda_vm import compile_bytecode
+from yoda_transpile import compile_python
+from yoda_resolve import resolve
+from yoda_budget import govern, run_limited
+from yoda_loops import is_temp
+from yoda_visitor import assigned_names
+
+# Walks the AST on every run, calling eval on each node
+def tree_engine(ast):
+	return ast.eval
+
+ENGINES = {
+	'tree': tree_engine,
+	'closure': compile_closure,
+	'vm': compile_bytecode,
+	'python': compile_python,
+}
+
+DEFAULT_ENGINE = 'tree'
+
+# Engines that run resolved programs on a frame list (see yoda_resolve.py)
+SLOT_ENGINES = ('tree', 'closure')
+
+# Resolves variables to slots before preparing ast with engine. The
+# returned function still takes an env dict: the frame is loaded from it
+# and the variables the program assigns are written back, even when the
+# program fails part way
+def with_slots(engine, ast):
+	(resolved, symbols) = resolve(ast)
+	run = engine(resolved)
+	def run_resolved(env):
+		frame = symbols.frame(env)
+		try:
+			run(frame)
+		finally:
+			symbols.to_env(frame, env)
+	return run_resolved
+
+def prepare(ast, engine=DEFAULT_ENGINE, slots=True):
+	if engine not in ENGINES:
+		raise ValueError('unknown engine: %s' % engine)
+	if slots and engine in SLOT_ENGINES:
+		run = with_slots(ENGINES[engine], ast)
+	else:
+		run = ENGINES[engine](ast)
+	return without_temporaries(run, ast)
+
+# The temporaries loop hoisting adds (see yoda_loops.py) are not
+# variables of the program, so they are taken out of env again once the
+# program has run, on every engine
+def without_temporaries(run, ast):
+	temporaries = [name for name in assigned_names(ast) if is_temp(name)]
+	if not temporaries:
+		return run
+	def run_without_temporaries(env):
+		try:
+			return run(env)
+		finally:
+			for name in temporaries:
+				env.pop(name, None)
+	return run_without_temporaries
+
+# Runs ast with the given engine and returns the environment. With a
+# yoda_budget.Budget the run stops with BudgetExceeded, whose env is
+# the environment at that point, once a limit of the budget is hit
+def execute(ast, env=None, engine=DEFAULT_ENGINE, slots=True, budget=None):
+	if env is None:
+		env = {}
+	if budget is None:
+		prepare(ast, engine, slots)(env)
+		return env
+	return run_limited(prepare(govern(ast), engine, slots), env, budget)
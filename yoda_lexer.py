@@ -53,5 +53,20 @@ internalTokens = [
     (r'[A-Za-z][A-Za-z0-9_]*',                           IDENTIFIER),
 ]
 
-def yoda_lex(input):
-    return lexer.lex(input, internalTokens)
\ No newline at end of file
+# Compiled once at import, shared by every call to yoda_lex
+tokenTable = lexer.TokenTable(internalTokens)
+
+# With compact the tokens come as a lexer.TokenStream, which keeps kind
+# codes and offsets into input rather than a tuple per token
+def yoda_lex(input, positions=False, compact=False):
+    return lexer.lex(input, tokenTable, positions, compact)
+
+# Like yoda_lex, but raises lexer.LexError on an illegal character
+# instead of exiting, for long-running callers such as yoda_daemon.py
+def yoda_tokenize(input, positions=False, compact=False):
+    return tokenTable.tokenize(input, positions, compact)
+
+# Lexes an open .yoda file chunk by chunk, yielding tokens lazily
+# (with line and column when positions is set)
+def yoda_lex_stream(file, chunk_size=lexer.DEFAULT_CHUNK_SIZE, positions=True):
+    return tokenTable.stream(file, chunk_size, positions)
\ No newline at end of file
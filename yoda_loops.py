@@ -0,0 +1,126 @@
+#######################################
+# yoda_loops.py
+# Loop optimizer (optimization level 3)
+#
+# For every WhileStatement, innermost first, computes the variables
+# its body assigns and hoists the arithmetic that reads none of them
+# into temporaries assigned just before the loop. Induction updates
+# such as n YODA n SIDIOUS 1 become AugAssignStatements, which apply the
+# operator to the variable in place instead of evaluating a Binop tree.
+#
+# Hoisted expressions are evaluated once even when the loop never runs,
+# so only expressions that cannot raise are hoisted. Temporaries are
+# named _licm0, _licm1, ... which no yoda identifier can clash with.
+#######################################
+
+from yoda_ast import *
+from yoda_visitor import Transformer, may_raise, read_names, assigned_names, copy_location
+
+TEMP_PREFIX = '_licm'
+
+def optimize_loops(ast):
+	return LoopOptimizer().visit(ast)
+
+def is_temp(name):
+	return name.startswith(TEMP_PREFIX)
+
+def sequence(statements):
+	if len(statements) == 1:
+		return statements[0]
+	return BlockStatement(statements)
+
+# Temporaries whose assignment inside body can itself move out of the
+# loop: their expression only reads variables that the loop does not
+# assign, or other movable temporaries
+def movable_temps(body, written):
+	temps = [node for node in statements_of(body)
+			 if isinstance(node, AssignStatement) and is_temp(node.name)]
+	movable = set()
+	changed = True
+	while changed:
+		changed = False
+		for temp in temps:
+			if temp.name not in movable and \
+			   not read_names(temp.exp) & (written - movable):
+				movable.add(temp.name)
+				changed = True
+	return movable
+
+# Every statement nested in node, in program order
+def statements_of(node):
+	found = []
+	pending = [node]
+	while pending:
+		node = pending.pop()
+		found.append(node)
+		if isinstance(node, BlockStatement):
+			pending.extend(reversed(node.statements))
+		elif isinstance(node, CompoundStatement):
+			pending.extend([node.second, node.first])
+		elif isinstance(node, IfStatement):
+			if node.false_stmt:
+				pending.append(node.false_stmt)
+			pending.append(node.true_stmt)
+		elif isinstance(node, WhileStatement):
+			pending.append(node.body)
+	return found
+
+class LoopOptimizer(Transformer):
+	def __init__(self):
+		self.temp_count = 0
+
+	def new_temp(self):
+		name = '%s%d' % (TEMP_PREFIX, self.temp_count)
+		self.temp_count += 1
+		return name
+
+	def visit_WhileStatement(self, node):
+		node = self.generic_visit(node)
+		written = assigned_names(node.body)
+		movable = movable_temps(node.body, written)
+		hoister = Hoister(self, written - movable, movable)
+		loop = copy_location(WhileStatement(hoister.visit(node.condition),
+											hoister.visit(node.body)), node)
+		if not hoister.hoisted:
+			return loop
+		# New temporaries are attributed to the loop they came from
+		for statement in hoister.hoisted:
+			if getattr(statement, 'location', None) is None:
+				copy_location(statement, node)
+		return copy_location(sequence(hoister.hoisted + [loop]), node)
+
+	# x YODA x op e, where e does not read x (and e op x for the
+	# commutative VADER and LUKE)
+	def visit_AssignStatement(self, node):
+		node = self.generic_visit(node)
+		exp = node.exp
+		if not isinstance(exp, BinopArithmExp) or exp.op not in arithm_functions:
+			return node
+		if isinstance(exp.left, VarArithmExp) and exp.left.name == node.name and \
+		   node.name not in read_names(exp.right):
+			return copy_location(AugAssignStatement(node.name, exp.op, exp.right), node)
+		if exp.op in ('VADER', 'LUKE') and isinstance(exp.right, VarArithmExp) and \
+		   exp.right.name == node.name and node.name not in read_names(exp.left):
+			return copy_location(AugAssignStatement(node.name, exp.op, exp.left), node)
+		return node
+
+# Rewrites one loop, collecting the assignments that move before it
+class Hoister(Transformer):
+	def __init__(self, loops, written, movable):
+		self.loops = loops
+		self.written = written
+		self.movable = movable
+		self.hoisted = []
+
+	def visit_AssignStatement(self, node):
+		if node.name in self.movable:
+			self.hoisted.append(node)
+			return PassStatement()
+		return self.generic_visit(node)
+
+	def visit_BinopArithmExp(self, node):
+		if read_names(node) & self.written or may_raise(node):
+			return self.generic_visit(node)
+		temp = self.loops.new_temp()
+		self.hoisted.append(AssignStatement(temp, node))
+		return VarArithmExp(temp)
@@ -0,0 +1,227 @@
+#######################################
+# yoda_optimizer.py
+# AST optimizer run between yoda_parse and evaluation
+#
+# Optimization levels:
+#   0   no optimization
+#   1   fold constant arithmetic and relops, simplify constant boolean
+#       operands and merge adjacent string literals
+#   2   also prune If branches and While loops with constant conditions,
+#       and build concatenations of parts with known types from a format
+#       string (see yoda_types.py)
+#   3   also hoist loop-invariant arithmetic and rewrite induction
+#       updates (see yoda_loops.py)
+#######################################
+
+import copy
+import operator
+from yoda_ast import *
+from yoda_visitor import Transformer, may_raise
+from yoda_loops import optimize_loops
+from yoda_types import specialize
+
+DEFAULT_LEVEL = 2
+MAX_LEVEL = 3
+
+constant_operators = {
+	'VADER': operator.add,
+	'SIDIOUS': operator.sub,
+	'LUKE': operator.mul,
+	'LEAH': operator.div,
+	'CHEWBACCA': operator.mod,
+	'SITH': operator.lt,
+	'SITH_ORDER': operator.le,
+	'JEDI': operator.gt,
+	'JEDI_ORDER': operator.ge,
+	'ORDER': operator.eq,
+	'BB8_ORDER': operator.ne,
+}
+
+# Called by the interpreter
+# Returns an optimized copy of ast; the parsed tree is left untouched
+def optimize(ast, level=DEFAULT_LEVEL):
+	if level <= 0:
+		return ast
+	ast = Optimizer(level).visit(ast)
+	if level >= 3:
+		# Folded again to drop the statements hoisting left behind
+		ast = Optimizer(level).visit(optimize_loops(ast))
+	if level >= 2:
+		ast = specialize(ast)
+	return ast
+
+def boolean(value):
+	if value:
+		return TrueBoolExp('LIGHT_SIDE')
+	return FalseBoolExp('DARK_SIDE')
+
+def is_constant(node):
+	return isinstance(node, (TrueBoolExp, FalseBoolExp))
+
+# Escapes of the characters a string literal cannot hold as they are,
+# in the forms the lexer accepts. NUL is written with two more zeros, so
+# that the digits after it cannot become part of its escape
+literal_escapes = {
+	u'\\': '\\\\',
+	u'"': '\\"',
+	u'\n': '\\n',
+	u'\t': '\\t',
+	u'\0': '\\000',
+}
+
+# Joins two string literals. Their values are joined and written back
+# in source form, since joining the source forms could make an escape at
+# the end of one run into the text of the other ("\0" and "12").
+# Literals come from byte strings, so every other character is one byte
+def join_literals(left, right):
+	value = left.value + right.value
+	source = ''.join([literal_escapes.get(character) or character.encode('latin-1')
+					  for character in value])
+	return StringExp('"' + source + '"')
+
+class Optimizer(Transformer):
+	def __init__(self, level):
+		self.level = level
+
+	#######################################
+	# Expressions (level 1)
+	#######################################
+
+	# Operator chains parse as left-deep trees as deep as they are long,
+	# so the left spine of a chain of kind is walked in a loop instead of
+	# recursively; each operator is rewritten by combine once both its
+	# operands are visited
+	def chain(self, node, kind, combine):
+		spine = []
+		while isinstance(node, kind):
+			spine.append(node)
+			node = node.left
+		result = self.visit(node)
+		for node in reversed(spine):
+			node = copy.copy(node)
+			node.left = result
+			node.right = self.visit(node.right)
+			result = combine(node)
+		return result
+
+	# Folds an operator whose operands are visited
+	def fold(self, node):
+		if isinstance(node.left, IntArithmExp) and isinstance(node.right, IntArithmExp) and \
+		   node.op in constant_operators:
+			try:
+				value = constant_operators[node.op](node.left.i, node.right.i)
+			except ZeroDivisionError:
+				# Left for the program to raise, if it ever runs
+				return node
+			if isinstance(node, RelopBoolExp):
+				return boolean(value)
+			return IntArithmExp(value)
+		return node
+
+	def visit_BinopArithmExp(self, node):
+		return self.chain(node, BinopArithmExp, self.fold)
+
+	def visit_RelopBoolExp(self, node):
+		return self.fold(self.generic_visit(node))
+
+	# LIGHT_SIDE R2D2 x is x, DARK_SIDE R2D2 x is DARK_SIDE. R2D2 and
+	# C3PO short-circuit, so a constant on the left never evaluates the
+	# right side, but one on the right can only replace a left side
+	# that could not raise
+	def visit_AndBoolExp(self, node):
+		return self.chain(node, (AndBoolExp, OrBoolExp), self.logic)
+
+	def visit_OrBoolExp(self, node):
+		return self.chain(node, (AndBoolExp, OrBoolExp), self.logic)
+
+	def logic(self, node):
+		if isinstance(node, AndBoolExp):
+			identity = TrueBoolExp
+		else:
+			identity = FalseBoolExp
+		for (constant, other) in ((node.left, node.right), (node.right, node.left)):
+			if is_constant(constant):
+				if isinstance(constant, identity):
+					return other
+				if constant is node.left or not may_raise(other):
+					return constant
+		return node
+
+	def visit_NotBoolExp(self, node):
+		node = self.generic_visit(node)
+		if is_constant(node.exp):
+			return boolean(isinstance(node.exp, FalseBoolExp))
+		if isinstance(node.exp, NotBoolExp):
+			# Boolean expressions always evaluate to True or False
+			return node.exp.exp
+		return node
+
+	def visit_ConcatStringExp(self, node):
+		return self.chain(node, ConcatStringExp, self.concatenate)
+
+	def concatenate(self, node):
+		(left, right) = (node.left, node.right)
+		if isinstance(left, StringExp) and isinstance(right, StringExp):
+			return join_literals(left, right)
+		if isinstance(left, ConcatStringExp) and isinstance(left.right, StringExp) and \
+		   isinstance(right, StringExp):
+			return ConcatStringExp(left.left, join_literals(left.right, right))
+		return node
+
+	# Adjacent literal parts are merged; a chain left with a single
+	# literal becomes that literal
+	def visit_JoinStringExp(self, node):
+		node = self.generic_visit(node)
+		parts = []
+		for part in node.parts:
+			if parts and isinstance(parts[-1], StringExp) and isinstance(part, StringExp):
+				parts[-1] = join_literals(parts[-1], part)
+			else:
+				parts.append(part)
+		if len(parts) == 1 and isinstance(parts[0], StringExp):
+			return parts[0]
+		node.parts = parts
+		return node
+
+	#######################################
+	# Statements (level 2)
+	#######################################
+
+	def visit_IfStatement(self, node):
+		node = self.generic_visit(node)
+		if self.level < 2 or not is_constant(node.condition):
+			return node
+		if isinstance(node.condition, TrueBoolExp):
+			return node.true_stmt
+		return node.false_stmt or PassStatement()
+
+	def visit_WhileStatement(self, node):
+		node = self.generic_visit(node)
+		if self.level >= 2 and isinstance(node.condition, FalseBoolExp):
+			return PassStatement()
+		return node
+
+	# Nested blocks are spliced into their parent and PassStatements
+	# dropped
+	def visit_BlockStatement(self, node):
+		node = self.generic_visit(node)
+		statements = []
+		for statement in node.statements:
+			if isinstance(statement, BlockStatement):
+				statements.extend(statement.statements)
+			elif not isinstance(statement, PassStatement):
+				statements.append(statement)
+		if not statements:
+			return PassStatement()
+		if len(statements) == 1:
+			return statements[0]
+		node.statements = statements
+		return node
+
+	def visit_CompoundStatement(self, node):
+		node = self.generic_visit(node)
+		if isinstance(node.first, PassStatement):
+			return node.second
+		if isinstance(node.second, PassStatement):
+			return node.first
+		return node
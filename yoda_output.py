@@ -0,0 +1,209 @@
+#######################################
+# yoda_output.py
+# Output sinks for PrintStatement
+#
+# Every engine prints through the sink installed for the current thread
+# (a StreamSink on sys.stdout by default). Sinks count the bytes they
+# are given (unicode as its ENCODING bytes, whether or not the sink
+# encodes it) and the flushes they make; using() installs one for the
+# duration of a run and flushes it on the way out, even on errors.
+#######################################
+
+import os
+import sys
+import threading
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# Strings reach sinks as unicode when their literal has escapes
+# (see StringExp); binary sinks encode them
+ENCODING = 'utf-8'
+
+def encode(text):
+	if isinstance(text, unicode):
+		return text.encode(ENCODING)
+	return text
+
+
+# Base class of all sinks
+# Subclasses override write and, if they hold data back, flush
+class OutputSink:
+	def __init__(self):
+		self.bytes = 0
+		self.flushes = 0
+
+	def write(self, text):
+		raise NotImplementedError
+
+	def flush(self):
+		pass
+
+	def close(self):
+		self.flush()
+
+	def stats(self):
+		return {
+			'bytes': self.bytes,
+			'flushes': self.flushes,
+		}
+
+
+# StreamSink - writes every print straight to a file object, like the
+# interpreter always has. The stream defaults to whatever sys.stdout is
+# when the print happens
+class StreamSink(OutputSink):
+	def __init__(self, stream=None):
+		OutputSink.__init__(self)
+		self.stream = stream
+
+	def write(self, text):
+		self.bytes += len(encode(text))
+		(self.stream or sys.stdout).write(text)
+
+	def flush(self):
+		self.flushes += 1
+		(self.stream or sys.stdout).flush()
+
+
+# BufferedSink - collects prints in memory and writes them to a file
+# descriptor in one os.write once size bytes are pending. With an
+# interval, output is also written at most interval seconds after it
+# was printed: a timer thread flushes what a program that has gone
+# quiet leaves pending, so writes and flushes then take a lock
+class BufferedSink(OutputSink):
+	def __init__(self, fd=1, size=DEFAULT_BUFFER_SIZE, interval=None):
+		OutputSink.__init__(self)
+		self.fd = fd
+		self.size = size
+		self.interval = interval
+		self.parts = []
+		self.pending = 0
+		self.lock = threading.Lock() if interval is not None else None
+		self.timer = None
+
+	def write(self, text):
+		data = encode(text)
+		if self.lock is None:
+			self.add(data)
+			return
+		with self.lock:
+			self.add(data)
+			if self.parts and self.timer is None:
+				self.timer = threading.Timer(self.interval, self.timed_flush)
+				self.timer.daemon = True
+				self.timer.start()
+
+	def add(self, data):
+		self.parts.append(data)
+		self.pending += len(data)
+		self.bytes += len(data)
+		if self.pending >= self.size:
+			self.write_pending()
+
+	# A timer that is running is waited for, so that none outlives the
+	# sink's last flush
+	def flush(self):
+		if self.lock is None:
+			self.write_pending()
+			return
+		with self.lock:
+			timer = self.timer
+			self.timer = None
+			if timer is not None:
+				timer.cancel()
+			self.write_pending()
+		if timer is not None:
+			timer.join()
+
+	# Runs on the timer thread
+	def timed_flush(self):
+		with self.lock:
+			self.timer = None
+			self.write_pending()
+
+	def write_pending(self):
+		if not self.parts:
+			return
+		write_all(self.fd, ''.join(self.parts))
+		self.parts = []
+		self.pending = 0
+		self.flushes += 1
+
+
+# FdSink - unbuffered binary writer; each print is one os.write on fd,
+# bypassing the text layer of sys.stdout
+class FdSink(OutputSink):
+	def __init__(self, fd=1):
+		OutputSink.__init__(self)
+		self.fd = fd
+
+	def write(self, text):
+		data = encode(text)
+		self.bytes += len(data)
+		write_all(self.fd, data)
+		self.flushes += 1
+
+
+# CaptureSink - keeps every print in a list, for embedding
+class CaptureSink(OutputSink):
+	def __init__(self):
+		OutputSink.__init__(self)
+		self.parts = []
+
+	def write(self, text):
+		self.bytes += len(encode(text))
+		self.parts.append(text)
+
+	def getvalue(self):
+		return ''.join(self.parts)
+
+# NullSink - counts prints and drops them, for benchmarks
+class NullSink(OutputSink):
+	def write(self, text):
+		self.bytes += len(encode(text))
+
+# os.write may write less than it is given
+def write_all(fd, data):
+	view = memoryview(data)
+	while view:
+		view = view[os.write(fd, view):]
+
+
+# Sinks selectable with starWarsPT.py --output; CaptureSink is for
+# programs embedding the interpreter
+SINKS = {
+	'stream': StreamSink,
+	'buffered': BufferedSink,
+	'fd': FdSink,
+}
+
+DEFAULT_SINK = 'stream'
+
+_output = threading.local()
+
+def current_sink():
+	sink = getattr(_output, 'sink', None)
+	if sink is None:
+		sink = _output.sink = StreamSink()
+	return sink
+
+# Called by PrintStatement and the engines
+def write(text):
+	current_sink().write(text)
+
+
+# using - installs sink for the current thread; the previous sink is
+# restored and sink flushed when the block ends
+class using:
+	def __init__(self, sink):
+		self.sink = sink
+
+	def __enter__(self):
+		self.saved = getattr(_output, 'sink', None)
+		_output.sink = self.sink
+		return self.sink
+
+	def __exit__(self, *exc_info):
+		_output.sink = self.saved
+		self.sink.flush()
+		return False
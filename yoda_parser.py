@@ -8,6 +8,7 @@
 #######################################
 
 
+from lexer import TokenStream
 from yoda_lexer import *
 from combinators import *
 from yoda_ast import *
@@ -15,27 +16,49 @@ from yoda_ast import *
 def keyword(kw):
 	return Reserved(kw, SYS_VAR)
 
-num = Tag(INTEGER) ^ (lambda i: int(i))
-string = Tag(STRING)
 id = Tag(IDENTIFIER)
 
 
 # Called by main program
-# To begin parsing the program we call parser and pass
-# the entire set of tokens for the program and a position of 0
+# To begin parsing the program we pass the entire set of tokens for
+# the program and a position of 0 to the shared YodaParser
 def yoda_parse(tokens):
-	ast = parser()(tokens, 0)
-	return ast
+	return yodaParser.parse(tokens)
+
+# Compiled yoda grammar
+# Builds the combinator graph once, resolves every Lazy in it and can
+# then be reused for any number of parses
+class YodaParser:
+	def __init__(self):
+		self.grammar = freeze(parser())
+
+	def parse(self, tokens):
+		return self.grammar(tokens, 0)
+
+# Grammar rules are built once: every call to a rule returns the same
+# parser object, so the Lazy references to a rule from each nesting
+# site all resolve to one shared subgraph
+grammar_rules = {}
+
+def rule(build):
+	def shared():
+		if build not in grammar_rules:
+			grammar_rules[build] = build()
+		return grammar_rules[build]
+	shared.__name__ = build.__name__
+	return shared
 
 ############################################
 # Top level parsers	
 ############################################
+@rule
 def program():
 	return keyword('A LONG TIME AGO IN A GALAXY FAR, FAR AWAY...') + \
 			stmt_list() + keyword('...MAY THE FORCE BE WITH YOU') ^ process_group
 
 # This enforces that first and last tokens be our 
 # starting and ending stmts in program()
+@rule
 def parser():
 	return Phrase(program())
 
@@ -44,22 +67,29 @@ def parser():
 ############################################
 # Statements
 ############################################
+@rule
 def stmt_list():
-	separator = keyword(';') ^ (lambda x: lambda l, r: CompoundStatement(l, r))
+	separator = keyword(';') ^ (lambda x: join_statements)
 	return Exp(stmt(), separator)
 
+# The statements start with different keywords, and ExpressionParser
+# reads an expression in one pass, so the grammar never parses the same
+# tokens twice and gains nothing from packrat memoization
+@rule
 def stmt():
-	return assign_stmt() | \
-		   while_stmt()	 | \
-		   if_stmt()	 | \
-		   print_stmt()
+	return Locate(assign_stmt() | \
+				  while_stmt()  | \
+				  if_stmt()	 | \
+				  print_stmt())
 
+@rule
 def assign_stmt():
 	def process(parsed):
 		((name, _), exp) = parsed
 		return AssignStatement(name, exp)
 	return id + keyword('YODA') + arithm_exp() ^ process
 
+@rule
 def while_stmt():
 	def process(parsed):
 		((((_, condition), _), body), _) = parsed
@@ -68,6 +98,7 @@ def while_stmt():
 		   keyword('OR DO NOT...') + Lazy(stmt_list) + \
 		   keyword('THERE IS NO TRY') ^ process
 
+@rule
 def if_stmt():
 	def process(parsed):
 		(((((_, condition), _), true_stmt), false_parsed), _) = parsed
@@ -81,6 +112,7 @@ def if_stmt():
 		   Opt(keyword('STAY ON TARGET') + Lazy(stmt_list)) + \
 		   keyword('THESE ARENT THE DROIDS YOU ARE LOOKING FOR') ^ process
 
+@rule
 def print_stmt():
 	def process(parsed):
 		(_, exp) = parsed
@@ -90,103 +122,209 @@ def print_stmt():
 
 
 ############################################
-# Arithmetic expressions
+# Expressions
 ############################################
+@rule
 def arithm_exp():
-	return precedence(arithm_term(),
-					  arithm_precedence_levels,
-					  process_binop)
+	return ExpressionParser(ARITHM_EXP)
 
-def arithm_term():
-	return arithm_value() | arithm_group()
-
-def arithm_value():
-	return (num ^ (lambda i: IntArithmExp(i))) | \
-		   (id ^ (lambda v: VarArithmExp(v)))
-
-def arithm_group():
-	return keyword('(') + Lazy(arithm_exp) + keyword(')') ^ process_group
-
-
-############################################
-#Boolean expressions
-############################################
+@rule
 def bool_exp():
-	return precedence(bool_term(),
-					  bool_precedence_levels,
-					  process_logic)
-
-def bool_term():
-	return bool_not() 	| \
-		   bool_relop() | \
-		   bool_value() | \
-		   bool_group()
-
-def bool_not():
-	return keyword('BB8') + Lazy(bool_term) ^ (lambda parsed: NotBoolExp(parsed[1]))
-
-def bool_relop():
-	relops = ['SITH', 'SITH_ORDER', 'JEDI', 'JEDI_ORDER', 'ORDER', 'BB8_ORDER']
-	return arithm_exp() + any_operator_in_list(relops) + arithm_exp() ^ process_relop
-
-def bool_value():
-	return (keyword('LIGHT_SIDE') ^ (lambda t: TrueBoolExp(t))) | \
-		   (keyword('DARK_SIDE') ^ (lambda f: FalseBoolExp(f)))
-
-def bool_group():
-	return keyword('(') + Lazy(bool_exp) + keyword(')') ^ process_group
+	return ExpressionParser(BOOL_EXP)
 
-
-############################################
-#String expressions
-############################################
+@rule
 def string_exp():
-	return precedence(string_value(),
-					  string_precedence_levels,
-					  process_string)
+	return ExpressionParser(STRING_EXP)
+
+# Kinds of expression the expression parser can produce
+# A bare identifier is VAR_EXP, which is usable both as an
+# arithmetic operand and as a string operand
+ARITHM_EXP = 'ARITHM_EXP'
+BOOL_EXP = 'BOOL_EXP'
+STRING_EXP = 'STRING_EXP'
+VAR_EXP = 'VAR_EXP'
+
+def accepts(kind, actual):
+	return actual is kind or \
+		   (actual is VAR_EXP and kind is not BOOL_EXP)
+
+# Precedence-climbing (Pratt) expression parser
+# Parses an arithmetic, boolean or string expression in a single pass
+# over the tokens, driven by the operator precedence levels below, and
+# builds the same trees as a chain of one Exp per precedence level.
+# Every operand is tagged with its kind so that operators only accept
+# what the grammar allows: relops compare arithmetic expressions,
+# R2D2/C3PO and BB8 combine boolean ones and + joins strings and
+# variables. An operator whose right operand does not parse is left
+# unconsumed, as Exp would leave it. On a TokenStream keywords are
+# recognized by their kind code, and no keyword text is sliced out.
+class ExpressionParser(Parser):
+	def __init__(self, kind):
+		self.kind = kind
+		self.operators = {}
+		levels = []
+		if kind is BOOL_EXP:
+			levels += [(level, BOOL_EXP, BOOL_EXP, process_logic)
+					   for level in reversed(bool_precedence_levels)]
+			# BB8 binds tighter than R2D2/C3PO but looser than a relop
+			levels.append(([], None, None, None))
+			self.not_power = len(levels)
+			levels.append((relop_operators, ARITHM_EXP, BOOL_EXP, process_relop))
+		if kind is not STRING_EXP:
+			levels += [(level, ARITHM_EXP, ARITHM_EXP, process_binop)
+					   for level in reversed(arithm_precedence_levels)]
+		else:
+			levels += [(level, STRING_EXP, STRING_EXP, process_string)
+					   for level in reversed(string_precedence_levels)]
+		for power, (ops, operand_kind, result_kind, combine) in enumerate(levels, 1):
+			for op in ops:
+				self.operators[op] = (power, operand_kind, result_kind, combine(op))
+
+	def __call__(self, tokens, pos):
+		parsed = self.parse(tokens, pos, 0)
+		if parsed and accepts(self.kind, parsed[1]):
+			return Result(parsed[0], parsed[2])
+		return None
+
+	# Parses an operand followed by every operator binding tighter
+	# than min_power. Returns (exp, kind, pos) or None
+	def parse(self, tokens, pos, min_power):
+		parsed = self.operand(tokens, pos)
+		if not parsed:
+			return None
+		(left, left_kind, pos) = parsed
+		operators = self.operators
+		if tokens.__class__ is TokenStream:
+			(kinds, kind_tags, kind_texts) = (tokens.kinds, tokens.kind_tags, tokens.kind_texts)
+			end = len(kinds)
+		else:
+			kinds = None
+			end = len(tokens)
+		while pos < end:
+			if kinds is not None:
+				kind = kinds[pos]
+				operator = kind_texts[kind]
+				if operator not in operators or kind_tags[kind] is not SYS_VAR:
+					break
+			else:
+				token = tokens[pos]
+				operator = token[0]
+				if token[1] is not SYS_VAR or operator not in operators:
+					break
+			(power, operand_kind, result_kind, combine) = operators[operator]
+			if power <= min_power or not accepts(operand_kind, left_kind):
+				break
+			right = self.parse(tokens, pos + 1, power)
+			if not right or not accepts(operand_kind, right[1]):
+				break
+			left = combine(left, right[0])
+			left_kind = result_kind
+			pos = right[2]
+		return (left, left_kind, pos)
+
+	# Parses a single operand: a literal, a variable, a group or a BB8
+	def operand(self, tokens, pos):
+		if tokens.__class__ is TokenStream:
+			if pos >= len(tokens.kinds):
+				return None
+			kind = tokens.kinds[pos]
+			tag = tokens.kind_tags[kind]
+			if tag is SYS_VAR:
+				text = tokens.kind_texts[kind]
+			else:
+				text = tokens.source[tokens.starts[pos]:tokens.ends[pos]]
+		else:
+			if pos >= len(tokens):
+				return None
+			token = tokens[pos]
+			(text, tag) = (token[0], token[1])
+		if tag is IDENTIFIER:
+			return (VarArithmExp(text), VAR_EXP, pos + 1)
+		if self.kind is STRING_EXP:
+			if tag is STRING:
+				return (StringExp(text), STRING_EXP, pos + 1)
+			return None
+		if tag is INTEGER:
+			return (IntArithmExp(int(text)), ARITHM_EXP, pos + 1)
+		if tag is not SYS_VAR:
+			return None
+		if text == '(':
+			inner = self.parse(tokens, pos + 1, 0)
+			if not inner:
+				return None
+			(exp, kind, pos) = inner
+			if pos < len(tokens) and self.token_at(tokens, pos) == (')', SYS_VAR):
+				if kind is VAR_EXP:
+					kind = ARITHM_EXP
+				return (exp, kind, pos + 1)
+			return None
+		if self.kind is not BOOL_EXP:
+			return None
+		if text == 'LIGHT_SIDE':
+			return (TrueBoolExp(text), BOOL_EXP, pos + 1)
+		if text == 'DARK_SIDE':
+			return (FalseBoolExp(text), BOOL_EXP, pos + 1)
+		if text == 'BB8':
+			inner = self.parse(tokens, pos + 1, self.not_power)
+			if inner and inner[1] is BOOL_EXP:
+				return (NotBoolExp(inner[0]), BOOL_EXP, inner[2])
+		return None
+
+	# (text, tag) of the token at pos. The text of a keyword in a
+	# TokenStream is that of its kind, None when the kind is no literal
+	def token_at(self, tokens, pos):
+		if tokens.__class__ is TokenStream:
+			kind = tokens.kinds[pos]
+			if tokens.kind_tags[kind] is SYS_VAR:
+				return (tokens.kind_texts[kind], SYS_VAR)
+			return (tokens.text(pos), tokens.kind_tags[kind])
+		token = tokens[pos]
+		return (token[0], token[1])
 
-def string_value():
-	return (string ^ (lambda s: StringExp(s))) | \
-		   (id ^ (lambda v: VarArithmExp(v)))
 
 ############################################
 # Helper functions
 ############################################
 
+# Operators get their specialised node classes
 def process_binop(op):
-	return lambda l, r: BinopArithmExp(op, l, r)
+	return arithm_classes[op]
 
 def process_logic(op):
 	if op == 'R2D2': # AND
 		return lambda l, r: AndBoolExp(l, r)
-	elif op == 'C3P0': # OR
+	elif op == 'C3PO': # OR
 		return lambda l, r: OrBoolExp(l, r)
 	else:
 		raise RuntimeError('unknown logic Operator: ' + op)
 
-def process_relop(parsed):
-	((left, op), right) = parsed
-	return RelopBoolExp(op, left, right)
+def process_relop(op):
+	return relop_classes[op]
 
 def process_group(parsed):
 	((_, p), _) = parsed
 	return p
 
-def process_string(_):
-	return lambda l, r: ConcatStringExp(l, r)
+# A statement list becomes a single BlockStatement. Its elements are
+# single statements, so a BlockStatement on the left is always the one
+# being built for this list and can be extended in place
+def join_statements(l, r):
+	if isinstance(l, BlockStatement):
+		l.statements.append(r)
+		return l
+	return BlockStatement([l, r])
 
-def any_operator_in_list(ops):
-	op_parsers = [keyword(op) for op in ops]
-	parser = reduce(lambda l, r: l | r, op_parsers)
-	return parser
+def process_string(_):
+	return join_strings
 
-def precedence(value_parser, precedence_levels, combine):
-	def op_parser(precedence_level):
-		return any_operator_in_list(precedence_level) ^ combine
-	parser = value_parser * op_parser(precedence_levels[0])
-	for precedence_level in precedence_levels[1:]:
-		parser = parser * op_parser(precedence_level)
-	return parser
+# + chains become a single JoinStringExp. String operands are only
+# literals and variables, so a JoinStringExp on the left is always the
+# one being built for this chain and can be extended in place
+def join_strings(l, r):
+	if isinstance(l, JoinStringExp):
+		l.parts.append(r)
+		return l
+	return JoinStringExp([l, r])
 
 
 ############################################
@@ -199,9 +337,13 @@ arithm_precedence_levels = [
 
 bool_precedence_levels = [
 	['R2D2'], # AND
-	['C3P0'], # OR
+	['C3PO'], # OR
 ]
 
+relop_operators = ['SITH', 'SITH_ORDER', 'JEDI', 'JEDI_ORDER', 'ORDER', 'BB8_ORDER']
+
 string_precedence_levels = [
 	['+'],
-]
\ No newline at end of file
+]
+
+yodaParser = YodaParser()
@@ -0,0 +1,122 @@
+#######################################
+# yoda_profile.py
+# Per-statement execution profiler
+#
+# instrument() wraps the statements of a program in ProfiledStatement
+# nodes that count how often they run and time them, keyed by the
+# source location the parser recorded. A WhileStatement also gets its
+# body wrapped, to count iterations, and an IfStatement each branch, to
+# count the branch taken. Programs that are not instrumented run exactly
+# as before, so profiling costs nothing when it is off.
+#
+# Times include nested statements. Profiled programs run through eval,
+# so they are profiled on the tree engine.
+#######################################
+
+import time
+from yoda_ast import *
+from yoda_visitor import Transformer
+
+DEFAULT_TOP = 20
+
+# Returns a copy of ast whose statements record into profile
+def instrument(ast, profile):
+	return Instrumenter(profile).visit(ast)
+
+
+# Counters of one profiled statement, or of one part of it
+class StatementStats(object):
+	__slots__ = ('label', 'location', 'count', 'time')
+
+	def __init__(self, label, location):
+		self.label = label
+		self.location = location
+		self.count = 0
+		self.time = 0.0
+
+	def __repr__(self):
+		return 'StatementStats(%s, %s, %d, %f)' % (self.label, self.location, self.count, self.time)
+
+
+class Profile:
+	def __init__(self):
+		self.stats = []
+
+	def add(self, label, node):
+		stats = StatementStats(label, getattr(node, 'location', None))
+		self.stats.append(stats)
+		return stats
+
+	# Report of the top statements by time, one per line
+	def report(self, top=DEFAULT_TOP):
+		ranked = sorted(self.stats, key=lambda stats: (-stats.time, -stats.count))[:top]
+		lines = ['Profile: top %d of %d statements by time (including nested statements)' %
+				 (len(ranked), len(self.stats)),
+				 '%-10s %12s %12s %12s  %s' % ('line:col', 'count', 'total s', 'per call us', 'statement')]
+		for stats in ranked:
+			if stats.location:
+				where = '%d:%d' % stats.location
+			else:
+				where = '?'
+			per_call = stats.time / stats.count * 1e6 if stats.count else 0.0
+			lines.append('%-10s %12d %12.6f %12.3f  %s' %
+						 (where, stats.count, stats.time, per_call, stats.label))
+		return '\n'.join(lines) + '\n'
+
+
+# Statement wrapper - runs stmt, counting and timing it in stats
+class ProfiledStatement(Statement):
+	__slots__ = ('stmt', 'stats')
+
+	def __init__(self, stmt, stats):
+		self.stmt = stmt
+		self.stats = stats
+
+	def __repr__(self):
+		return 'ProfiledStatement(%s)' % self.stmt
+
+	def eval(self, env):
+		stats = self.stats
+		start = time.time()
+		try:
+			self.stmt.eval(env)
+		finally:
+			stats.time += time.time() - start
+			stats.count += 1
+
+
+# Labels name the statement and, for assignments, the variable
+def label(node):
+	name = node.__class__.__name__
+	if isinstance(node, (AssignStatement, AugAssignStatement)):
+		return '%s %s' % (name, node.name)
+	return name
+
+class Instrumenter(Transformer):
+	def __init__(self, profile):
+		self.profile = profile
+
+	def wrap(self, node, label_text, location_node=None):
+		stats = self.profile.add(label_text, location_node or node)
+		return ProfiledStatement(node, stats)
+
+	def visit_AssignStatement(self, node):
+		return self.wrap(self.generic_visit(node), label(node))
+
+	def visit_AugAssignStatement(self, node):
+		return self.wrap(self.generic_visit(node), label(node))
+
+	def visit_PrintStatement(self, node):
+		return self.wrap(self.generic_visit(node), label(node))
+
+	def visit_WhileStatement(self, node):
+		node = self.generic_visit(node)
+		node.body = self.wrap(node.body, 'WhileStatement iteration', node)
+		return self.wrap(node, label(node))
+
+	def visit_IfStatement(self, node):
+		node = self.generic_visit(node)
+		node.true_stmt = self.wrap(node.true_stmt, 'IfStatement then taken', node)
+		if node.false_stmt:
+			node.false_stmt = self.wrap(node.false_stmt, 'IfStatement else taken', node)
+		return self.wrap(node, label(node))
@@ -0,0 +1,90 @@
+#######################################
+# yoda_protocol.py
+# Wire format between yoda_daemon.py and yoda_client.py
+#
+# A request is one JSON header line naming the program, the engine and
+# the optimization level and giving the length of the source, followed
+# by the source itself. The reply is a sequence of frames, each a line
+# "KIND LENGTH" followed by LENGTH bytes of data: "out" frames carry
+# printed output as the program produces it, "err" frames carry error
+# messages, and a final "exit" frame carries the exit status.
+#
+# Kept free of interpreter imports so that the client starts quickly.
+#######################################
+
+import os
+import json
+import socket
+
+DEFAULT_SOCKET = os.path.join(os.environ.get('TMPDIR', '/tmp'),
+							  'yoda-%s.sock' % os.environ.get('USER', 'daemon'))
+
+OUT = 'out'
+ERR = 'err'
+EXIT = 'exit'
+KINDS = (OUT, ERR, EXIT)
+
+# Longest header line accepted, against clients sending garbage
+MAX_HEADER = 64 * 1024
+
+
+# Raised on a malformed request or reply, or a connection closed early
+class ProtocolError(Exception):
+	pass
+
+
+def write_request(file, source, engine, level, name='<client>'):
+	header = {'name': name, 'engine': engine, 'level': level, 'length': len(source)}
+	file.write(json.dumps(header) + '\n')
+	file.write(source)
+	file.flush()
+
+# Returns (header, source) from a file made with socket.makefile, or
+# None when the connection closed without sending anything
+def read_request(file):
+	line = file.readline(MAX_HEADER)
+	if not line:
+		return None
+	if not line.endswith('\n'):
+		raise ProtocolError('incomplete request header')
+	try:
+		header = json.loads(line)
+		length = int(header['length'])
+	except (ValueError, KeyError, TypeError):
+		raise ProtocolError('malformed request header')
+	source = read_exactly(file, length)
+	return (header, source)
+
+def write_frame(file, kind, data):
+	file.write('%s %d\n' % (kind, len(data)))
+	file.write(data)
+	file.flush()
+
+# Returns (kind, data) of the next frame, or None at the end of the reply
+def read_frame(file):
+	line = file.readline(MAX_HEADER)
+	if not line:
+		return None
+	try:
+		(kind, length) = line.split()
+		length = int(length)
+	except ValueError:
+		raise ProtocolError('malformed frame %r' % line)
+	if kind not in KINDS:
+		raise ProtocolError('unknown frame kind %r' % kind)
+	return (kind, read_exactly(file, length))
+
+def read_exactly(file, length):
+	data = file.read(length)
+	if len(data) != length:
+		raise ProtocolError('connection closed after %d of %d bytes' % (len(data), length))
+	return data
+
+def connect(path=DEFAULT_SOCKET):
+	connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		connection.connect(path)
+	except socket.error:
+		connection.close()
+		raise
+	return connection
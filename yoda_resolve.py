@@ -0,0 +1,70 @@
+#######################################
+# yoda_resolve.py
+# Variable resolution pass
+#
+# Gives every identifier of a program a fixed slot and rewrites its
+# variable reads and assignments to index a preallocated frame list
+# instead of hashing names into an env dict. Frames start with every
+# slot set to 0, which keeps the "unset variables read as 0" rule.
+#######################################
+
+from yoda_ast import *
+from yoda_visitor import Transformer, copy_location
+
+# Called by the interpreter
+# Returns the rewritten program and its SymbolTable
+def resolve(ast):
+	resolver = Resolver()
+	return (resolver.visit(ast), resolver.symbols)
+
+# Slot assignment of a resolved program
+class SymbolTable:
+	def __init__(self):
+		self.names = []
+		self.slots = {}
+		self.assigned = set()
+
+	def slot(self, name):
+		if name not in self.slots:
+			self.slots[name] = len(self.names)
+			self.names.append(name)
+		return self.slots[name]
+
+	# Returns a new frame, taking initial values from an env dict
+	def frame(self, env=None):
+		frame = [0] * len(self.names)
+		if env:
+			for (name, value) in env.items():
+				if name in self.slots:
+					frame[self.slots[name]] = value
+		return frame
+
+	# Returns the name -> value mapping of a frame, as the env dict the
+	# tree-walker would have built (only variables the program assigns),
+	# updating env when one is given
+	def to_env(self, frame, env=None):
+		if env is None:
+			env = {}
+		for name in self.assigned:
+			env[name] = frame[self.slots[name]]
+		return env
+
+	def __repr__(self):
+		return 'SymbolTable(%s)' % ', '.join(self.names)
+
+class Resolver(Transformer):
+	def __init__(self):
+		self.symbols = SymbolTable()
+
+	def visit_VarArithmExp(self, node):
+		return SlotArithmExp(node.name, self.symbols.slot(node.name))
+
+	def visit_AssignStatement(self, node):
+		slot = self.symbols.slot(node.name)
+		self.symbols.assigned.add(node.name)
+		return copy_location(SlotAssignStatement(node.name, slot, self.visit(node.exp)), node)
+
+	def visit_AugAssignStatement(self, node):
+		slot = self.symbols.slot(node.name)
+		self.symbols.assigned.add(node.name)
+		return copy_location(SlotAugAssignStatement(node.name, slot, node.op, self.visit(node.exp)), node)
@@ -0,0 +1,204 @@
+#######################################
+# yoda_transpile.py
+# Ahead-of-time transpiler from the yoda AST to Python source
+#
+# A program becomes one Python function whose yoda variables are plain
+# locals, so CPython's own compiler and bytecode interpreter run the
+# yoda loops. Variables start from the environment (0 when unset) and
+# the ones the program assigns are written back when it finishes, even
+# when it fails part way.
+#######################################
+
+import sys
+from yoda_ast import *
+from yoda_output import current_sink
+from yoda_closure import compile_closure
+from yoda_budget import current_budget, StepStatement, LimitedStringExp
+
+INDENT = '    '
+
+python_operators = {
+	'VADER': '+',
+	'SIDIOUS': '-',
+	'LUKE': '*',
+	'LEAH': '/',
+	'CHEWBACCA': '%',
+	'SITH': '<',
+	'SITH_ORDER': '<=',
+	'JEDI': '>',
+	'JEDI_ORDER': '>=',
+	'ORDER': '==',
+	'BB8_ORDER': '!=',
+}
+
+# Python precedence of the expressions the translator emits, loosest
+# first. Operands are only parenthesized where Python would group them
+# otherwise, since CPython 2's parser runs out of stack on about a
+# hundred nested parentheses
+(OR, AND, NOT, COMPARISON, SUM, PRODUCT, ATOM) = range(7)
+
+precedences = {
+	'VADER': SUM, 'SIDIOUS': SUM,
+	'LUKE': PRODUCT, 'LEAH': PRODUCT, 'CHEWBACCA': PRODUCT,
+}
+
+# Returns the Python source of a module defining main(env, ...)
+def to_python(ast):
+	translator = Translator()
+	body = translator.statement(ast, 2)
+	names = sorted(translator.names)
+	lines = ['# Generated by yoda_transpile from a yoda program',
+			 'def main(env, write, budget, text):']
+	for name in names:
+		lines.append('%s%s = env.get(%r, 0)' % (INDENT, local(name), name))
+	lines.append('%stry:' % INDENT)
+	lines.extend(body)
+	lines.append('%sfinally:' % INDENT)
+	for name in sorted(translator.assigned):
+		lines.append('%senv[%r] = %s' % (INDENT * 2, name, local(name)))
+	if not translator.assigned:
+		lines.append('%spass' % (INDENT * 2))
+	lines.append('%sreturn env' % INDENT)
+	return '\n'.join(lines) + '\n'
+
+# Called by the interpreter
+# Compiles the generated module and returns a function running it
+def compile_python(ast, filename='<yoda>'):
+	namespace = {}
+	# dont_inherit keeps true division out of the generated code, so
+	# LEAH divides like the other engines. Expressions too deep for
+	# CPython's compiler even so run on the closure engine instead, with
+	# a warning, since they then run on another engine than was asked for
+	try:
+		code = compile(to_python(ast), filename, 'exec', 0, True)
+	except (MemoryError, RuntimeError):
+		sys.stderr.write('Warning: program too deeply nested for the Python compiler; '
+						 'running it on the closure engine\n')
+		return compile_closure(ast)
+	exec(code, namespace)
+	main = namespace['main']
+	def run(env):
+		return main(env, current_sink().write, current_budget(), text)
+	return run
+
+# Yoda variables become prefixed locals so that they can never clash
+# with Python keywords or the parameters of main
+def local(name):
+	return 'v_' + name
+
+# Helpers used by generated code
+def text(value):
+	if isinstance(value, (int, long)):
+		return '%d' % value
+	return value
+
+
+class Translator:
+	def __init__(self):
+		self.names = set()
+		self.assigned = set()
+
+	# Returns the lines of a statement indented depth levels
+	def statement(self, node, depth):
+		lines = []
+		pending = [node]
+		indent = INDENT * depth
+		while pending:
+			node = pending.pop()
+			if isinstance(node, BlockStatement):
+				pending.extend(reversed(node.statements))
+			elif isinstance(node, CompoundStatement):
+				pending.append(node.second)
+				pending.append(node.first)
+			elif isinstance(node, AssignStatement):
+				self.names.add(node.name)
+				self.assigned.add(node.name)
+				lines.append('%s%s = %s' % (indent, local(node.name), self.expression(node.exp)))
+			elif isinstance(node, AugAssignStatement):
+				self.names.add(node.name)
+				self.assigned.add(node.name)
+				lines.append('%s%s = %s' % (indent, local(node.name), self.expression(
+					BinopArithmExp(node.op, VarArithmExp(node.name), node.exp))))
+			elif isinstance(node, WhileStatement):
+				lines.append('%swhile %s:' % (indent, self.expression(node.condition)))
+				lines.extend(self.statement(node.body, depth + 1))
+			elif isinstance(node, IfStatement):
+				lines.append('%sif %s:' % (indent, self.expression(node.condition)))
+				lines.extend(self.statement(node.true_stmt, depth + 1))
+				if node.false_stmt:
+					lines.append('%selse:' % indent)
+					lines.extend(self.statement(node.false_stmt, depth + 1))
+			elif isinstance(node, PrintStatement):
+				lines.append("%swrite('%%s' %% (%s,))" % (indent, self.expression(node.stmt)))
+			elif isinstance(node, StepStatement):
+				lines.append('%sbudget.step(%d)' % (indent, node.count))
+			elif isinstance(node, PassStatement):
+				lines.append('%spass' % indent)
+			else:
+				raise ValueError('cannot translate %r to Python' % node)
+		return lines
+
+	def expression(self, node):
+		return self.operand(node, OR)
+
+	# Python source of an expression that is an operand of an operator
+	# of the given precedence. Yoda operators group to the left, so a
+	# left operand may be as loose as its operator and a right one must
+	# bind tighter; comparisons never chain
+	def operand(self, node, precedence):
+		(source, own) = self.translate(node)
+		if own < precedence:
+			return '(%s)' % source
+		return source
+
+	# Returns (source, precedence) of an expression
+	def translate(self, node):
+		if isinstance(node, IntArithmExp):
+			# Python's unary minus binds tighter than any operator here
+			return (repr(node.i), ATOM)
+		elif isinstance(node, VarArithmExp):
+			self.names.add(node.name)
+			return (local(node.name), ATOM)
+		elif isinstance(node, BinopArithmExp) and node.op in precedences:
+			own = precedences[node.op]
+			return ('%s %s %s' % (self.operand(node.left, own), python_operators[node.op],
+								  self.operand(node.right, own + 1)), own)
+		elif isinstance(node, RelopBoolExp) and node.op in python_operators:
+			return ('%s %s %s' % (self.operand(node.left, SUM), python_operators[node.op],
+								  self.operand(node.right, SUM)), COMPARISON)
+		elif isinstance(node, (AndBoolExp, OrBoolExp)):
+			(keyword, own) = ('and', AND) if isinstance(node, AndBoolExp) else ('or', OR)
+			return ('%s %s %s' % (self.operand(node.left, own), keyword,
+								  self.operand(node.right, own + 1)), own)
+		elif isinstance(node, NotBoolExp):
+			return ('not %s' % self.operand(node.exp, NOT), NOT)
+		elif isinstance(node, TrueBoolExp):
+			return ('True', ATOM)
+		elif isinstance(node, FalseBoolExp):
+			return ('False', ATOM)
+		elif isinstance(node, ConcatStringExp):
+			return ('%s + %s' % (self.text(node.left, SUM), self.text(node.right, SUM + 1)), SUM)
+		return (self.atom(node), ATOM)
+
+	# Python source of an expression that needs no parentheses
+	def atom(self, node):
+		if isinstance(node, JoinStringExp):
+			return "u''.join((%s,))" % ', '.join([self.text(part, OR) for part in node.parts])
+		elif isinstance(node, FormatStringExp):
+			return '(%r %% (%s))' % (node.format, ''.join(['%s, ' % self.expression(arg)
+														  for arg in node.args]))
+		elif isinstance(node, StringExp):
+			return repr(node.value)
+		elif isinstance(node, LimitedStringExp):
+			return 'budget.check_text(%s)' % self.expression(node.exp)
+		else:
+			raise ValueError('cannot translate %r to Python' % node)
+
+	# Python expression converting a concatenation operand to a string,
+	# as an operand of the given precedence
+	def text(self, node, precedence):
+		if isinstance(node, (StringExp, ConcatStringExp, JoinStringExp, FormatStringExp)):
+			return self.operand(node, precedence)
+		elif isinstance(node, IntArithmExp):
+			return repr(text(node.i))
+		return 'text(%s)' % self.expression(node)
@@ -0,0 +1,227 @@
+#######################################
+# yoda_types.py
+# Static type inference and type specialization
+#
+# TypeInference follows a program statement by statement, keeping the
+# set of types each variable may hold: int, float, string, or unknown.
+# Assignments set a variable's types, the two branches of an
+# IfStatement are joined, and a WhileStatement's body is followed until
+# the types it leaves stop changing. Every expression is given the
+# types it may evaluate to where it stands. Boolean expressions are
+# typed bool.
+#
+# A variable read before any assignment holds whatever the environment
+# gave the program (0 when it gave nothing), so its type there is
+# initial, unknown by default. Arithmetic on ints stays int: LEAH is
+# integer division, as every engine runs without true division, and ints
+# too large for a machine word become Python longs, still typed int.
+#
+# specialize() uses the types to build concatenations whose parts are
+# all known as FormatStringExps, and unstable_variables() lists the
+# variables that may hold more than one type.
+#######################################
+
+from yoda_ast import *
+from yoda_visitor import Transformer, children, assigned_names
+
+INT = 'int'
+FLOAT = 'float'
+STRING = 'string'
+BOOL = 'bool'
+UNKNOWN = 'unknown'
+# Variables not assigned yet on some path; stands for initial
+UNSET = 'unset'
+
+NUMBERS = frozenset([INT, FLOAT])
+
+# Returns a copy of ast with concatenations specialized by type
+def specialize(ast, initial=UNKNOWN):
+	inference = TypeInference(initial)
+	inference.program(ast)
+	return Specializer(inference).visit(ast)
+
+# (name, types, location) of every variable that may hold more than
+# one type, sorted by name. location is that of the first statement
+# assigning or reading the variable
+def unstable_variables(ast, initial=UNKNOWN):
+	inference = TypeInference(initial)
+	inference.program(ast)
+	unstable = []
+	for name in sorted(inference.variables):
+		types = inference.variables[name]
+		if len(types) > 1:
+			unstable.append((name, sorted(types), inference.locations.get(name)))
+	return unstable
+
+# Types of an arithmetic operation on operands of the given types
+def arithmetic_types(left, right):
+	types = set()
+	for left_type in left:
+		for right_type in right:
+			if left_type == INT and right_type == INT:
+				types.add(INT)
+			elif left_type in NUMBERS and right_type in NUMBERS:
+				types.add(FLOAT)
+			else:
+				types.add(UNKNOWN)
+	return frozenset(types)
+
+# Merges the variable types of two paths
+def join(first, second):
+	state = dict(first)
+	for (name, types) in second.items():
+		state[name] = state.get(name, frozenset([UNSET])) | types
+	for name in first:
+		if name not in second:
+			state[name] = state[name] | frozenset([UNSET])
+	return state
+
+
+class TypeInference:
+	def __init__(self, initial=UNKNOWN):
+		self.initial = frozenset([initial])
+		# id of an expression node -> types it may evaluate to
+		self.types = {}
+		# variable -> every type it may hold anywhere in the program
+		self.variables = {}
+		self.locations = {}
+		self.location = None
+
+	def program(self, ast):
+		return self.statement(ast, {})
+
+	# Types an expression node may evaluate to, or None for a node the
+	# inference never reached
+	def types_of(self, node):
+		return self.types.get(id(node))
+
+	def record_variable(self, name, types):
+		self.variables[name] = self.variables.get(name, frozenset()) | types
+		if name not in self.locations:
+			self.locations[name] = self.location
+
+	# Types of variable name in state
+	def variable(self, name, state):
+		types = state.get(name, frozenset([UNSET]))
+		if UNSET in types:
+			types = (types - frozenset([UNSET])) | self.initial
+		self.record_variable(name, types)
+		return types
+
+	# Follows a statement from state; returns the state after it
+	def statement(self, node, state):
+		location = getattr(node, 'location', None)
+		if location is not None:
+			self.location = location
+		if isinstance(node, BlockStatement):
+			for statement in node.statements:
+				state = self.statement(statement, state)
+		elif isinstance(node, CompoundStatement):
+			state = self.statement(node.second, self.statement(node.first, state))
+		elif isinstance(node, (AssignStatement, SlotAssignStatement)):
+			state = self.assign(node.name, self.expression(node.exp, state), state)
+		elif isinstance(node, (AugAssignStatement, SlotAugAssignStatement)):
+			types = arithmetic_types(self.variable(node.name, state), self.expression(node.exp, state))
+			state = self.assign(node.name, types, state)
+		elif isinstance(node, IfStatement):
+			self.expression(node.condition, state)
+			true_state = self.statement(node.true_stmt, state)
+			if node.false_stmt:
+				state = join(true_state, self.statement(node.false_stmt, state))
+			else:
+				state = join(true_state, state)
+		elif isinstance(node, WhileStatement):
+			# The lattice is finite and joins only grow, so this ends
+			while True:
+				self.expression(node.condition, state)
+				after = join(state, self.statement(node.body, state))
+				if after == state:
+					break
+				state = after
+		elif isinstance(node, PrintStatement):
+			self.expression(node.stmt, state)
+		elif isinstance(node, PassStatement):
+			pass
+		else:
+			# Statements that wrap others (such as the profiler's) run
+			# their nested statements; anything else they assign is
+			# unknown
+			for child in children(node):
+				if isinstance(child, Statement):
+					state = self.statement(child, state)
+			for name in assigned_names(node):
+				if name not in state:
+					state = self.assign(name, frozenset([UNKNOWN]), state)
+		return state
+
+	def assign(self, name, types, state):
+		state = dict(state)
+		state[name] = types
+		self.record_variable(name, types)
+		return state
+
+	def expression(self, node, state):
+		if isinstance(node, IntArithmExp):
+			types = frozenset([INT])
+		elif isinstance(node, (VarArithmExp, SlotArithmExp)):
+			types = self.variable(node.name, state)
+		elif isinstance(node, BinopArithmExp):
+			types = arithmetic_types(self.expression(node.left, state),
+									 self.expression(node.right, state))
+		elif isinstance(node, (RelopBoolExp, AndBoolExp, OrBoolExp, NotBoolExp,
+							   TrueBoolExp, FalseBoolExp)):
+			for child in children(node):
+				self.expression(child, state)
+			types = frozenset([BOOL])
+		elif isinstance(node, (ConcatStringExp, JoinStringExp, FormatStringExp, StringExp)):
+			for child in children(node):
+				self.expression(child, state)
+			types = frozenset([STRING])
+		else:
+			for child in children(node):
+				self.expression(child, state)
+			types = frozenset([UNKNOWN])
+		key = id(node)
+		self.types[key] = self.types.get(key, frozenset()) | types
+		return types
+
+
+# Parts of a + chain, in order
+def concat_parts(node):
+	if isinstance(node, ConcatStringExp):
+		return concat_parts(node.left) + concat_parts(node.right)
+	elif isinstance(node, JoinStringExp):
+		parts = []
+		for part in node.parts:
+			parts.extend(concat_parts(part))
+		return parts
+	return [node]
+
+class Specializer(Transformer):
+	def __init__(self, inference):
+		self.inference = inference
+
+	def visit_ConcatStringExp(self, node):
+		return self.concatenation(node)
+
+	def visit_JoinStringExp(self, node):
+		return self.concatenation(node)
+
+	# A chain whose parts are all string literals, ints or strings
+	# becomes a FormatStringExp; otherwise it is left as it is
+	def concatenation(self, node):
+		format = ''
+		args = []
+		for part in concat_parts(node):
+			if isinstance(part, StringExp):
+				format += part.value.replace('%', '%%')
+				continue
+			types = self.inference.types_of(part)
+			if types == frozenset([INT]):
+				format += '%d'
+			elif types == frozenset([STRING]):
+				format += '%s'
+			else:
+				return self.generic_visit(node)
+			args.append(self.visit(part))
+		return FormatStringExp(format, args)
@@ -0,0 +1,97 @@
+#######################################
+# yoda_visitor.py
+# Generic traversal of yoda ASTs
+#
+# Transformer subclasses define visit_<NodeClass> methods for the nodes
+# they rewrite; every other node is copied with its children visited.
+#######################################
+
+import copy
+import inspect
+from equality import Equality, slot_names
+from yoda_ast import *
+
+def is_node(value):
+	return isinstance(value, Equality)
+
+# (field, value) pairs of a node
+def fields(node):
+	return [(name, getattr(node, name, None)) for name in slot_names(node.__class__)]
+
+# Child nodes of a node
+def children(node):
+	found = []
+	for (_, value) in fields(node):
+		if is_node(value):
+			found.append(value)
+		elif isinstance(value, list):
+			found.extend(item for item in value if is_node(item))
+	return found
+
+# Whether evaluating an expression could raise: division or modulo by
+# anything but a non-zero constant. Variables only ever hold numbers,
+# so no other operation can fail
+def may_raise(node):
+	if isinstance(node, BinopArithmExp) and node.op in ('LEAH', 'CHEWBACCA'):
+		if not isinstance(node.right, IntArithmExp) or node.right.i == 0:
+			return True
+	for child in children(node):
+		if may_raise(child):
+			return True
+	return False
+
+# Names of the variables an expression or statement reads
+def read_names(node):
+	names = set()
+	pending = [node]
+	while pending:
+		node = pending.pop()
+		if isinstance(node, (VarArithmExp, SlotArithmExp, AugAssignStatement,
+							 SlotAugAssignStatement)):
+			names.add(node.name)
+		pending.extend(children(node))
+	return names
+
+# Names of the variables a statement assigns, including nested ones
+def assigned_names(node):
+	names = set()
+	pending = [node]
+	while pending:
+		node = pending.pop()
+		if isinstance(node, (AssignStatement, SlotAssignStatement, AugAssignStatement,
+							 SlotAugAssignStatement)):
+			names.add(node.name)
+		pending.extend(child for child in children(node) if isinstance(child, Statement))
+	return names
+
+# Gives new the source location of old, for a statement built to
+# replace another. Returns new
+def copy_location(new, old):
+	new.location = getattr(old, 'location', None)
+	return new
+
+class Transformer:
+	# Dispatches on the node class, then on its base classes (so that a
+	# specialised subclass falls back to the visitor of its generic form),
+	# stopping at the abstract kinds Statement, ArithmExp, BoolExp and
+	# StringExp. A node class deriving from Equality itself (such as
+	# yoda_budget.LimitedStringExp) still gets its own visitor
+	def visit(self, node):
+		for node_class in inspect.getmro(node.__class__):
+			if Equality in node_class.__bases__ and node_class is not node.__class__:
+				break
+			method = getattr(self, 'visit_' + node_class.__name__, None)
+			if method:
+				return method(node)
+		return self.generic_visit(node)
+
+	# Returns a copy of node with every child node visited
+	def generic_visit(self, node):
+		new = copy.copy(node)
+		for (field, value) in fields(node):
+			if is_node(value):
+				setattr(new, field, self.visit(value))
+			elif isinstance(value, list):
+				setattr(new, field, [self.visit(item) if is_node(item) else item
+									 for item in value])
+		return new
@@ -0,0 +1,336 @@
+#######################################
+# yoda_vm.py
+# Bytecode compiler and stack-based virtual machine
+#
+# A program is compiled into a flat array of fixed-width instructions
+# plus a constant pool and a name table. WhileStatement and IfStatement
+# become jumps, so running a program never recurses into the AST.
+#######################################
+
+import operator
+from array import array
+from yoda_ast import *
+from yoda_output import current_sink
+from yoda_budget import current_budget, StepStatement, LimitedStringExp
+
+# Opcodes - every instruction is an opcode followed by three arguments
+# a, b and c (unused ones are 0). Variables are env[names[...]] and
+# unset variables read as 0
+LOAD_CONST       = 0   # push constants[a]
+LOAD_VAR         = 1   # push variable a
+STORE_VAR        = 2   # variable a = pop
+BINARY           = 3   # right = pop, left = pop, push operator a (left, right)
+BINARY_VAR_CONST = 4   # push operator a (variable b, constants[c])
+BINARY_VAR_VAR   = 5   # push operator a (variable b, variable c)
+JUMP             = 6   # pc = a
+JUMP_IF_FALSE    = 7   # pc = a if not pop
+JUMP_IF_TRUE     = 8   # pc = a if pop
+AND              = 9   # pc = a if top is false, else pop (short-circuit)
+OR               = 10  # pc = a if top is true, else pop (short-circuit)
+NOT              = 11  # push not pop
+CONCAT           = 12  # right = pop, left = pop, push left + right as strings
+PRINT            = 13  # write pop to the output sink
+EVAL             = 14  # push constants[a].eval(env)
+EXEC             = 15  # constants[a].eval(env)
+JOIN             = 16  # pop a values, push them joined as strings
+STEP             = 17  # charge a steps to the current budget
+LIMIT            = 18  # check the string on top against the current budget
+FORMAT           = 19  # pop a values, push constants[b] % values
+
+INSTRUCTION_SIZE = 4
+
+opcode_names = ['LOAD_CONST', 'LOAD_VAR', 'STORE_VAR', 'BINARY',
+				'BINARY_VAR_CONST', 'BINARY_VAR_VAR', 'JUMP', 'JUMP_IF_FALSE',
+				'JUMP_IF_TRUE', 'AND', 'OR', 'NOT', 'CONCAT', 'PRINT', 'EVAL', 'EXEC', 'JOIN',
+				'STEP', 'LIMIT', 'FORMAT']
+
+# Operators of BINARY, by argument
+binary_operator_names = ['VADER', 'SIDIOUS', 'LUKE', 'LEAH', 'CHEWBACCA',
+						 'SITH', 'SITH_ORDER', 'JEDI', 'JEDI_ORDER', 'ORDER', 'BB8_ORDER']
+binary_operators = (operator.add, operator.sub, operator.mul, operator.div, operator.mod,
+					operator.lt, operator.le, operator.gt, operator.ge, operator.eq, operator.ne)
+
+
+# Compiled program
+# Calling it runs the program against an environment dict
+class Program:
+	def __init__(self, code, constants, names):
+		self.code = code
+		self.constants = constants
+		self.names = names
+
+	def __call__(self, env):
+		run(self, env)
+
+	def __repr__(self):
+		return 'Program(%d instructions, %d constants, %d names)' % \
+			   (len(self.code) // INSTRUCTION_SIZE, len(self.constants), len(self.names))
+
+# Called by the interpreter
+def compile_bytecode(ast):
+	compiler = Compiler()
+	compiler.statement(ast)
+	return Program(compiler.code, compiler.constants, compiler.names)
+
+
+#######################################
+# Compiler
+#######################################
+
+class Compiler:
+	def __init__(self):
+		self.code = array('i')
+		self.constants = []
+		self.constant_index = {}
+		self.names = []
+		self.name_index = {}
+
+	def emit(self, opcode, a=0, b=0, c=0):
+		self.code.extend((opcode, a, b, c))
+		return len(self.code) - INSTRUCTION_SIZE
+
+	# Points the jump emitted at position at the next instruction
+	def patch(self, position):
+		self.code[position + 1] = len(self.code)
+
+	def constant(self, value):
+		key = (type(value), value)
+		if key not in self.constant_index:
+			self.constant_index[key] = len(self.constants)
+			self.constants.append(value)
+		return self.constant_index[key]
+
+	def name(self, name):
+		if name not in self.name_index:
+			self.name_index[name] = len(self.names)
+			self.names.append(name)
+		return self.name_index[name]
+
+	# Nodes the compiler does not know are kept in the constant pool
+	# and run by their own eval
+	def fallback(self, node, opcode):
+		self.constants.append(node)
+		self.emit(opcode, len(self.constants) - 1)
+
+	def statement(self, node):
+		pending = [node]
+		while pending:
+			node = pending.pop()
+			if isinstance(node, BlockStatement):
+				pending.extend(reversed(node.statements))
+			elif isinstance(node, CompoundStatement):
+				pending.append(node.second)
+				pending.append(node.first)
+			elif isinstance(node, AssignStatement):
+				self.expression(node.exp)
+				self.emit(STORE_VAR, self.name(node.name))
+			elif isinstance(node, AugAssignStatement):
+				self.expression(BinopArithmExp(node.op, VarArithmExp(node.name), node.exp))
+				self.emit(STORE_VAR, self.name(node.name))
+			elif isinstance(node, WhileStatement):
+				# The condition is tested at the bottom of the loop so
+				# each iteration takes a single jump
+				test = self.emit(JUMP)
+				body = len(self.code)
+				self.statement(node.body)
+				self.patch(test)
+				self.expression(node.condition)
+				self.emit(JUMP_IF_TRUE, body)
+			elif isinstance(node, IfStatement):
+				self.expression(node.condition)
+				false_jump = self.emit(JUMP_IF_FALSE)
+				self.statement(node.true_stmt)
+				if node.false_stmt:
+					end_jump = self.emit(JUMP)
+					self.patch(false_jump)
+					self.statement(node.false_stmt)
+					self.patch(end_jump)
+				else:
+					self.patch(false_jump)
+			elif isinstance(node, PrintStatement):
+				self.expression(node.stmt)
+				self.emit(PRINT)
+			elif isinstance(node, StepStatement):
+				self.emit(STEP, node.count)
+			elif isinstance(node, PassStatement):
+				pass
+			else:
+				self.fallback(node, EXEC)
+
+	def expression(self, node):
+		if isinstance(node, IntArithmExp):
+			self.emit(LOAD_CONST, self.constant(node.i))
+		elif isinstance(node, VarArithmExp):
+			self.emit(LOAD_VAR, self.name(node.name))
+		elif isinstance(node, (BinopArithmExp, RelopBoolExp)) and \
+			 node.op in binary_operator_names:
+			op = binary_operator_names.index(node.op)
+			(left, right) = (node.left, node.right)
+			if isinstance(left, VarArithmExp) and isinstance(right, IntArithmExp):
+				self.emit(BINARY_VAR_CONST, op, self.name(left.name), self.constant(right.i))
+			elif isinstance(left, VarArithmExp) and isinstance(right, VarArithmExp):
+				self.emit(BINARY_VAR_VAR, op, self.name(left.name), self.name(right.name))
+			else:
+				self.expression(left)
+				self.expression(right)
+				self.emit(BINARY, op)
+		elif isinstance(node, (AndBoolExp, OrBoolExp)):
+			# The left value is the result when it decides the outcome
+			self.expression(node.left)
+			end_jump = self.emit(AND if isinstance(node, AndBoolExp) else OR)
+			self.expression(node.right)
+			self.patch(end_jump)
+		elif isinstance(node, NotBoolExp):
+			self.expression(node.exp)
+			self.emit(NOT)
+		elif isinstance(node, TrueBoolExp):
+			self.emit(LOAD_CONST, self.constant(True))
+		elif isinstance(node, FalseBoolExp):
+			self.emit(LOAD_CONST, self.constant(False))
+		elif isinstance(node, ConcatStringExp):
+			self.expression(node.left)
+			self.expression(node.right)
+			self.emit(CONCAT)
+		elif isinstance(node, JoinStringExp):
+			for part in node.parts:
+				self.expression(part)
+			self.emit(JOIN, len(node.parts))
+		elif isinstance(node, FormatStringExp):
+			if not node.args:
+				self.emit(LOAD_CONST, self.constant(node.format % ()))
+			else:
+				for arg in node.args:
+					self.expression(arg)
+				self.emit(FORMAT, len(node.args), self.constant(node.format))
+		elif isinstance(node, StringExp):
+			self.emit(LOAD_CONST, self.constant(node.value))
+		elif isinstance(node, LimitedStringExp):
+			self.expression(node.exp)
+			self.emit(LIMIT)
+		else:
+			self.fallback(node, EVAL)
+
+
+#######################################
+# Virtual machine
+#######################################
+
+def run(program, env):
+	code = program.code
+	constants = program.constants
+	names = program.names
+	operators = binary_operators
+	stack = []
+	push = stack.append
+	pop = stack.pop
+	get = env.get
+	write = current_sink().write
+	budget = current_budget()
+	end = len(code)
+	pc = 0
+	# Opcodes as locals, most frequent first
+	(load_var, load_const, binary_var_const, binary_var_var, store_var,
+	 jump_if_true, jump_if_false, jump, binary, print_, concat, and_, or_,
+	 not_, eval_, exec_, join, step, limit, format) = \
+		(LOAD_VAR, LOAD_CONST, BINARY_VAR_CONST, BINARY_VAR_VAR, STORE_VAR,
+		 JUMP_IF_TRUE, JUMP_IF_FALSE, JUMP, BINARY, PRINT, CONCAT, AND, OR,
+		 NOT, EVAL, EXEC, JOIN, STEP, LIMIT, FORMAT)
+	while pc < end:
+		opcode = code[pc]
+		a = code[pc + 1]
+		pc += 4
+		if opcode == binary_var_const:
+			push(operators[a](get(names[code[pc - 2]], 0), constants[code[pc - 1]]))
+		elif opcode == store_var:
+			env[names[a]] = pop()
+		elif opcode == jump_if_true:
+			if pop():
+				pc = a
+		elif opcode == step:
+			budget.step(a)
+		elif opcode == load_var:
+			push(get(names[a], 0))
+		elif opcode == binary_var_var:
+			push(operators[a](get(names[code[pc - 2]], 0), get(names[code[pc - 1]], 0)))
+		elif opcode == load_const:
+			push(constants[a])
+		elif opcode == jump_if_false:
+			if not pop():
+				pc = a
+		elif opcode == jump:
+			pc = a
+		elif opcode == binary:
+			right = pop()
+			stack[-1] = operators[a](stack[-1], right)
+		elif opcode == print_:
+			write('%s' % pop())
+		elif opcode == format:
+			values = tuple(stack[-a:])
+			del stack[-a:]
+			push(constants[code[pc - 2]] % values)
+		elif opcode == join:
+			values = stack[-a:]
+			del stack[-a:]
+			for (i, value) in enumerate(values):
+				if isinstance(value, (int, long)):
+					values[i] = '%d' % value
+			push(''.join(values))
+		elif opcode == concat:
+			right = pop()
+			left = pop()
+			if isinstance(left, (int, long)):
+				left = '%d' % left
+			if isinstance(right, (int, long)):
+				right = '%d' % right
+			push(left + right)
+		elif opcode == and_:
+			if stack[-1]:
+				pop()
+			else:
+				pc = a
+		elif opcode == or_:
+			if stack[-1]:
+				pc = a
+			else:
+				pop()
+		elif opcode == not_:
+			stack[-1] = not stack[-1]
+		elif opcode == eval_:
+			push(constants[a].eval(env))
+		elif opcode == exec_:
+			constants[a].eval(env)
+		elif opcode == limit:
+			budget.check_text(stack[-1])
+		else:
+			raise RuntimeError('unknown opcode: %d' % opcode)
+
+# Lists the instructions of program, one per line
+def disassemble(program):
+	lines = []
+	code = program.code
+	for pc in range(0, len(code), INSTRUCTION_SIZE):
+		(opcode, a, b, c) = code[pc:pc + INSTRUCTION_SIZE]
+		if opcode == LOAD_CONST:
+			detail = repr(program.constants[a])
+		elif opcode in (LOAD_VAR, STORE_VAR):
+			detail = program.names[a]
+		elif opcode == BINARY:
+			detail = binary_operator_names[a]
+		elif opcode == BINARY_VAR_CONST:
+			detail = '%s %s %r' % (program.names[b], binary_operator_names[a], program.constants[c])
+		elif opcode == BINARY_VAR_VAR:
+			detail = '%s %s %s' % (program.names[b], binary_operator_names[a], program.names[c])
+		elif opcode in (JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, AND, OR):
+			detail = '-> %d' % a
+		elif opcode in (EVAL, EXEC):
+			detail = repr(program.constants[a])
+		elif opcode == JOIN:
+			detail = '%d values' % a
+		elif opcode == FORMAT:
+			detail = '%r %% %d values' % (program.constants[b], a)
+		elif opcode == STEP:
+			detail = '%d steps' % a
+		else:
+			detail = ''
+		lines.append('%5d  %-16s %s' % (pc, opcode_names[opcode], detail))
+	return '\n'.join(lines)